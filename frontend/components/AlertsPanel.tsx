@@ -2,9 +2,13 @@ import { useLanguage } from './LanguageProvider'
 
 interface AlertsPanelProps {
   inventory: any
+  stockoutRisk?: any
 }
 
-export default function AlertsPanel({ inventory }: AlertsPanelProps) {
+// Simulated stockout probability at which an ingredient is flagged
+const STOCKOUT_RISK_THRESHOLD = 0.2
+
+export default function AlertsPanel({ inventory, stockoutRisk }: AlertsPanelProps) {
   const { language } = useLanguage()
 
   if (!inventory || !inventory.ingredients) {
@@ -19,7 +23,11 @@ export default function AlertsPanel({ inventory }: AlertsPanelProps) {
     (ing: any) => ing.status === 'overstocked'
   )
 
-  if (lowStockItems.length === 0 && overstockedItems.length === 0) {
+  const atRiskItems = (stockoutRisk?.ingredients || []).filter(
+    (item: any) => item.stockout_probability >= STOCKOUT_RISK_THRESHOLD
+  )
+
+  if (lowStockItems.length === 0 && overstockedItems.length === 0 && atRiskItems.length === 0) {
     return null
   }
 
@@ -41,6 +49,22 @@ export default function AlertsPanel({ inventory }: AlertsPanelProps) {
         </div>
       )}
 
+      {atRiskItems.length > 0 && (
+        <div className="bg-orange-50 dark:bg-orange-900 border-l-4 border-orange-500 p-4 rounded">
+          <h3 className="font-bold text-orange-800 dark:text-orange-200 mb-2">
+            {language === 'en' ? '⏳ Stockout Risk Before Next Delivery' : '⏳ 下次到货前缺货风险'}
+          </h3>
+          <ul className="space-y-1">
+            {atRiskItems.slice(0, 5).map((item: any) => (
+              <li key={item.ingredient_id} className="text-orange-700 dark:text-orange-300">
+                • {item.ingredient_name}: {(item.stockout_probability * 100).toFixed(0)}%
+                ({language === 'en' ? 'days of cover' : '可用天数'} {item.expected_days_of_cover.toFixed(1)})
+              </li>
+            ))}
+          </ul>
+        </div>
+      )}
+
       {overstockedItems.length > 0 && (
         <div className="bg-yellow-50 dark:bg-yellow-900 border-l-4 border-yellow-500 p-4 rounded">
           <h3 className="font-bold text-yellow-800 dark:text-yellow-200 mb-2">
@@ -3,6 +3,7 @@ import { PieChart, Pie, Cell, ResponsiveContainer, Tooltip } from 'recharts'
 
 interface CostOptimizationProps {
   inventory: any
+  orderPlan?: any
 }
 
 const COLORS = ['#E10600', '#FFC72C', '#00A878', '#0B2747', '#FFF8F0']
@@ -19,7 +20,10 @@ const PRODUCT_COLORS: Record<string, string> = {
 // Fixed product order for color and display
 const PRODUCT_ORDER = ['Rice', 'Braised Chicken', 'Braised Beef', 'Braised Pork', 'Egg']
 
-export default function CostOptimization({ inventory }: CostOptimizationProps) {
+// Upcoming vendor orders listed from the purchase plan
+const PLANNED_ORDERS_SHOWN = 5
+
+export default function CostOptimization({ inventory, orderPlan }: CostOptimizationProps) {
   const { language } = useLanguage()
 
   if (!inventory || !inventory.ingredients) {
@@ -45,6 +49,14 @@ export default function CostOptimization({ inventory }: CostOptimizationProps) {
 
   const totalCost = costData.reduce((sum: number, item: any) => sum + item.value, 0)
 
+  // Next vendor orders across the minimum-cost purchase plan
+  const plannedOrders = (orderPlan?.vendors || [])
+    .flatMap((vendor: any) =>
+      vendor.orders.map((order: any) => ({ ...order, vendor: vendor.vendor }))
+    )
+    .sort((a: any, b: any) => a.order_date.localeCompare(b.order_date))
+    .slice(0, PLANNED_ORDERS_SHOWN)
+
   return (
     <div className="bg-white dark:bg-gray-800 p-6 rounded-lg shadow-md">
       <h2 className="text-2xl font-bold text-primary-navy dark:text-primary-rice mb-4">
@@ -127,6 +139,54 @@ export default function CostOptimization({ inventory }: CostOptimizationProps) {
             ))}
         </div>
       </div>
+
+      {orderPlan && (
+        <div className="mt-6 border-t border-gray-200 dark:border-gray-700 pt-4">
+          <p className="text-sm text-gray-600 dark:text-gray-400">
+            {language === 'en'
+              ? `Planned Purchases (next ${orderPlan.horizon} days)`
+              : `计划采购（未来${orderPlan.horizon}天）`}
+          </p>
+          <p className="text-2xl font-bold text-primary-gold">
+            ${orderPlan.purchase_cost.toFixed(2)}
+          </p>
+          <p className="text-xs text-gray-500 dark:text-gray-400 mb-3">
+            {language === 'en'
+              ? `${orderPlan.deliveries} deliveries · plan cost $${orderPlan.total_cost.toFixed(2)}`
+              : `${orderPlan.deliveries} 次送货 · 计划总成本 $${orderPlan.total_cost.toFixed(2)}`}
+          </p>
+          <div className="space-y-2 mb-4">
+            {orderPlan.vendors.map((vendor: any) => (
+              <div key={vendor.vendor ?? 'unassigned'} className="flex justify-between items-center">
+                <span className="text-sm">{vendor.vendor ?? (language === 'en' ? 'No vendor on record' : '无供应商记录')}</span>
+                <span className="font-semibold">${vendor.purchase_cost.toFixed(2)}</span>
+              </div>
+            ))}
+          </div>
+          {plannedOrders.length > 0 && (
+            <>
+              <p className="text-sm text-gray-600 dark:text-gray-400 mb-2">
+                {language === 'en' ? 'Upcoming Orders' : '即将下单'}
+              </p>
+              <div className="space-y-2">
+                {plannedOrders.map((order: any) => (
+                  <div key={`${order.vendor}-${order.order_date}`} className="text-sm">
+                    <div className="flex justify-between">
+                      <span className="font-medium">{order.order_date} · {order.vendor ?? '—'}</span>
+                      <span className="font-semibold">${order.cost.toFixed(2)}</span>
+                    </div>
+                    <p className="text-xs text-gray-500 dark:text-gray-400">
+                      {order.lines
+                        .map((line: any) => `${line.ingredient_name} ${Math.round(line.quantity)}${line.unit || ''}`)
+                        .join(', ')}
+                    </p>
+                  </div>
+                ))}
+              </div>
+            </>
+          )}
+        </div>
+      )}
     </div>
   )
 }
@@ -20,6 +20,8 @@ export default function Dashboard() {
   const [inventory, setInventory] = useState<any>(null)
   const [forecasts, setForecasts] = useState<any[]>([])
   const [shipments, setShipments] = useState<any>(null)
+  const [stockoutRisk, setStockoutRisk] = useState<any>(null)
+  const [orderPlan, setOrderPlan] = useState<any>(null)
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
@@ -34,6 +36,58 @@ export default function Dashboard() {
     }
   }, [session])
 
+  // Live updates instead of polling: inventory diffs, alerts and shipment changes
+  useEffect(() => {
+    if (!session) return
+    const events = new EventSource(`${API_URL}/events`)
+
+    events.addEventListener('inventory', (message) => {
+      const diff = JSON.parse((message as MessageEvent).data)
+      setInventory((current: any) => {
+        if (!current) return current
+        const rows = new Map<string, any>(
+          (current.ingredients || []).map((row: any) => [row.ingredient_id, row])
+        )
+        for (const change of diff.changes) {
+          if (change.removed) {
+            rows.delete(change.ingredient_id)
+          } else {
+            rows.set(change.ingredient_id, change)
+          }
+        }
+        return { ...current, ingredients: Array.from(rows.values()), kpis: diff.kpis, version: diff.version }
+      })
+      fetchStockoutRisk()
+    })
+    events.addEventListener('shipment', async () => {
+      const shipmentsRes = await axios.get(`${API_URL}/shipments`)
+      setShipments(shipmentsRes.data)
+    })
+    // Events were dropped while this tab was behind; reload everything
+    events.addEventListener('resync', () => fetchData())
+
+    return () => events.close()
+  }, [session])
+
+  // Simulated separately so a slow or failed run never holds up the dashboard
+  const fetchStockoutRisk = async () => {
+    try {
+      const riskRes = await axios.get(`${API_URL}/inventory/stockout-risk`)
+      setStockoutRisk(riskRes.data)
+    } catch (error) {
+      console.error('Error fetching stockout risk:', error)
+    }
+  }
+
+  const fetchOrderPlan = async () => {
+    try {
+      const planRes = await axios.get(`${API_URL}/orders/plan`)
+      setOrderPlan(planRes.data)
+    } catch (error) {
+      console.error('Error fetching order plan:', error)
+    }
+  }
+
   const fetchData = async () => {
     try {
       setLoading(true)
@@ -46,6 +100,8 @@ export default function Dashboard() {
       setInventory(inventoryRes.data)
       setForecasts(forecastsRes.data.forecasts || [])
       setShipments(shipmentsRes.data)
+      fetchStockoutRisk()
+      fetchOrderPlan()
     } catch (error) {
       console.error('Error fetching data:', error)
     } finally {
@@ -113,7 +169,7 @@ export default function Dashboard() {
           )}
 
           {/* Alerts Panel */}
-          <AlertsPanel inventory={inventory} />
+          <AlertsPanel inventory={inventory} stockoutRisk={stockoutRisk} />
 
           {/* Main Content Grid */}
           <div className="grid grid-cols-1 lg:grid-cols-3 gap-6 mb-8">
@@ -136,7 +192,7 @@ export default function Dashboard() {
           {/* Shipment Tracker and Cost Optimization */}
           <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
             <ShipmentTracker shipments={shipments} />
-            <CostOptimization inventory={inventory} />
+            <CostOptimization inventory={inventory} orderPlan={orderPlan} />
           </div>
         </main>
       </div>
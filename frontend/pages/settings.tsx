@@ -27,8 +27,8 @@ export default function Settings() {
       const response = await axios.post(`${API_URL}/train`)
       toast.success(
         language === 'en'
-          ? 'Model training completed!'
-          : '模型训练完成！'
+          ? 'Model training started!'
+          : '模型训练已开始！'
       )
     } catch (error: any) {
       toast.error(
@@ -0,0 +1,245 @@
+"""
+Rolling-origin backtesting of the forecast engines.
+
+Each fold fits on the history before an origin day and forecasts the
+next BACKTEST_HORIZON days; origins step back BACKTEST_STEP days from the
+last day of data. Baseline folds run in the CPU process pool, errors are
+summed per ingredient and engine with NumPy, and every run is stored in
+backtest_runs / backtest_engines / backtest_results.
+    
+    python -m app.backtest
+
+runs a backtest against DATABASE_URL and prints the per-engine summary.
+"""
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+import numpy as np
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import get_db
+from app.executor import run_cpu, run_io
+from app.forecasters import BASELINES, BASELINE_HISTORY_DAYS, SEASON
+
+BACKTEST_FOLDS = int(os.getenv("BACKTEST_FOLDS", "8"))
+BACKTEST_HORIZON = int(os.getenv("BACKTEST_HORIZON", "14"))
+BACKTEST_STEP = int(os.getenv("BACKTEST_STEP", "7"))
+
+# Columns of the per-ingredient error sums accumulated over folds
+ABS_ERROR, ACTUAL, SIGNED_ERROR, APE, DEMAND_DAYS = range(5)
+
+def fold_origins(days: int, horizon: int = BACKTEST_HORIZON, folds: int = BACKTEST_FOLDS,
+                 step: int = BACKTEST_STEP, min_history: int = 2 * SEASON) -> List[int]:
+    """Day index of each fold's first forecast day, latest first"""
+    origins = [days - horizon - k * step for k in range(folds)]
+    return [origin for origin in origins if origin >= min_history]
+
+def error_sums(forecast: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    """(N, 5) absolute error, actual, signed error, APE and demand-day sums for one fold"""
+    error = forecast - actual
+    demand = actual > 0
+    ape = np.divide(np.abs(error), actual, out=np.zeros_like(error, dtype=np.float64), where=demand)
+    return np.stack([
+        np.abs(error).sum(axis=1),
+        actual.sum(axis=1),
+        error.sum(axis=1),
+        ape.sum(axis=1),
+        demand.sum(axis=1)
+    ], axis=1)
+
+def metrics(sums: np.ndarray) -> Dict[str, np.ndarray]:
+    """MAPE (over days with demand), WAPE and bias in percent from error sums"""
+    def ratio(numerator, denominator):
+        return np.divide(numerator, denominator, out=np.full(numerator.shape, np.nan),
+                         where=denominator > 0) * 100
+    return {
+        "mape": ratio(sums[..., APE], sums[..., DEMAND_DAYS]),
+        "wape": ratio(sums[..., ABS_ERROR], sums[..., ACTUAL]),
+        "bias": ratio(sums[..., SIGNED_ERROR], sums[..., ACTUAL])
+    }
+
+def _measured(forecast: Callable[[], np.ndarray], trace_memory: bool):
+    """Run a forecast, returning it with wall-clock seconds and (optionally) peak allocated bytes
+    
+    Memory is traced in a second run so tracing overhead stays out of the timing.
+    """
+    started = time.perf_counter()
+    values = forecast()
+    seconds = time.perf_counter() - started
+    
+    peak = 0
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            forecast()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return values, seconds, peak
+
+def run_fold(usage: np.ndarray, horizon: int, engines: List[str], trace_memory: bool = False) -> Dict[str, Dict]:
+    """Process pool entry point: every baseline on one fold
+    
+    usage ends on the fold's last forecast day; the forecast days are the
+    last horizon columns.
+    """
+    history, actual = usage[:, :-horizon][:, -BASELINE_HISTORY_DAYS:], usage[:, -horizon:]
+    results = {}
+    for name in engines:
+        forecast, seconds, peak = _measured(lambda: BASELINES[name].forecast(history, horizon), trace_memory)
+        results[name] = {"sums": error_sums(forecast, actual), "seconds": seconds, "peak_bytes": peak}
+    return results
+
+async def run_backtest(ingredient_ids: List[str], usage: np.ndarray,
+                       model_forecast: Optional[Callable[[int, int], np.ndarray]] = None,
+                       horizon: int = BACKTEST_HORIZON, folds: int = BACKTEST_FOLDS,
+                       step: int = BACKTEST_STEP) -> Dict[str, any]:
+    """Backtest every engine over rolling origins and store the results
+    
+    usage is the (N, days) daily usage of ingredient_ids. model_forecast,
+    if given, returns the LSTM's (N, horizon) forecast from the window
+    ending offset days before the last day; it runs in the I/O pool.
+    """
+    started_at = datetime.now().isoformat()
+    started = time.perf_counter()
+    days = usage.shape[1]
+    origins = fold_origins(days, horizon, folds, step)
+    if not origins:
+        return {
+            "status": "insufficient_data",
+            "message": f"Need at least {2 * SEASON + horizon} days of usage history for a backtest"
+        }
+    
+    engines = list(BASELINES)
+    # Peak memory is traced on the first (latest) fold only
+    fold_results = await asyncio.gather(*[
+        run_cpu(run_fold, usage[:, max(origin - BASELINE_HISTORY_DAYS, 0):origin + horizon],
+                horizon, engines, fold == 0)
+        for fold, origin in enumerate(origins)
+    ])
+    
+    if model_forecast is not None:
+        for fold, (origin, result) in enumerate(zip(origins, fold_results)):
+            offset = days - origin
+            actual = usage[:, origin:origin + horizon]
+            forecast, seconds, peak = await run_io(
+                _measured, lambda: model_forecast(offset, horizon), fold == 0
+            )
+            result["lstm"] = {"sums": error_sums(forecast, actual), "seconds": seconds, "peak_bytes": peak}
+        engines.append("lstm")
+    
+    summary = {}
+    per_ingredient = {}
+    for name in engines:
+        sums = np.sum([result[name]["sums"] for result in fold_results], axis=0)
+        per_ingredient[name] = metrics(sums)
+        overall = metrics(sums.sum(axis=0))
+        summary[name] = {
+            **{key: _finite(value) for key, value in overall.items()},
+            "seconds": sum(result[name]["seconds"] for result in fold_results),
+            "peak_bytes": max(result[name]["peak_bytes"] for result in fold_results)
+        }
+    
+    run = {
+        "run_id": str(uuid.uuid4()),
+        "started_at": started_at,
+        "horizon": horizon,
+        "folds": len(origins),
+        "step": step,
+        "ingredients": len(ingredient_ids),
+        "duration_seconds": time.perf_counter() - started,
+        "engines": summary
+    }
+    await run_io(_store, run, ingredient_ids, per_ingredient)
+    return {"status": "success", **run}
+
+def _finite(value) -> Optional[float]:
+    """JSON-safe float (NaN becomes None)"""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+def _store(run: Dict[str, any], ingredient_ids: List[str], per_ingredient: Dict[str, Dict[str, np.ndarray]]):
+    """Write a run, its engine summary and per-ingredient metrics"""
+    with get_db(write=True) as conn:
+        conn.execute(
+            "INSERT INTO backtest_runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run["run_id"], run["started_at"], run["horizon"], run["folds"], run["step"],
+             run["ingredients"], run["duration_seconds"])
+        )
+        conn.executemany(
+            "INSERT INTO backtest_engines VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(run["run_id"], name, s["mape"], s["wape"], s["bias"], s["seconds"], s["peak_bytes"])
+             for name, s in run["engines"].items()]
+        )
+        for name, values in per_ingredient.items():
+            conn.executemany(
+                "INSERT INTO backtest_results VALUES (?, ?, ?, ?, ?, ?)",
+                [(run["run_id"], ingredient_id, name,
+                  _finite(values["mape"][row]), _finite(values["wape"][row]), _finite(values["bias"][row]))
+                 for row, ingredient_id in enumerate(ingredient_ids)]
+            )
+        conn.commit()
+
+def latest_backtest(ingredient_id: Optional[str] = None) -> Optional[Dict[str, any]]:
+    """Most recent stored run, with per-ingredient metrics for one ingredient if given"""
+    with get_db() as conn:
+        row = conn.execute(
+            """
+            SELECT run_id, started_at, horizon, folds, step, ingredients, duration_seconds
+            FROM backtest_runs ORDER BY started_at DESC LIMIT 1
+            """
+        ).fetchone()
+        if row is None:
+            return None
+        run = dict(zip(("run_id", "started_at", "horizon", "folds", "step", "ingredients",
+                        "duration_seconds"), row))
+        run["engines"] = {
+            engine: {"mape": mape, "wape": wape, "bias": bias, "seconds": seconds, "peak_bytes": peak}
+            for engine, mape, wape, bias, seconds, peak in conn.execute(
+                "SELECT engine, mape, wape, bias, seconds, peak_bytes FROM backtest_engines WHERE run_id = ?",
+                (run["run_id"],)
+            )
+        }
+        if ingredient_id is not None:
+            run["ingredient_id"] = ingredient_id
+            run["results"] = {
+                engine: {"mape": mape, "wape": wape, "bias": bias}
+                for engine, mape, wape, bias in conn.execute(
+                    "SELECT engine, mape, wape, bias FROM backtest_results WHERE run_id = ? AND ingredient_id = ?",
+                    (run["run_id"], ingredient_id)
+                )
+            }
+        return run
+
+async def _main():
+    from app.database import init_db
+    from app.executor import shutdown_executors
+    from app.forecast_service import ForecastService
+    
+    init_db()
+    service = ForecastService()
+    try:
+        result = await service.run_backtest()
+    finally:
+        shutdown_executors()
+    if result["status"] != "success":
+        print(result["message"])
+        return
+    print(f"{result['ingredients']} ingredients, {result['folds']} folds of {result['horizon']} days "
+          f"in {result['duration_seconds']:.2f}s")
+    print(f"{'engine':<16}{'MAPE %':>9}{'WAPE %':>9}{'bias %':>9}{'seconds':>10}{'peak MB':>9}")
+    for name, s in result["engines"].items():
+        print(f"{name:<16}{_fmt(s['mape']):>9}{_fmt(s['wape']):>9}{_fmt(s['bias']):>9}"
+              f"{s['seconds']:>10.4f}{s['peak_bytes'] / 2**20:>9.1f}")
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,89 @@
+"""
+Per-item vs batched LSTM inference for bulk forecasts.
+    
+    python -m app.bulk_forecast_benchmark [ingredients ...]
+
+Builds synthetic usage for each catalog size (default 10, 100 and 1000
+ingredients) and an untrained LSTMForecaster of the served shape, then
+forecasts every ingredient over the horizon twice: once per ingredient,
+as /forecast/bulk did before batching, and once as a single batched
+rollout (chunked at FORECAST_MAX_BATCH). Latency does not depend on the
+weights, so no checkpoint is needed.
+"""
+import os
+import sqlite3
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HISTORY_DAYS = 120
+HORIZON = 30
+
+def synthetic_features(ingredients: int, days: int = HISTORY_DAYS, seed: int = 0):
+    """FeatureSet for a catalog where menu item k uses only ingredient k"""
+    import pandas as pd
+    from app.features import FeatureStore
+    
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE usage (usage_id INTEGER PRIMARY KEY, date TEXT, menu_item_id TEXT, "
+                 "menu_item_name TEXT, quantity_sold INTEGER)")
+    conn.execute("CREATE TABLE recipe (menu_item_id TEXT, ingredient_id TEXT, qty_per_serving REAL)")
+    conn.executemany("INSERT INTO recipe VALUES (?, ?, 1.0)", [(f"item{k}", f"ing{k}") for k in range(ingredients)])
+    dates = [f"{day:%Y-%m-%d}" for day in pd.date_range("2025-01-01", periods=days)]
+    level = rng.gamma(2.0, 20.0, ingredients)
+    sold = rng.poisson(level[:, None], (ingredients, days))
+    conn.executemany(
+        "INSERT INTO usage (date, menu_item_id, menu_item_name, quantity_sold) VALUES (?, ?, ?, ?)",
+        [(dates[day], f"item{k}", f"Item {k}", int(sold[k, day])) for k in range(ingredients) for day in range(days)]
+    )
+    return FeatureStore().refresh(conn)
+
+def served_model(service):
+    """Untrained model with the shape ForecastService trains"""
+    import torch
+    from models.inference import optimize_for_inference
+    from models.lstm_forecaster import LSTMForecaster
+    
+    torch.manual_seed(0)
+    model = LSTMForecaster(service.input_size, hidden_size=service.hidden_size, num_layers=2,
+                           out_len=service.train_horizon)
+    model.metadata = {"seq_len": service.seq_len}
+    return optimize_for_inference(model.eval(), "fp32")
+
+def benchmark(sizes=(10, 100, 1000), horizon: int = HORIZON, repeats: int = 3):
+    """Best-of-repeats seconds for per-item and batched forecasts of each catalog size"""
+    from app.forecast_service import ForecastService
+    
+    service = ForecastService()
+    model = served_model(service)
+    results = []
+    for size in sizes:
+        feature_set = synthetic_features(size)
+        ids = feature_set.ingredient_ids
+        service._rollout(model, feature_set, ids[:1], horizon)  # Warm up
+        
+        def best(func):
+            timings = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - started)
+            return min(timings)
+        
+        per_item = best(lambda: [service._rollout(model, feature_set, [i], horizon) for i in ids])
+        batched = best(lambda: service._rollout(model, feature_set, ids, horizon))
+        results.append({"ingredients": size, "per_item_seconds": per_item, "batched_seconds": batched})
+    return results
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000]
+    print(f"{'ingredients':>12}{'per-item ms':>14}{'batched ms':>13}{'speedup':>10}")
+    for result in benchmark(sizes):
+        per_item, batched = result["per_item_seconds"], result["batched_seconds"]
+        print(f"{result['ingredients']:>12}{per_item * 1000:>14.1f}{batched * 1000:>13.1f}{per_item / batched:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Vectorized mapping of raw uploads onto the canonical tables.
+
+Handles four kinds of input:
+- the monthly "*_Data_Matrix.xlsx" POS exports (item-level sheet -> usage/sales)
+- the wide recipe matrix (one column per ingredient -> recipe rows)
+- the shipment schedule ("MSY Data - Shipment.csv" -> shipment_schedule)
+- files whose headers already match a canonical table
+"""
+import calendar
+import os
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, List
+
+# Columns a chunk must carry to be loaded straight into a canonical table
+CANONICAL_COLUMNS = {
+    "purchases": ["vendor", "ingredient_id", "ingredient_name", "quantity", "unit",
+                  "unit_cost", "total_cost", "purchase_date", "invoice_id"],
+    "shipments": ["vendor", "ingredient_id", "quantity", "shipped_date", "arrived_date",
+                  "status", "lead_time_days", "tracking_id"],
+    "usage": ["date", "menu_item_id", "menu_item_name", "quantity_sold"],
+    "sales": ["date", "menu_item_id", "units_sold", "price", "revenue"],
+    "recipe": ["menu_item_id", "ingredient_id", "qty_per_serving"],
+}
+# Minimum subset of CANONICAL_COLUMNS that identifies each table
+REQUIRED_COLUMNS = {
+    "purchases": {"ingredient_id", "quantity", "purchase_date"},
+    "shipments": {"ingredient_id", "quantity", "shipped_date"},
+    "usage": {"date", "menu_item_id", "quantity_sold"},
+    "sales": {"date", "menu_item_id", "units_sold"},
+    "recipe": {"menu_item_id", "ingredient_id", "qty_per_serving"},
+}
+
+# Columns of the shipment schedule export
+SCHEDULE_COLUMNS = ["ingredient", "quantity_per_shipment", "unit_of_shipment", "number_of_shipments", "frequency"]
+
+# Raw columns each kind of chunk is mapped from (recipe matrices use every column)
+SOURCE_COLUMNS = {
+    "data_matrix_items": ["item_name", "count", "amount"],
+    "shipment_schedule": SCHEDULE_COLUMNS,
+    **CANONICAL_COLUMNS
+}
+
+# Days in each shipment schedule period
+PERIOD_DAYS = {"daily": 1, "weekly": 7, "biweekly": 14, "semimonthly": 15, "monthly": 30, "quarterly": 91}
+
+# Spellings seen in the raw exports that do not normalize to the ingredient id
+DEFAULT_ALIASES = {
+    "boychoy": "bokchoy",
+    "bok_choy": "bokchoy",
+    "eggs": "egg",
+    "beef": "braised_beef",
+    "chicken": "braised_chicken",
+    "pork": "braised_pork",
+}
+
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+
+def slugify(values: pd.Series) -> pd.Series:
+    """Vectorized snake_case ids from display names"""
+    return (
+        values.astype(str)
+        .str.strip()
+        .str.lower()
+        .str.replace(r"[^a-z0-9]+", "_", regex=True)
+        .str.strip("_")
+    )
+
+def parse_number(values: pd.Series) -> pd.Series:
+    """Parse numbers formatted like "7,969" or "$2,408.42" """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    cleaned = values.astype(str).str.replace(r"[$,\s]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+def parse_period(filename: str) -> Optional[str]:
+    """First day of the month named in a Data Matrix filename (YYYY-MM-01)
+    
+    The exports do not always carry a year. Use a YYYYMMDD export stamp or
+    a bare year in the name when present, then DATA_MATRIX_YEAR; without
+    any of these the period is unknown (None) rather than guessed.
+    """
+    name = filename.lower()
+    month = next((number for month_name, number in MONTHS.items() if month_name in name), None)
+    if month is None:
+        return None
+    
+    stamp = re.search(r"(20\d{2})(\d{2})(\d{2})", name)
+    bare_year = re.search(r"(?<!\d)(20\d{2})(?!\d)", name)
+    if stamp:
+        # The export runs after the month it covers, so a later month is last year's
+        year, stamp_month = int(stamp.group(1)), int(stamp.group(2))
+        if month > stamp_month:
+            year -= 1
+    elif bare_year:
+        year = int(bare_year.group(1))
+    elif os.getenv("DATA_MATRIX_YEAR"):
+        year = int(os.getenv("DATA_MATRIX_YEAR"))
+    else:
+        return None
+    return f"{year:04d}-{month:02d}-01"
+
+class AliasTable:
+    """Maps raw ingredient headers to ingredient ids, cached per process"""
+    
+    def __init__(self, aliases: Optional[Dict[str, str]] = None):
+        self.aliases = dict(DEFAULT_ALIASES)
+        self.aliases.update(aliases or {})
+        self._resolved: Dict[str, str] = {}
+    
+    @classmethod
+    def from_db(cls, conn) -> "AliasTable":
+        """Load aliases persisted in the ingredient_aliases table"""
+        rows = conn.execute("SELECT alias, ingredient_id FROM ingredient_aliases").fetchall()
+        return cls({alias: ingredient_id for alias, ingredient_id in rows})
+    
+    def resolve(self, headers: pd.Series) -> pd.Series:
+        """Vectorized header -> ingredient_id, memoizing each distinct header"""
+        headers = headers.astype(str)
+        unknown = pd.Series(headers[~headers.isin(self._resolved.keys())].unique())
+        if len(unknown):
+            cleaned = (
+                unknown.str.replace(r"\(.*?\)", "", regex=True)
+                .str.replace(r"\bused\b", "", case=False, regex=True)
+            )
+            ids = slugify(cleaned)
+            ids = ids.map(lambda i: self.aliases.get(i, i))
+            self._resolved.update(zip(unknown, ids))
+        return headers.map(self._resolved)
+
+_alias_table: Optional[AliasTable] = None
+_alias_signature = None
+
+def load_alias_table(conn) -> AliasTable:
+    """Process-wide alias table, reloaded only when ingredient_aliases changes"""
+    global _alias_table, _alias_signature
+    signature = tuple(conn.execute(
+        "SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM ingredient_aliases"
+    ).fetchone())
+    if _alias_table is None or signature != _alias_signature:
+        _alias_table = AliasTable.from_db(conn)
+        _alias_signature = signature
+    return _alias_table
+
+def parse_units(headers: pd.Series) -> pd.Series:
+    """Unit from a header suffix such as "(g)", "(count)" or "(pcs)" """
+    return headers.astype(str).str.extract(r"\(([^)]*)\)", expand=False).str.strip().str.lower()
+
+def ingredient_names(headers: pd.Series) -> pd.Series:
+    """Display names from raw ingredient headers"""
+    return (
+        headers.astype(str)
+        .str.replace(r"\(.*?\)", "", regex=True)
+        .str.replace(r"\bused\b", "", case=False, regex=True)
+        .str.strip()
+        .str.title()
+    )
+
+class Canonicalizer:
+    """Detects the kind of a raw chunk and maps it onto canonical tables"""
+    
+    def __init__(self, aliases: Optional[AliasTable] = None):
+        self.aliases = aliases or AliasTable()
+    
+    def normalize_columns(self, columns) -> List[str]:
+        """Lower-case, trim and snake_case column headers"""
+        return slugify(pd.Series(list(columns), dtype=object)).tolist()
+    
+    def detect(self, df: pd.DataFrame) -> Optional[str]:
+        """Classify a chunk: data_matrix_items, data_matrix_summary, recipe_matrix or a table name"""
+        columns = self.normalize_columns(df.columns)
+        column_set = set(columns)
+        
+        if {"count", "amount"} <= column_set:
+            if "item_name" in column_set:
+                return "data_matrix_items"
+            if column_set & {"group", "category"}:
+                return "data_matrix_summary"
+        
+        if {"quantity_per_shipment", "number_of_shipments", "frequency"} <= column_set:
+            return "shipment_schedule"
+        
+        for table, required in REQUIRED_COLUMNS.items():
+            if required <= column_set:
+                return table
+        
+        if columns and columns[0] in ("item_name", "menu_item", "item") and len(columns) > 2:
+            return "recipe_matrix"
+        return None
+    
+    def source_columns(self, columns, kind: Optional[str]) -> Optional[List[str]]:
+        """Raw columns canonicalize() reads for a chunk of this kind (None for all)"""
+        if kind == "recipe_matrix":
+            return None
+        needed = set(SOURCE_COLUMNS.get(kind, []))
+        return [raw for raw, name in zip(columns, self.normalize_columns(columns)) if name in needed]
+    
+    def canonicalize(self, df: pd.DataFrame, kind: str, context: Dict[str, str]) -> Dict[str, pd.DataFrame]:
+        """Map a chunk of the given kind to {table: rows}"""
+        if kind == "recipe_matrix":
+            # Raw headers carry the units, so map before normalizing them
+            return self._recipe_matrix(df)
+        
+        df = df.set_axis(self.normalize_columns(df.columns), axis=1)
+        if kind == "data_matrix_items":
+            return self._data_matrix_items(df, context)
+        if kind == "shipment_schedule":
+            return self._shipment_schedule(df)
+        if kind in CANONICAL_COLUMNS:
+            columns = [c for c in CANONICAL_COLUMNS[kind] if c in df.columns]
+            return {kind: df[columns]}
+        return {}
+    
+    def _data_matrix_items(self, df: pd.DataFrame, context: Dict[str, str]) -> Dict[str, pd.DataFrame]:
+        """Item-level monthly totals -> daily usage and sales rows per item
+        
+        The exports only carry month totals, so each item's count is spread
+        evenly over the days of the month (whole units, keeping the total)
+        and its revenue in proportion.
+        """
+        period = context.get("period")
+        if period is None:
+            raise ValueError(
+                f"Cannot tell which month {context.get('filename')!r} covers: name it with a "
+                "YYYYMMDD export stamp or a year, or set DATA_MATRIX_YEAR"
+            )
+        
+        items = pd.DataFrame({
+            "menu_item_name": df["item_name"].astype(str).str.strip(),
+            "count": parse_number(df["count"]).fillna(0),
+            "amount": parse_number(df["amount"]).fillna(0.0),
+        })
+        items = items[items["menu_item_name"].ne("") & items["menu_item_name"].ne("nan")]
+        items["menu_item_id"] = slugify(items["menu_item_name"])
+        
+        # An item can be listed more than once (e.g. across source tables)
+        totals = items.groupby("menu_item_id", sort=False).agg(
+            menu_item_name=("menu_item_name", "first"),
+            count=("count", "sum"),
+            amount=("amount", "sum"),
+        ).reset_index()
+        
+        dates = pd.date_range(period, periods=pd.Timestamp(period).days_in_month, freq="D").strftime("%Y-%m-%d")
+        days = len(dates)
+        counts = totals["count"].round().astype(int).to_numpy()[:, None]
+        # The first count % days days take one unit more than the rest
+        daily = counts // days + (np.arange(days) < counts % days)
+        share = np.where(counts != 0, daily / np.where(counts != 0, counts, 1), 1.0 / days)
+        revenue = totals["amount"].to_numpy()[:, None] * share
+        price = (totals["amount"] / totals["count"].where(totals["count"] > 0)).round(2).to_numpy()
+        
+        rows = pd.DataFrame({
+            "date": np.tile(dates, len(totals)),
+            "menu_item_id": np.repeat(totals["menu_item_id"].to_numpy(), days),
+            "menu_item_name": np.repeat(totals["menu_item_name"].to_numpy(), days),
+            "quantity": daily.ravel(),
+            "price": np.repeat(price, days),
+            "revenue": revenue.ravel(),
+        })
+        rows = rows[(rows["quantity"] != 0) | (rows["revenue"] != 0)]
+        
+        usage = rows[["date", "menu_item_id", "menu_item_name"]].assign(quantity_sold=rows["quantity"])
+        sales = rows[["date", "menu_item_id"]].assign(units_sold=rows["quantity"], price=rows["price"],
+                                                       revenue=rows["revenue"])
+        return {"usage": usage.reset_index(drop=True), "sales": sales.reset_index(drop=True)}
+    
+    def _shipment_schedule(self, df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """Delivery size and count per period for each ingredient
+        
+        A combined line such as "Peas + Carrot" applies to each ingredient.
+        """
+        df = df[df["ingredient"].notna()]
+        names = df["ingredient"].astype(str).str.split("+")
+        lines = df.assign(ingredient=names).explode("ingredient")
+        lines["ingredient"] = lines["ingredient"].str.strip()
+        lines = lines[lines["ingredient"].ne("")]
+        
+        frequency = lines["frequency"].astype(str).str.strip().str.lower().str.replace(r"[^a-z]", "", regex=True)
+        units = lines.get("unit_of_shipment", pd.Series(None, index=lines.index, dtype=object))
+        schedule = pd.DataFrame({
+            "ingredient_id": self.aliases.resolve(lines["ingredient"]).to_numpy(),
+            "ingredient_name": ingredient_names(lines["ingredient"]).to_numpy(),
+            "quantity_per_shipment": parse_number(lines["quantity_per_shipment"]).to_numpy(),
+            "unit": units.str.strip().str.lower().to_numpy(),
+            "shipments_per_period": parse_number(lines["number_of_shipments"]).to_numpy(),
+            "frequency": frequency.to_numpy(),
+            "period_days": frequency.map(PERIOD_DAYS).to_numpy(),
+        }).drop_duplicates("ingredient_id", keep="last")
+        return {"shipment_schedule": schedule}
+    
+    def _recipe_matrix(self, df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """Wide menu-item x ingredient matrix -> long recipe rows and ingredients"""
+        raw_headers = pd.Series(df.columns[1:])
+        ingredient_ids = self.aliases.resolve(raw_headers)
+        header_to_id = dict(zip(raw_headers, ingredient_ids))
+        
+        item_column = df.columns[0]
+        df = df[df[item_column].notna()]
+        long = df.melt(id_vars=[item_column], var_name="header", value_name="qty_per_serving")
+        long["qty_per_serving"] = parse_number(long["qty_per_serving"])
+        long = long[long["qty_per_serving"].notna() & (long["qty_per_serving"] > 0)]
+        
+        recipe = pd.DataFrame({
+            "menu_item_id": slugify(long[item_column]),
+            "ingredient_id": long["header"].map(header_to_id),
+            "qty_per_serving": long["qty_per_serving"],
+        }).drop_duplicates(["menu_item_id", "ingredient_id"], keep="last")
+        
+        ingredients = pd.DataFrame({
+            "ingredient_id": ingredient_ids,
+            "ingredient_name": ingredient_names(raw_headers),
+            "unit": parse_units(raw_headers),
+        }).drop_duplicates("ingredient_id")
+        return {"recipe": recipe, "ingredients": ingredients}
@@ -0,0 +1,147 @@
+"""
+In-process change feed fanned out to server-sent event subscribers.
+
+Services publish inventory diffs, low-stock alerts and shipment status
+changes once; each event is encoded as an SSE frame a single time and
+queued to every subscriber. Subscriber queues are bounded: a client that
+falls FEED_QUEUE_SIZE events behind has its backlog dropped and receives
+a `resync` event telling it to refetch the REST endpoints, so one slow
+tablet can neither stall publishers nor grow server memory.
+
+The last FEED_REPLAY_SIZE events are kept so a reconnecting client
+sending Last-Event-ID receives what it missed (or a resync if the gap is
+older than that).
+"""
+import asyncio
+import json
+import os
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+FEED_QUEUE_SIZE = int(os.getenv("FEED_QUEUE_SIZE", "256"))
+FEED_REPLAY_SIZE = int(os.getenv("FEED_REPLAY_SIZE", "1024"))
+# Comment frames sent to idle subscribers so proxies keep the connection open
+FEED_HEARTBEAT_SECONDS = float(os.getenv("FEED_HEARTBEAT_SECONDS", "15"))
+
+TOPICS = ("inventory", "alert", "shipment")
+KEEPALIVE = b": keepalive\n\n"
+
+def encode_event(event_id: int, event: str, data: Dict[str, Any]) -> bytes:
+    """One SSE frame"""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+class Subscriber:
+    """One connected client: its topics and bounded queue of encoded frames"""
+    
+    def __init__(self, topics: Optional[Iterable[str]], queue_size: int):
+        self.topics = set(topics) if topics else None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.resyncs = 0
+    
+    def wants(self, event: str) -> bool:
+        return self.topics is None or event in self.topics
+
+class ChangeFeed:
+    """Publishes events to every subscriber; must be used from the event loop thread"""
+    
+    def __init__(self, queue_size: int = FEED_QUEUE_SIZE, replay_size: int = FEED_REPLAY_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.recent = deque(maxlen=replay_size)
+        self.last_id = 0
+        self.published = 0
+        self.delivered = 0
+        self.resyncs = 0
+        self._heartbeat = None
+    
+    def publish(self, event: str, data: Dict[str, Any]) -> int:
+        """Queue an event for every interested subscriber; returns its id"""
+        self.last_id += 1
+        frame = encode_event(self.last_id, event, data)
+        self.recent.append((self.last_id, event, frame))
+        self.published += 1
+        for subscriber in self.subscribers:
+            if subscriber.wants(event):
+                self._offer(subscriber, frame)
+        return self.last_id
+    
+    def subscribe(self, topics: Optional[Iterable[str]] = None, last_event_id: Optional[str] = None) -> Subscriber:
+        """Register a subscriber, replaying events after last_event_id if still held"""
+        subscriber = Subscriber(topics, self.queue_size)
+        self.subscribers.add(subscriber)
+        if last_event_id is not None:
+            try:
+                after = int(last_event_id)
+            except ValueError:
+                after = 0
+            if after < self.last_id:
+                oldest = self.recent[0][0] if self.recent else self.last_id + 1
+                if after + 1 < oldest:
+                    self._resync(subscriber, "replay_expired")
+                else:
+                    for event_id, event, frame in self.recent:
+                        if event_id > after and subscriber.wants(event):
+                            self._offer(subscriber, frame)
+        return subscriber
+    
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+    
+    async def stream(self, subscriber: Subscriber) -> AsyncIterator[bytes]:
+        """SSE byte stream for one subscriber; unsubscribes when the client goes away
+        
+        Frames queued while the previous write was in flight go out as one
+        write, so a client that is briefly behind catches up in few sends.
+        """
+        self._schedule_heartbeat()
+        try:
+            yield f"retry: 3000\nid: {self.last_id}\nevent: hello\ndata: {{}}\n\n".encode()
+            queue = subscriber.queue
+            while True:
+                frames = [await queue.get()]
+                while not queue.empty():
+                    frames.append(queue.get_nowait())
+                self.delivered += sum(frame is not KEEPALIVE for frame in frames)
+                yield b"".join(frames)
+        finally:
+            self.unsubscribe(subscriber)
+    
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "last_event_id": self.last_id,
+            "published": self.published,
+            "delivered": self.delivered,
+            "resyncs": self.resyncs,
+            "queued": sum(subscriber.queue.qsize() for subscriber in self.subscribers),
+            "queue_size": self.queue_size
+        }
+    
+    def _schedule_heartbeat(self):
+        """One timer for all subscribers instead of a timeout per queue read"""
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.get_running_loop().call_later(FEED_HEARTBEAT_SECONDS, self._beat)
+    
+    def _beat(self):
+        """Keepalive comment to every idle subscriber"""
+        self._heartbeat = None
+        for subscriber in self.subscribers:
+            if subscriber.queue.empty():
+                subscriber.queue.put_nowait(KEEPALIVE)
+        if self.subscribers:
+            self._schedule_heartbeat()
+    
+    def _offer(self, subscriber: Subscriber, frame: bytes):
+        """Queue a frame, replacing the backlog with a resync if the subscriber is too far behind"""
+        try:
+            subscriber.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self._resync(subscriber, "lagged")
+    
+    def _resync(self, subscriber: Subscriber, reason: str):
+        """Drop queued frames and tell the client to refetch state"""
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(encode_event(self.last_id, "resync", {"reason": reason}))
+        subscriber.resyncs += 1
+        self.resyncs += 1
@@ -1,62 +1,517 @@
 import pandas as pd
+import hashlib
 import uuid
+import shutil
+import tempfile
+import time
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, BinaryIO, Iterator, List, Tuple
 from app.database import get_db
+from app.executor import run_io, run_cpu
+from app.lead_times import rebuild_lead_times, sync_lead_times
+from app.stock_ledger import sync_stock_ledger, rebuild_stock_ledger
+from app.canonicalizer import Canonicalizer, load_alias_table, parse_period, slugify
+from app.processed_store import ProcessedStore
 import os
 
+# Rows parsed, mapped and inserted per chunk (a file loads in one transaction)
+CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "50000"))
+
+# Tables whose rows are tagged with the file they were loaded from
+SOURCED_TABLES = ("purchases", "shipments", "usage", "sales")
+
+def iter_chunks(path: str, file_ext: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """Yield (sheet_name, chunk) pairs of at most chunk_rows rows from a spooled upload"""
+    if file_ext == '.csv':
+        for chunk in pd.read_csv(path, chunksize=chunk_rows):
+            yield "data", chunk
+        return
+    
+    if file_ext == '.xls':
+        # Legacy format has no streaming reader; slice the parsed sheets instead
+        for sheet, df in pd.read_excel(path, sheet_name=None).items():
+            for start in range(0, len(df), chunk_rows):
+                yield sheet, df.iloc[start:start + chunk_rows]
+        return
+    
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            rows = worksheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+            
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= chunk_rows:
+                    yield worksheet.title, pd.DataFrame(batch, columns=columns)
+                    batch = []
+            if batch:
+                yield worksheet.title, pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+def fingerprint_chunk(chunk: pd.DataFrame) -> str:
+    """Digest of a chunk's header and rows that does not depend on inferred dtypes"""
+    normalized = chunk.apply(
+        lambda column: column.astype(float)
+        if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
+        else column
+    ).astype(str)
+    digest = hashlib.sha1("\x1f".join(map(str, chunk.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(normalized, index=False).values.tobytes())
+    return digest.hexdigest()
+
+def ingest_file(path: str, filename: str, file_ext: str, processed_data_dir: str,
+                content_hash: Optional[str] = None, size_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """Process pool entry point for DataProcessor.ingest_path"""
+    processor = DataProcessor(processed_data_dir)
+    return processor.ingest_path(path, filename, file_ext, content_hash, size_bytes)
+
+def canonicalize_files(processed_data_dir: str, file_id: Optional[str] = None,
+                       since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Any]:
+    """Process pool entry point for DataProcessor._canonicalize_data"""
+    processor = DataProcessor(processed_data_dir)
+    return processor._canonicalize_data(file_id, since, until)
+
 class DataProcessor:
-    def __init__(self):
-        self.processed_data_dir = "./data/processed"
+    def __init__(self, processed_data_dir: str = "./data/processed"):
+        self.processed_data_dir = processed_data_dir
+        self.store = ProcessedStore(processed_data_dir)
         os.makedirs(self.processed_data_dir, exist_ok=True)
     
-    async def process_file(self, df: pd.DataFrame, filename: str) -> str:
-        """Process uploaded file and return file_id"""
-        file_id = str(uuid.uuid4())
+    async def ingest_upload(self, fileobj: BinaryIO, filename: str, file_ext: str) -> Dict[str, Any]:
+        """Spool an upload to disk and ingest it chunk by chunk in the process pool
+        
+        An upload identical to one already ingested is a no-op that returns
+        the existing file_id.
+        """
+        path, content_hash, size_bytes = await run_io(self._spool_to_disk, fileobj, file_ext)
+        try:
+            existing = await run_io(self._find_by_hash, content_hash)
+            if existing:
+                return self._unchanged_summary(existing, size_bytes)
+            return await run_cpu(ingest_file, path, filename, file_ext, self.processed_data_dir,
+                                 content_hash, size_bytes)
+        finally:
+            os.remove(path)
+    
+    def _spool_to_disk(self, fileobj: BinaryIO, file_ext: str) -> Tuple[str, str, int]:
+        """Copy an upload stream to a temporary file, hashing it on the way"""
+        fd, path = tempfile.mkstemp(suffix=file_ext)
+        digest = hashlib.sha256()
+        size_bytes = 0
+        with os.fdopen(fd, "wb") as out:
+            for block in iter(lambda: fileobj.read(1 << 20), b""):
+                digest.update(block)
+                out.write(block)
+                size_bytes += len(block)
+        return path, digest.hexdigest(), size_bytes
+    
+    def _hash_file(self, path: str) -> Tuple[str, int]:
+        """SHA-256 and size of a file on disk"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest(), os.path.getsize(path)
+    
+    def _find_by_hash(self, content_hash: str) -> Optional[Tuple[str, int]]:
+        """(file_id, rows_processed) of an upload with identical content, if any"""
+        with get_db() as conn:
+            row = conn.execute(
+                "SELECT file_id, rows_processed FROM files WHERE content_hash = ? LIMIT 1",
+                (content_hash,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+    
+    def _unchanged_summary(self, existing: Tuple[str, int], size_bytes: int) -> Dict[str, Any]:
+        """Result for an upload that matched an earlier one byte for byte"""
+        file_id, rows = existing
+        return {
+            "file_id": file_id,
+            "status": "unchanged",
+            "rows_processed": 0,
+            "rows_loaded": {},
+            "rows_skipped": rows or 0,
+            "bytes_skipped": size_bytes,
+            "kinds": [],
+            "stock_changes": {},
+            "seconds": 0.0,
+            "rows_per_second": 0.0
+        }
+    
+    def ingest_path(self, path: str, filename: str, file_ext: str,
+                    content_hash: Optional[str] = None, size_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """Stream a file into the processed store and canonical tables (blocking)
+        
+        A new version of an earlier upload with the same filename keeps its
+        file_id. If the earlier version is a prefix of the new one, only the
+        appended rows are loaded; otherwise the file is re-ingested in full.
+        """
+        started = time.perf_counter()
+        if content_hash is None:
+            content_hash, size_bytes = self._hash_file(path)
+        
+        existing = self._find_by_hash(content_hash)
+        if existing:
+            return self._unchanged_summary(existing, size_bytes)
+        
+        previous = self._previous_version(filename)
+        file_id = previous[0] if previous else str(uuid.uuid4())
+        # Canonical rows, metadata and fingerprints commit together; the new
+        # Parquet parts are staged and only moved into place after that
+        staged = self.store.staging()
+        try:
+            with get_db(write=True) as conn:
+                summary = None
+                if previous:
+                    summary = self._ingest_appended(conn, staged, path, file_id, filename, file_ext)
+                    if summary is not None:
+                        summary["status"] = "appended"
+                        summary["bytes_skipped"] = previous[1] or 0
+                    else:
+                        # Undo whatever the abandoned append loaded or staged
+                        conn.rollback()
+                        staged.reset(file_id)
+                
+                if summary is None:
+                    summary = self._ingest_full(conn, staged, path, file_id, filename, file_ext)
+                    summary["status"] = "replaced" if previous else "new"
+                    summary["rows_skipped"] = 0
+                    summary["bytes_skipped"] = 0
+                
+                self._record_file(conn, file_id, filename, content_hash, size_bytes,
+                                  summary["rows_processed"], summary.pop("fingerprints"))
+                conn.commit()
+        except BaseException:
+            staged.discard()
+            raise
+        
+        appended = summary["status"] == "appended"
+        if not appended:
+            self._remove_legacy_copy(file_id)
+        self.store.promote(staged, file_id, replace=not appended)
         
-        # Save processed file
-        file_path = os.path.join(self.processed_data_dir, f"{file_id}.csv")
-        df.to_csv(file_path, index=False)
+        elapsed = time.perf_counter() - started
+        rows_per_second = summary["rows_processed"] / elapsed if elapsed > 0 else 0.0
+        print(f"Ingested {filename} ({summary['status']}): {summary['rows_processed']} rows, "
+              f"{summary['rows_skipped']} skipped in {elapsed:.2f}s ({rows_per_second:.0f} rows/s)")
         
-        # Store metadata
+        return {
+            "file_id": file_id,
+            **summary,
+            "seconds": elapsed,
+            "rows_per_second": rows_per_second
+        }
+    
+    def _record_file(self, conn, file_id: str, filename: str, content_hash: str, size_bytes: Optional[int],
+                     rows_processed: int, fingerprints: List[Tuple]):
+        """Store metadata and the fingerprints the next version is compared against"""
+        conn.execute("""
+            INSERT INTO files (file_id, filename, uploaded_at, rows_processed, content_hash, size_bytes)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(file_id) DO UPDATE SET
+                uploaded_at = excluded.uploaded_at,
+                rows_processed = excluded.rows_processed,
+                content_hash = excluded.content_hash,
+                size_bytes = excluded.size_bytes
+        """, (file_id, filename, datetime.now().isoformat(), rows_processed, content_hash, size_bytes))
+        conn.execute("DELETE FROM file_fingerprints WHERE file_id = ?", (file_id,))
+        conn.executemany("""
+            INSERT INTO file_fingerprints (file_id, sheet, chunk_index, row_start, row_end, fingerprint)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(file_id, *fp) for fp in fingerprints])
+    
+    def _previous_version(self, filename: str) -> Optional[Tuple[str, int]]:
+        """(file_id, size_bytes) of the latest earlier upload with this filename"""
         with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO files (file_id, filename, uploaded_at, rows_processed)
-                VALUES (?, ?, ?, ?)
-            """, (file_id, filename, datetime.now().isoformat(), len(df)))
-            conn.commit()
+            row = conn.execute("""
+                SELECT file_id, size_bytes FROM files
+                WHERE filename = ?
+                ORDER BY uploaded_at DESC
+                LIMIT 1
+            """, (filename,)).fetchone()
+        return (row[0], row[1]) if row else None
+    
+    def _ingest_full(self, conn, staged: ProcessedStore, path: str, file_id: str, filename: str,
+                     file_ext: str) -> Dict[str, Any]:
+        """Replace every row loaded for file_id with this file, staging its processed copy"""
+        period = parse_period(filename)
+        
+        fingerprints = []
         
-        return file_id
+        def persisted_chunks():
+            # Write each chunk to the columnar store as it streams past
+            offsets = {}
+            for sheet, chunk in iter_chunks(path, file_ext):
+                row_start = offsets.get(sheet, 0)
+                chunk_index = sum(1 for fp in fingerprints if fp[0] == sheet)
+                fingerprints.append((sheet, chunk_index, row_start, row_start + len(chunk),
+                                     fingerprint_chunk(chunk)))
+                staged.write_chunk(file_id, period, self._sheet_name(sheet), chunk)
+                offsets[sheet] = row_start + len(chunk)
+                yield sheet, chunk
+        
+        summary = self._canonicalize_chunks(conn, file_id, filename, persisted_chunks())
+        summary["fingerprints"] = fingerprints
+        return summary
     
-    async def canonicalize_data(self, file_id: Optional[str] = None) -> Dict[str, Any]:
+    def _ingest_appended(self, conn, staged: ProcessedStore, path: str, file_id: str, filename: str,
+                         file_ext: str) -> Optional[Dict[str, Any]]:
+        """Load only rows past the previous version of file_id
+        
+        Returns None when the previous version is not a prefix of this file
+        (rows changed, removed or re-chunked), in which case the caller
+        rolls back and falls back to a full re-ingest.
+        """
+        rows = conn.execute("""
+            SELECT sheet, chunk_index, row_start, row_end, fingerprint
+            FROM file_fingerprints WHERE file_id = ?
+        """, (file_id,)).fetchall()
+        previous = {(r[0], r[1]): (r[2], r[3], r[4]) for r in rows}
+        if not previous or self._legacy_parts(file_id):
+            return None
+        period = parse_period(filename)
+        
+        fingerprints = []
+        matched = set()
+        state = {"diverged": False, "rows_skipped": 0}
+        
+        def new_rows():
+            offsets = {}
+            for sheet, chunk in iter_chunks(path, file_ext):
+                row_start = offsets.get(sheet, 0)
+                chunk_index = sum(1 for fp in fingerprints if fp[0] == sheet)
+                offsets[sheet] = row_start + len(chunk)
+                fingerprints.append((sheet, chunk_index, row_start, row_start + len(chunk),
+                                     fingerprint_chunk(chunk)))
+                
+                prior = previous.get((sheet, chunk_index))
+                if prior:
+                    prior_start, prior_end, prior_fingerprint = prior
+                    prior_rows = prior_end - prior_start
+                    if (prior_start != row_start or len(chunk) < prior_rows
+                            or fingerprint_chunk(chunk.iloc[:prior_rows]) != prior_fingerprint):
+                        state["diverged"] = True
+                        return
+                    matched.add((sheet, chunk_index))
+                    state["rows_skipped"] += prior_rows
+                    chunk = chunk.iloc[prior_rows:]
+                
+                if len(chunk):
+                    staged.write_chunk(file_id, period, self._sheet_name(sheet), chunk)
+                    yield sheet, chunk
+        
+        summary = self._canonicalize_chunks(conn, file_id, filename, new_rows(), replace=False)
+        if state["diverged"] or matched != set(previous):
+            return None
+        
+        summary["rows_processed"] += state["rows_skipped"]
+        summary["rows_skipped"] = state["rows_skipped"]
+        summary["fingerprints"] = fingerprints
+        return summary
+    
+    def _sheet_name(self, sheet: str) -> str:
+        """File-safe name for one sheet of an upload"""
+        return slugify(pd.Series([sheet]))[0] or "data"
+    
+    def _legacy_parts(self, file_id: str) -> List[Tuple[str, str]]:
+        """(sheet, path) of CSV processed copies written before the columnar store"""
+        parts = []
+        legacy_path = os.path.join(self.processed_data_dir, f"{file_id}.csv")
+        if os.path.exists(legacy_path):
+            parts.append(("data", legacy_path))
+        file_dir = os.path.join(self.processed_data_dir, file_id)
+        if os.path.isdir(file_dir):
+            for name in sorted(os.listdir(file_dir)):
+                parts.append((os.path.splitext(name)[0], os.path.join(file_dir, name)))
+        return parts
+    
+    def _remove_legacy_copy(self, file_id: str):
+        """Delete CSV processed copies of file_id"""
+        legacy_path = os.path.join(self.processed_data_dir, f"{file_id}.csv")
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        shutil.rmtree(os.path.join(self.processed_data_dir, file_id), ignore_errors=True)
+    
+    def _iter_processed(self, file_id: str) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """Stream the processed copy of an upload back as (sheet, chunk) pairs
+        
+        Each part's kind is detected from its Parquet schema so only the
+        columns canonicalization uses are read. Uploads not yet migrated by
+        app.migrate_processed are read from their CSV copies.
+        """
+        legacy_parts = self._legacy_parts(file_id)
+        if legacy_parts:
+            for sheet, path in legacy_parts:
+                for _, chunk in iter_chunks(path, '.csv'):
+                    yield sheet, chunk
+            return
+        
+        canonicalizer = Canonicalizer()
+        for sheet, path in self.store.parts(file_id):
+            columns = self.store.schema(path)
+            kind = canonicalizer.detect(pd.DataFrame(columns=columns))
+            yield sheet, self.store.read(path, canonicalizer.source_columns(columns, kind))
+    
+    def _canonicalize_chunks(self, conn, file_id: str, filename: str, chunks, replace: bool = True) -> Dict[str, Any]:
+        """Map raw chunks onto canonical tables over a write connection
+        
+        With replace=True anything this file loaded before is removed first;
+        with replace=False the chunks are added to what is already there.
+        The caller commits, so a failed upload leaves the previous rows in
+        place.
+        """
+        context = {"filename": filename, "period": parse_period(filename)}
+        
+        rows_processed = 0
+        rows_loaded = {}
+        kinds = set()
+        replaced = self._delete_file_rows(conn, file_id) if replace else False
+        canonicalizer = Canonicalizer(load_alias_table(conn))
+        
+        for sheet, chunk in chunks:
+            rows_processed += len(chunk)
+            kind = canonicalizer.detect(chunk)
+            if kind is None:
+                continue
+            kinds.add(kind)
+            
+            tables = canonicalizer.canonicalize(chunk, kind, context)
+            if not tables:
+                continue
+            replaced |= self._load_tables(conn, file_id, kind, tables)
+            for table, df in tables.items():
+                rows_loaded[table] = rows_loaded.get(table, 0) + len(df)
+        
+        # Fold the new rows into the stock ledger and lead-time statistics;
+        # deletes and recipe changes invalidate already-applied totals, so
+        # rebuild for those
+        if replaced:
+            stock_changes = rebuild_stock_ledger(conn)
+            rebuild_lead_times(conn)
+        else:
+            stock_changes = sync_stock_ledger(conn) if rows_loaded else {}
+            if "shipments" in rows_loaded:
+                sync_lead_times(conn)
+        
+        return {
+            "rows_processed": rows_processed,
+            "rows_loaded": rows_loaded,
+            "kinds": sorted(kinds),
+            "stock_changes": stock_changes
+        }
+    
+    def _delete_file_rows(self, conn, file_id: str) -> bool:
+        """Remove rows previously loaded from file_id; True if any were removed"""
+        before = conn.total_changes
+        for table in SOURCED_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE source_file_id = ?", (file_id,))
+        return conn.total_changes > before
+    
+    def _load_tables(self, conn, file_id: str, kind: str, tables: Dict[str, pd.DataFrame]) -> bool:
+        """Write canonicalized rows; True if existing rows were replaced"""
+        replaced = False
+        for table, df in tables.items():
+            if df.empty:
+                continue
+            
+            if table == "ingredients":
+                conn.executemany("""
+                    INSERT INTO ingredients (ingredient_id, ingredient_name, unit)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(ingredient_id) DO UPDATE SET
+                        unit = COALESCE(ingredients.unit, excluded.unit)
+                """, self._records(df[["ingredient_id", "ingredient_name", "unit"]]))
+                continue
+            
+            if table == "shipment_schedule":
+                # The schedule file is the whole schedule for the ingredients it lists
+                self._bulk_insert(conn, table, df, verb="INSERT OR REPLACE")
+                continue
+            
+            if table == "recipe":
+                # Recipe changes alter how past usage explodes into ingredients
+                self._bulk_insert(conn, table, df, verb="INSERT OR REPLACE")
+                replaced = True
+                continue
+            
+            if kind == "data_matrix_items":
+                # Monthly totals supersede whatever an earlier export loaded for the same month
+                before = conn.total_changes
+                months = df.groupby("menu_item_id")["date"].min().reset_index()
+                conn.executemany(f"""
+                    DELETE FROM {table} WHERE menu_item_id = :menu_item_id
+                    AND date >= date(:date, 'start of month') AND date < date(:date, 'start of month', '+1 month')
+                """, months.to_dict("records"))
+                replaced |= conn.total_changes > before
+            
+            self._bulk_insert(conn, table, df.assign(source_file_id=file_id))
+        return replaced
+    
+    def _bulk_insert(self, conn, table: str, df: pd.DataFrame, verb: str = "INSERT"):
+        """Insert a mapped chunk with a single executemany"""
+        columns = list(df.columns)
+        placeholders = ", ".join("?" for _ in columns)
+        conn.executemany(
+            f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            self._records(df)
+        )
+    
+    def _records(self, df: pd.DataFrame):
+        """Row tuples with NaN converted to NULL"""
+        return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    
+    async def canonicalize_data(self, file_id: Optional[str] = None,
+                                since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Any]:
         """Clean and canonicalize data based on schema"""
-        try:
-            # Load the file if file_id is provided
+        return await run_cpu(canonicalize_files, self.processed_data_dir, file_id, since, until)
+    
+    def _canonicalize_data(self, file_id: Optional[str] = None,
+                           since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Any]:
+        """Re-run canonicalization over processed uploads (blocking)
+        
+        With no file_id every recorded upload is reprocessed, or only those
+        partitioned in months since..until (YYYY-MM) when given. Rows a file
+        loaded before are replaced, so this is safe to repeat.
+        """
+        with get_db() as conn:
             if file_id:
-                file_path = os.path.join(self.processed_data_dir, f"{file_id}.csv")
-                if os.path.exists(file_path):
-                    df = pd.read_csv(file_path)
-                    # Here you would implement actual schema mapping
-                    # For now, return success status
-                    return {
-                        "status": "processed",
-                        "tables": ["purchases", "shipments", "usage", "ingredients", "sales"],
-                        "rows_processed": len(df),
-                        "file_id": file_id
-                    }
-        except Exception as e:
-            print(f"Error in canonicalize_data: {e}")
+                files = conn.execute(
+                    "SELECT file_id, filename FROM files WHERE file_id = ?", (file_id,)
+                ).fetchall()
+            else:
+                files = conn.execute("SELECT file_id, filename FROM files ORDER BY uploaded_at").fetchall()
+        if not file_id and (since or until):
+            in_range = self.store.file_months(since, until)
+            files = [row for row in files if row[0] in in_range]
         
-        return {
+        rows_processed = 0
+        rows_loaded = {}
+        stock_changes = {}
+        for row in files:
+            with get_db(write=True) as conn:
+                summary = self._canonicalize_chunks(conn, row[0], row[1], self._iter_processed(row[0]))
+                conn.commit()
+            rows_processed += summary["rows_processed"]
+            for table, count in summary["rows_loaded"].items():
+                rows_loaded[table] = rows_loaded.get(table, 0) + count
+            for ingredient_id, delta in summary["stock_changes"].items():
+                stock_changes[ingredient_id] = stock_changes.get(ingredient_id, 0.0) + delta
+        
+        result = {
             "status": "processed",
-            "tables": ["purchases", "shipments", "usage", "ingredients", "sales"],
-            "rows_processed": 0
+            "tables": sorted(rows_loaded),
+            "rows_processed": rows_processed,
+            "rows_loaded": rows_loaded,
+            "stock_changes": stock_changes
         }
-    
-    def map_to_schema(self, df: pd.DataFrame, schema_type: str) -> pd.DataFrame:
-        """Map DataFrame to canonical schema"""
-        # Implementation would depend on the actual schema mapping
-        # This is a placeholder
-        return df
-
+        if file_id:
+            result["file_id"] = file_id
+        return result
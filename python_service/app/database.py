@@ -1,17 +1,206 @@
 import sqlite3
 import os
-from contextlib import contextmanager
+import threading
+import time
+import weakref
+import asyncio
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any
 
 DB_PATH = os.getenv("DATABASE_URL", "sqlite:///./data/msy_inventory.db").replace("sqlite:///", "")
 
+# Per-connection pragmas; journal_mode=WAL is persistent and set once in init_db
+SQLITE_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -int(os.getenv("SQLITE_CACHE_KB", "65536")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+ASYNC_POOL_SIZE = int(os.getenv("SQLITE_ASYNC_POOL_SIZE", "4"))
+
 # Ensure directory exists
 db_dir = os.path.dirname(DB_PATH) if os.path.dirname(DB_PATH) else "."
 if db_dir:
     os.makedirs(db_dir, exist_ok=True)
 
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that pools can track with weak references"""
+
+def _apply_pragmas(conn, readonly: bool = False):
+    """Apply the tuned per-connection pragmas"""
+    for name, value in SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    if readonly:
+        conn.execute("PRAGMA query_only=ON")
+
+class ConnectionPool:
+    """Thread-affine connection pool: each thread reuses its own connection"""
+    
+    def __init__(self, name: str, readonly: bool = False):
+        self.name = name
+        self.readonly = readonly
+        self._local = threading.local()
+        # Connections die with their thread; the weak set only counts them
+        self._open = weakref.WeakSet()
+        self._stats_lock = threading.Lock()
+        self._stats = {"opened": 0, "checkouts": 0, "in_use": 0}
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection with pragmas applied"""
+        conn = sqlite3.connect(DB_PATH, factory=PooledConnection)
+        conn.row_factory = sqlite3.Row
+        _apply_pragmas(conn, self.readonly)
+        self._open.add(conn)
+        with self._stats_lock:
+            self._stats["opened"] += 1
+        return conn
+    
+    def _thread_connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        # A forked child must not reuse its parent's handle
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Check out this thread's connection"""
+        conn = self._thread_connection()
+        with self._stats_lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+        try:
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            with self._stats_lock:
+                self._stats["in_use"] -= 1
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Checkout and connection counters"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["open_connections"] = len(self._open)
+        stats["reused"] = stats["checkouts"] - stats["opened"]
+        return stats
+
+class WriteConnectionPool(ConnectionPool):
+    """Thread-affine pool whose checkouts are serialized: SQLite has one writer"""
+    
+    def __init__(self, name: str):
+        super().__init__(name, readonly=False)
+        self._write_lock = threading.RLock()
+        self._wait_seconds = 0.0
+    
+    @contextmanager
+    def connection(self):
+        """Check out this thread's connection once no other writer holds the lock"""
+        started = time.perf_counter()
+        with self._write_lock:
+            self._wait_seconds += time.perf_counter() - started
+            with super().connection() as conn:
+                yield conn
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Checkout counters plus total time spent waiting for the write lock"""
+        stats = super().metrics()
+        stats["lock_wait_seconds"] = round(self._wait_seconds, 6)
+        return stats
+
+class AsyncConnectionPool:
+    """Fixed-size pool of aiosqlite connections for use from async code"""
+    
+    def __init__(self, size: int):
+        self.size = size
+        self._queue = None
+        self._created = 0
+        self._checkouts = 0
+    
+    async def _acquire(self):
+        """Take an idle connection, opening a new one while under the size limit"""
+        import aiosqlite
+        
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._queue.empty() and self._created < self.size:
+            # Reserve the slot before awaiting so concurrent callers stay under size
+            self._created += 1
+            try:
+                conn = await aiosqlite.connect(DB_PATH)
+            except Exception:
+                self._created -= 1
+                raise
+            try:
+                conn.row_factory = sqlite3.Row
+                for name, value in SQLITE_PRAGMAS.items():
+                    await conn.execute(f"PRAGMA {name}={value}")
+            except Exception:
+                self._created -= 1
+                await conn.close()
+                raise
+            return conn
+        return await self._queue.get()
+    
+    @asynccontextmanager
+    async def connection(self):
+        """Check out a connection and return it to the pool afterwards"""
+        conn = await self._acquire()
+        self._checkouts += 1
+        try:
+            yield conn
+        finally:
+            self._queue.put_nowait(conn)
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Checkout and connection counters"""
+        return {
+            "size": self.size,
+            "opened": self._created,
+            "checkouts": self._checkouts,
+            "idle": self._queue.qsize() if self._queue else 0
+        }
+    
+    async def close(self):
+        """Close idle connections (called on application shutdown)
+        
+        Each aiosqlite connection runs its own non-daemon thread, so a
+        process that opened any must close them before it can exit.
+        """
+        while self._queue is not None and not self._queue.empty():
+            conn = self._queue.get_nowait()
+            self._created -= 1
+            await conn.close()
+        if self._created == 0:
+            # A later event loop gets a fresh queue
+            self._queue = None
+    
+    async def __aenter__(self) -> "AsyncConnectionPool":
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+read_pool = ConnectionPool("read", readonly=True)
+write_pool = WriteConnectionPool("write")
+async_pool = AsyncConnectionPool(ASYNC_POOL_SIZE)
+
+def _add_column(cursor, table: str, column: str, column_type: str):
+    """Add a column to an existing table if it is missing"""
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
 def init_db():
     """Initialize database with schema"""
     conn = sqlite3.connect(DB_PATH)
+    conn.execute("PRAGMA journal_mode=WAL")
     cursor = conn.cursor()
     
     # Create tables
@@ -95,16 +284,221 @@ def init_db():
         )
     """)
     
+    # Rows loaded from an upload remember their file so re-processing it is idempotent
+    for table in ("purchases", "shipments", "usage", "sales"):
+        _add_column(cursor, table, "source_file_id", "TEXT")
+    
+    # Content hash of the latest version of each upload, for deduplication
+    _add_column(cursor, "files", "content_hash", "TEXT")
+    _add_column(cursor, "files", "size_bytes", "INTEGER")
+    
+    # Quantity to order when an ingredient reaches its reorder point (set by replenishment)
+    _add_column(cursor, "ingredients", "order_quantity", "REAL")
+    
+    # Fingerprint of each ingested chunk (row range) of each sheet of an upload
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS file_fingerprints (
+            file_id TEXT,
+            sheet TEXT,
+            chunk_index INTEGER,
+            row_start INTEGER,
+            row_end INTEGER,
+            fingerprint TEXT,
+            PRIMARY KEY (file_id, sheet, chunk_index)
+        )
+    """)
+    
+    # Raw header spellings mapped to ingredient ids during canonicalization
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingredient_aliases (
+            alias TEXT PRIMARY KEY,
+            ingredient_id TEXT
+        )
+    """)
+    
+    # Running per-ingredient balance, maintained incrementally by ingestion;
+    # wasted_qty is stock written off when its lot expired (app/lots.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_ledger (
+            ingredient_id TEXT PRIMARY KEY,
+            purchased_qty REAL NOT NULL DEFAULT 0,
+            used_qty REAL NOT NULL DEFAULT 0,
+            wasted_qty REAL NOT NULL DEFAULT 0,
+            on_hand REAL NOT NULL DEFAULT 0,
+            updated_at TEXT
+        )
+    """)
+    _add_column(cursor, "stock_ledger", "wasted_qty", "REAL NOT NULL DEFAULT 0")
+    
+    # Highest source row already applied to stock_ledger, per source table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_ledger_watermarks (
+            source TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    
+    # Regular deliveries per ingredient ("MSY Data - Shipment.csv"): size and
+    # how many arrive per period
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS shipment_schedule (
+            ingredient_id TEXT PRIMARY KEY,
+            ingredient_name TEXT,
+            quantity_per_shipment REAL,
+            unit TEXT,
+            shipments_per_period REAL,
+            frequency TEXT,
+            period_days REAL
+        )
+    """)
+    
+    # Lead-time moments per vendor and ingredient, folded in as shipments arrive
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lead_time_stats (
+            vendor TEXT NOT NULL,
+            ingredient_id TEXT NOT NULL,
+            samples INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            m2 REAL NOT NULL,
+            updated_at TEXT,
+            PRIMARY KEY (vendor, ingredient_id)
+        )
+    """)
+    
+    # Highest shipment row already folded into lead_time_stats
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lead_time_watermark (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_id INTEGER NOT NULL
+        )
+    """)
+    
+    # Open lots per ingredient after replaying purchases and usage (app/lots.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_lots (
+            lot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ingredient_id TEXT NOT NULL,
+            purchase_id INTEGER,
+            received_date TEXT,
+            expiry_date TEXT,
+            quantity REAL,
+            remaining REAL,
+            unit_cost REAL
+        )
+    """)
+    
+    # Lots that expired with stock left
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lot_waste (
+            ingredient_id TEXT NOT NULL,
+            purchase_id INTEGER,
+            expiry_date TEXT,
+            quantity REAL,
+            cost REAL
+        )
+    """)
+    
+    # Day the lots were replayed through
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lot_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            as_of TEXT,
+            rebuilt_at TEXT
+        )
+    """)
+    
+    # Version of the in-memory inventory snapshot (the /inventory/levels ETag)
+    # and a digest of the rows it was loaded with
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventory_snapshot (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            digest TEXT
+        )
+    """)
+    
+    # Rolling-origin backtests: one row per run, per engine and per ingredient x engine
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backtest_runs (
+            run_id TEXT PRIMARY KEY,
+            started_at TEXT,
+            horizon INTEGER,
+            folds INTEGER,
+            step INTEGER,
+            ingredients INTEGER,
+            duration_seconds REAL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backtest_engines (
+            run_id TEXT,
+            engine TEXT,
+            mape REAL,
+            wape REAL,
+            bias REAL,
+            seconds REAL,
+            peak_bytes INTEGER,
+            PRIMARY KEY (run_id, engine)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backtest_results (
+            run_id TEXT,
+            ingredient_id TEXT,
+            engine TEXT,
+            mape REAL,
+            wape REAL,
+            bias REAL,
+            PRIMARY KEY (run_id, ingredient_id, engine)
+        )
+    """)
+    
+    # Secondary indexes for the join and date-range access paths
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_purchases_ingredient ON purchases (ingredient_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_purchases_date ON purchases (purchase_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_usage_date ON usage (date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_usage_menu_item ON usage (menu_item_id, date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipe_ingredient ON recipe (ingredient_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_lots_ingredient ON stock_lots (ingredient_id, expiry_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_lot_waste_expiry ON lot_waste (expiry_date, ingredient_id)")
+    # Shipment pages are keyset-ordered by (shipped_date, shipment_id), alone or within a filter
+    cursor.execute("DROP INDEX IF EXISTS idx_shipments_ingredient")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shipments_shipped ON shipments (shipped_date, shipment_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shipments_ingredient_shipped ON shipments (ingredient_id, shipped_date, shipment_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shipments_vendor_shipped ON shipments (vendor, shipped_date, shipment_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shipments_status_shipped ON shipments (status, shipped_date, shipment_id)")
+    # Shipments still in flight (incoming stock, status-change diffs)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_shipments_open ON shipments (ingredient_id)
+        WHERE arrived_date IS NULL OR status != 'delivered'
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_date ON sales (date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_menu_item ON sales (menu_item_id, date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_content_hash ON files (content_hash)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_filename ON files (filename, uploaded_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_backtest_runs_started ON backtest_runs (started_at)")
+    for table in ("purchases", "shipments", "usage", "sales"):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_source_file ON {table} (source_file_id)")
+    
     conn.commit()
     conn.close()
 
 @contextmanager
-def get_db():
-    """Database context manager"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
+def get_db(write: bool = False):
+    """Database context manager; pass write=True for statements that modify data"""
+    pool = write_pool if write else read_pool
+    with pool.connection() as conn:
         yield conn
-    finally:
-        conn.close()
+
+def get_async_db():
+    """Async database context manager backed by aiosqlite"""
+    return async_pool.connection()
+
+def pool_metrics() -> Dict[str, Any]:
+    """Connection pool metrics for monitoring"""
+    return {
+        "read": read_pool.metrics(),
+        "write": write_pool.metrics(),
+        "async": async_pool.metrics()
+    }
 
@@ -0,0 +1,85 @@
+"""
+Ingestion time for the sample exports in datafiles/.
+    
+    python -m app.datafiles_benchmark [target_seconds] [datafiles_dir]
+
+Loads the recipe matrix, the six monthly *_Data_Matrix.xlsx workbooks and
+the shipment schedule into a scratch database through
+DataProcessor.ingest_path, as /upload would. Reports rows/sec per file
+and the total against `target_seconds` (default 10), then re-runs
+canonicalization over every file and checks the canonical tables come out
+the same. Workbooks without a year in the name use DATA_MATRIX_YEAR
+(default 2025 here).
+"""
+import contextlib
+import glob
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATAFILES_DIR = os.path.join(os.path.dirname(SERVICE_DIR), "datafiles")
+TARGET_SECONDS = 10.0
+TABLES = ("recipe", "usage", "sales", "shipment_schedule")
+
+def datafiles(directory: str):
+    """Recipe matrix first (usage explodes through it), then workbooks, then shipments"""
+    return (
+        glob.glob(os.path.join(directory, "*Ingredient*.csv"))
+        + sorted(glob.glob(os.path.join(directory, "*_Data_Matrix*.xlsx")))
+        + glob.glob(os.path.join(directory, "*Shipment*.csv"))
+    )
+
+def table_counts(conn) -> dict:
+    """Row count per canonical table"""
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLES}
+
+def main():
+    target = float(sys.argv[1]) if len(sys.argv) > 1 else TARGET_SECONDS
+    directory = sys.argv[2] if len(sys.argv) > 2 else DATAFILES_DIR
+    scratch = tempfile.mkdtemp(prefix="msy-datafiles-")
+    # app.database reads DATABASE_URL on import
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(scratch, "datafiles.db")
+    os.environ.setdefault("DATA_MATRIX_YEAR", "2025")
+    from app.data_processor import DataProcessor
+    from app.database import get_db, init_db
+    
+    init_db()
+    processor = DataProcessor(os.path.join(scratch, "processed"))
+    paths = datafiles(directory)
+    if not paths:
+        sys.exit(f"No exports found in {directory}")
+    
+    print(f"{'file':<45}{'rows':>7}{'loaded':>8}{'ms':>9}{'rows/s':>9}")
+    rows = 0
+    started = time.perf_counter()
+    for path in paths:
+        filename = os.path.basename(path)
+        # ingest_path logs its own summary line
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = processor.ingest_path(path, filename, os.path.splitext(filename)[1].lower())
+        rows += summary["rows_processed"]
+        print(f"{filename:<45}{summary['rows_processed']:>7}{sum(summary['rows_loaded'].values()):>8}"
+              f"{summary['seconds'] * 1000:>9.1f}{summary['rows_per_second']:>9.0f}")
+    elapsed = time.perf_counter() - started
+    print(f"{len(paths)} files, {rows} rows in {elapsed:.2f}s ({rows / elapsed:.0f} rows/s), "
+          f"target {target:.0f}s: {'met' if elapsed <= target else 'missed'}")
+    
+    with get_db() as conn:
+        before = table_counts(conn)
+    started = time.perf_counter()
+    processor._canonicalize_data()
+    elapsed = time.perf_counter() - started
+    with get_db() as conn:
+        after = table_counts(conn)
+    print(f"Re-canonicalized in {elapsed:.2f}s; tables {'unchanged' if after == before else 'CHANGED'}: "
+          + ", ".join(f"{table}={count}" for table, count in after.items()))
+    shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+# Thread pool for blocking I/O (SQLite, file reads/writes)
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+# Process pool for CPU-bound work (model training, file parsing)
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "2"))
+
+# Maximum number of tasks in flight per pool; extra callers wait their turn
+IO_CONCURRENCY = int(os.getenv("IO_CONCURRENCY", str(IO_WORKERS * 4)))
+CPU_CONCURRENCY = int(os.getenv("CPU_CONCURRENCY", str(CPU_WORKERS)))
+
+_io_pool: Optional[ThreadPoolExecutor] = None
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+_io_semaphore = asyncio.Semaphore(IO_CONCURRENCY)
+_cpu_semaphore = asyncio.Semaphore(CPU_CONCURRENCY)
+_in_flight = {"io": 0, "cpu": 0}
+
+def get_io_pool() -> ThreadPoolExecutor:
+    """Return the shared I/O thread pool, creating it on first use"""
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="msy-io")
+    return _io_pool
+
+def get_cpu_pool() -> ProcessPoolExecutor:
+    """Return the shared CPU process pool, creating it on first use"""
+    global _cpu_pool
+    if _cpu_pool is None:
+        # spawn keeps torch and open SQLite handles out of the children
+        _cpu_pool = ProcessPoolExecutor(
+            max_workers=CPU_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _cpu_pool
+
+async def run_io(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking I/O function in the thread pool"""
+    async with _io_semaphore:
+        _in_flight["io"] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(get_io_pool(), partial(func, *args, **kwargs))
+        finally:
+            _in_flight["io"] -= 1
+
+async def run_cpu(func: Callable, *args, **kwargs) -> Any:
+    """Run a CPU-bound, picklable function in the process pool"""
+    async with _cpu_semaphore:
+        _in_flight["cpu"] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(get_cpu_pool(), partial(func, *args, **kwargs))
+        finally:
+            _in_flight["cpu"] -= 1
+
+def executor_metrics() -> Dict[str, Any]:
+    """Workers, concurrency limit and tasks in flight per pool"""
+    return {
+        "io": {"workers": IO_WORKERS, "concurrency": IO_CONCURRENCY, "in_flight": _in_flight["io"]},
+        "cpu": {"workers": CPU_WORKERS, "concurrency": CPU_CONCURRENCY, "in_flight": _in_flight["cpu"]}
+    }
+
+def shutdown_executors():
+    """Shut down both pools (called on application shutdown)"""
+    global _io_pool, _cpu_pool
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=False, cancel_futures=True)
+        _io_pool = None
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
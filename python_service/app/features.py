@@ -0,0 +1,284 @@
+"""
+Feature pipeline for the demand forecaster.
+
+Daily per-ingredient consumption is derived from usage x recipe (one
+sparse product per refresh, see recipe_explosion) and held as a dense
+(ingredients, days) matrix on a shared calendar. The model's
+input features are computed for every ingredient at once with
+sliding_window_view, and refreshed incrementally as new days arrive.
+"""
+import hashlib
+import os
+import threading
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, List, Optional, Tuple
+from app.recipe_explosion import RecipeExplosion, RecipeMatrix
+
+# Days of history in each model input window
+SEQ_LEN = int(os.getenv("FEATURE_SEQ_LEN", "28"))
+
+FEATURE_NAMES = [
+    "usage", "lag_7", "lag_14", "mean_7", "mean_28", "std_7",
+    "dow_sin", "dow_cos", "month_sin", "month_cos",
+]
+# Leading features that scale with usage (normalized per ingredient)
+USAGE_FEATURES = 6
+# Longest lookback of any feature; recomputing a day needs this much history
+CONTEXT_DAYS = 28
+
+DAILY_ITEM_SALES = """
+    SELECT menu_item_id, substr(date, 1, 10) AS day, SUM(quantity_sold) AS quantity
+    FROM usage
+    {where}
+    GROUP BY menu_item_id, day
+"""
+
+def _trailing_windows(usage: np.ndarray, window: int) -> np.ndarray:
+    """(N, T, window) view of the window days ending at each day, zero before day 0"""
+    padded = np.pad(usage, ((0, 0), (window - 1, 0)))
+    return sliding_window_view(padded, window, axis=1)
+
+def _lag(usage: np.ndarray, days: int) -> np.ndarray:
+    """Usage shifted forward by days, zero before day 0"""
+    return np.pad(usage, ((0, 0), (days, 0)))[:, :usage.shape[1]]
+
+def compute_features(usage: np.ndarray, dates: pd.DatetimeIndex) -> np.ndarray:
+    """(N, T, len(FEATURE_NAMES)) features for an (N, T) daily usage matrix"""
+    n, t = usage.shape
+    if t == 0:
+        return np.zeros((n, 0, len(FEATURE_NAMES)), np.float32)
+    week = _trailing_windows(usage, 7)
+    
+    dow = 2 * np.pi * dates.dayofweek.to_numpy() / 7
+    month = 2 * np.pi * (dates.month.to_numpy() - 1) / 12
+    calendar = [np.broadcast_to(values, (n, t)) for values in
+                (np.sin(dow), np.cos(dow), np.sin(month), np.cos(month))]
+    
+    return np.stack([
+        usage,
+        _lag(usage, 7),
+        _lag(usage, 14),
+        week.mean(axis=-1),
+        _trailing_windows(usage, 28).mean(axis=-1),
+        week.std(axis=-1),
+        *calendar,
+    ], axis=-1).astype(np.float32)
+
+def window_from_usage(usage: np.ndarray, dates: pd.DatetimeIndex, scale: np.ndarray, seq_len: int) -> np.ndarray:
+    """Scaled (N, seq_len, features) input ending on the last day of an (N, T) usage tail
+    
+    The tail needs CONTEXT_DAYS days before the window for the features
+    to match those computed over the full history.
+    """
+    features = compute_features(usage, dates)[:, -seq_len:]
+    features[..., :USAGE_FEATURES] /= scale[:, None, None]
+    if features.shape[1] < seq_len:
+        features = np.pad(features, ((0, 0), (seq_len - features.shape[1], 0), (0, 0)))
+    return np.ascontiguousarray(features, dtype=np.float32)
+
+class FeatureSet:
+    """Daily usage and features for every ingredient on one calendar"""
+    
+    def __init__(self, ingredient_ids: List[str], dates: pd.DatetimeIndex,
+                 usage: np.ndarray, features: np.ndarray):
+        self.ingredient_ids = ingredient_ids
+        self.index = {ingredient_id: row for row, ingredient_id in enumerate(ingredient_ids)}
+        self.dates = dates
+        self.usage = usage
+        self.features = features
+        # Day of each ingredient's first recorded use (len(dates) if never used)
+        active = usage > 0
+        first_use = active.argmax(axis=1) if active.shape[1] else np.zeros(len(ingredient_ids), np.int64)
+        self.first_active = np.where(active.any(axis=1), first_use, len(dates))
+        # Mean usage on days with any use, so every ingredient trains on a similar scale
+        used_days = np.maximum(active.sum(axis=1), 1)
+        self.scale = np.maximum(usage.sum(axis=1) / used_days, 1e-6).astype(np.float32)
+        self._data_versions: Optional[Dict[str, str]] = None
+    
+    @property
+    def days(self) -> int:
+        return len(self.dates)
+    
+    def data_versions(self) -> Dict[str, str]:
+        """Digest of each ingredient's daily usage and calendar, computed once per FeatureSet"""
+        if self._data_versions is None:
+            calendar = f"{self.dates[0]:%Y-%m-%d}:{self.dates[-1]:%Y-%m-%d}" if self.days else ""
+            self._data_versions = {
+                ingredient_id: hashlib.blake2b(
+                    self.usage[row].tobytes(), digest_size=8, key=calendar.encode()
+                ).hexdigest()
+                for ingredient_id, row in self.index.items()
+            }
+        return self._data_versions
+    
+    def has_history(self, ingredient_id: str) -> bool:
+        """True if the ingredient has been used at least once"""
+        row = self.index.get(ingredient_id)
+        return row is not None and self.first_active[row] < self.days
+    
+    def _scaled_features(self, rows=slice(None)) -> np.ndarray:
+        """Features with usage-derived columns divided by each ingredient's scale"""
+        features = self.features[rows].copy()
+        features[..., :USAGE_FEATURES] /= self.scale[rows, None, None]
+        return features
+    
+    def window_samples(self, seq_len: int, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, starts) of every training window, skipping windows that end before an ingredient's first use"""
+        windows = self.days - seq_len - horizon + 1
+        if windows < 1:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        starts = np.arange(windows)
+        keep = (starts[None, :] + seq_len - 1) >= self.first_active[:, None]
+        rows, starts = np.nonzero(keep)
+        return rows, starts
+    
+    def window_views(self, seq_len: int, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Strided (N, windows, features, seq_len) input and (N, windows, horizon) target views
+        
+        Indexing both with (rows, starts) from window_samples gathers a
+        batch without materializing every window.
+        """
+        scaled = self._scaled_features()
+        inputs = sliding_window_view(scaled[:, :max(self.days - horizon, 0)], seq_len, axis=1)
+        targets = sliding_window_view(
+            (self.usage[:, seq_len:] / self.scale[:, None]).astype(np.float32), horizon, axis=1
+        )
+        return inputs, targets
+    
+    def training_windows(self, seq_len: int, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(samples, seq_len, features) inputs and (samples, horizon) targets for all ingredients"""
+        rows, starts = self.window_samples(seq_len, horizon)
+        if len(rows) == 0:
+            return np.empty((0, seq_len, len(FEATURE_NAMES)), np.float32), np.empty((0, horizon), np.float32)
+        inputs, targets = self.window_views(seq_len, horizon)
+        return np.moveaxis(inputs[rows, starts], -1, -2).copy(), targets[rows, starts].copy()
+    
+    def latest_windows(self, ingredient_ids: List[str], seq_len: int, offset: int = 0) -> np.ndarray:
+        """(len(ingredient_ids), seq_len, features) inputs ending offset days before the last day"""
+        rows = np.array([self.index[i] for i in ingredient_ids], dtype=np.int64)
+        scaled = self._scaled_features(rows)[:, :max(self.days - offset, 0)][:, -seq_len:]
+        if scaled.shape[1] < seq_len:
+            scaled = np.pad(scaled, ((0, 0), (seq_len - scaled.shape[1], 0), (0, 0)))
+        return np.ascontiguousarray(scaled, dtype=np.float32)
+    
+    def usage_tail(self, ingredient_ids: List[str], days: int) -> Tuple[np.ndarray, pd.DatetimeIndex]:
+        """Last days of daily usage for some ingredients, with their dates"""
+        rows = [self.index[i] for i in ingredient_ids]
+        return self.usage[rows, -days:], self.dates[-days:]
+    
+    def scales(self, ingredient_ids: List[str]) -> np.ndarray:
+        """Per-ingredient scale used to normalize inputs and targets"""
+        return self.scale[[self.index[i] for i in ingredient_ids]]
+
+class FeatureStore:
+    """Caches the FeatureSet and refreshes it from the database on demand
+    
+    New usage rows dated on or after the last cached day only recompute
+    the affected days. Recipe changes, deletions and back-dated rows
+    rebuild everything.
+    """
+    
+    def __init__(self):
+        self.feature_set: Optional[FeatureSet] = None
+        self._usage_mark = None
+        self._recipe_mark = None
+        self.recipes = RecipeExplosion()
+        self._lock = threading.Lock()
+    
+    def refresh(self, conn) -> FeatureSet:
+        """Return up-to-date features, recomputing only what changed"""
+        with self._lock:
+            recipe = self.recipes.refresh(conn)
+            recipe_mark = self.recipes.mark
+            usage_mark = tuple(conn.execute(
+                "SELECT COALESCE(MAX(usage_id), 0), COUNT(*) FROM usage"
+            ).fetchone())
+            
+            if self.feature_set is not None and recipe_mark == self._recipe_mark:
+                if usage_mark == self._usage_mark:
+                    return self.feature_set
+                since = self._appended_since(conn, usage_mark)
+                if since is not None:
+                    self.feature_set = self._extend(conn, recipe, since)
+                    self._usage_mark = usage_mark
+                    return self.feature_set
+            
+            self.feature_set = self._build(conn, recipe)
+            self._recipe_mark = recipe_mark
+            self._usage_mark = usage_mark
+            return self.feature_set
+    
+    def _appended_since(self, conn, usage_mark: tuple) -> Optional[str]:
+        """First day touched by rows added since the last refresh, if they only add days at the end"""
+        last_id, last_count = self._usage_mark
+        added, first_day = conn.execute(
+            "SELECT COUNT(*), MIN(substr(date, 1, 10)) FROM usage WHERE usage_id > ?", (last_id,)
+        ).fetchone()
+        if last_count + added != usage_mark[1] or first_day is None:
+            return None  # Rows were deleted
+        
+        feature_set = self.feature_set
+        if feature_set.days and first_day < feature_set.dates[-1].strftime("%Y-%m-%d"):
+            return None  # Back-dated rows change history the features were built from
+        return first_day
+    
+    def _daily_sales(self, conn, since: Optional[str] = None) -> pd.DataFrame:
+        """Per-menu-item daily quantity sold, optionally from a day onwards"""
+        if since is None:
+            return pd.read_sql_query(DAILY_ITEM_SALES.format(where=""), conn)
+        return pd.read_sql_query(
+            DAILY_ITEM_SALES.format(where="WHERE date >= ?"), conn, params=(since,)
+        )
+    
+    def _build(self, conn, recipe: RecipeMatrix) -> FeatureSet:
+        """Compute features for all history"""
+        ingredient_ids = recipe.ingredient_ids
+        daily = self._daily_sales(conn)
+        days = pd.to_datetime(daily["day"], errors="coerce")
+        daily, days = daily[days.notna()], days[days.notna()]
+        
+        if daily.empty:
+            dates = pd.DatetimeIndex([])
+            usage = np.zeros((len(ingredient_ids), 0), np.float64)
+        else:
+            dates = pd.date_range(days.min(), days.max(), freq="D")
+            usage = self._explode(recipe, dates, daily, days)
+        
+        return FeatureSet(ingredient_ids, dates, usage, compute_features(usage, dates))
+    
+    def _extend(self, conn, recipe: RecipeMatrix, since: str) -> FeatureSet:
+        """Reload days from since onwards and recompute only their features"""
+        old = self.feature_set
+        if not old.days:
+            return self._build(conn, recipe)
+        daily = self._daily_sales(conn, since)
+        days = pd.to_datetime(daily["day"], errors="coerce")
+        daily, days = daily[days.notna()], days[days.notna()]
+        if daily.empty:
+            return old
+        
+        dates = pd.date_range(old.dates[0], max(old.dates[-1], days.max()), freq="D")
+        first = dates.get_loc(pd.Timestamp(since))
+        # Days before since keep their usage; days between the old last day and since had none
+        kept = min(first, old.days)
+        
+        usage = np.zeros((len(old.ingredient_ids), len(dates)), np.float64)
+        usage[:, :kept] = old.usage[:, :kept]
+        usage[:, first:] = self._explode(recipe, dates[first:], daily, days)
+        
+        features = np.empty(usage.shape + (len(FEATURE_NAMES),), np.float32)
+        features[:, :kept] = old.features[:, :kept]
+        context = max(kept - CONTEXT_DAYS, 0)
+        features[:, kept:] = compute_features(usage[:, context:], dates[context:])[:, kept - context:]
+        return FeatureSet(old.ingredient_ids, dates, usage, features)
+    
+    def _explode(self, recipe: RecipeMatrix, dates: pd.DatetimeIndex,
+                 daily: pd.DataFrame, days: pd.Series) -> np.ndarray:
+        """(ingredients, len(dates)) usage from daily menu-item sales on those dates"""
+        items = recipe.item_matrix(
+            daily["menu_item_id"], dates.get_indexer(days),
+            daily["quantity"].to_numpy(dtype=np.float64), len(dates)
+        )
+        return recipe.explode(items)
@@ -0,0 +1,174 @@
+"""
+Load test for the /events push channel.
+    
+    python -m app.feed_load_test [subscribers] [slow_subscribers]
+
+Serves app.main on a local port (startup events are skipped; /events
+needs no database) and connects `subscribers` (default 500) clients to
+the inventory and alert topics plus a few slow clients (default 5) on
+every topic that stop reading. Inventory diffs are published at a steady
+rate while a burst of large shipment events backs up the slow clients.
+Reports delivery latency for the live clients, events lost, resyncs sent
+to the slow clients, the largest server-side backlog and peak RSS.
+"""
+import asyncio
+import os
+import re
+import resource
+import socket
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EVENTS = 200
+RATE = 50
+BURST_EVENTS = 2000
+BURST_ROWS = 100
+FRAME = re.compile(rb"^id: (\d+)\nevent: (\w+)$", re.MULTILINE)
+
+class Client:
+    """Raw HTTP/1.1 SSE client that records when each event id arrived"""
+    
+    def __init__(self, port: int, topics: str, slow: bool = False):
+        self.port, self.topics, self.slow = port, topics, slow
+        self.received = {}
+        self.resyncs = 0
+        self.ready = asyncio.Event()
+        self.resumed = asyncio.Event()
+    
+    async def run(self):
+        sock = socket.socket()
+        if self.slow:
+            # A tablet on a bad link: small window, and it stops reading for a while
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.setblocking(False)
+        await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", self.port))
+        reader, writer = await asyncio.open_connection(sock=sock, limit=2**22)
+        writer.write(f"GET /events?topics={self.topics} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        pending = b""
+        try:
+            while True:
+                data = await reader.read(2**16)
+                if not data:
+                    return
+                arrived = time.perf_counter()
+                # Only whole frames; chunked-encoding size lines fall between them
+                pending += data
+                end = pending.rfind(b"\n\n")
+                if end < 0:
+                    continue
+                complete, pending = pending[:end], pending[end + 2:]
+                for event_id, event in FRAME.findall(complete):
+                    if event == b"hello":
+                        self.ready.set()
+                    elif event == b"resync":
+                        self.resyncs += 1
+                    else:
+                        self.received[int(event_id)] = arrived
+                if self.slow and not self.resumed.is_set():
+                    await self.resumed.wait()
+        finally:
+            writer.close()
+
+def _inventory_diff(version: int, rows: int):
+    """Inventory event shaped like a real diff"""
+    return {
+        "version": version,
+        "changes": [{
+            "ingredient_id": f"ing{k}", "ingredient_name": f"Ingredient {k}", "unit": "g",
+            "current_stock": 100.0 + version, "incoming_qty": 0, "reorder_point": 200.0,
+            "safety_stock": 100.0, "par_level": 1000.0, "status": "low_stock"
+        } for k in range(rows)],
+        "kpis": {"total_ingredients": 1000, "low_stock_count": rows}
+    }
+
+async def run(subscribers: int = 500, slow_subscribers: int = 5, events: int = EVENTS, rate: int = RATE):
+    import uvicorn
+    from app.main import app, change_feed
+    
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off",
+                                           log_level="warning", backlog=4096))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    
+    fast = [Client(port, "inventory,alert") for _ in range(subscribers)]
+    slow = [Client(port, "inventory,alert,shipment", slow=True) for _ in range(slow_subscribers)]
+    tasks = [asyncio.create_task(client.run()) for client in fast + slow]
+    connect_started = time.perf_counter()
+    await asyncio.wait_for(asyncio.gather(*(client.ready.wait() for client in fast + slow)), 60)
+    connect_seconds = time.perf_counter() - connect_started
+    
+    # Steady inventory diffs, with a shipment burst for the slow clients in between
+    published = {}
+    max_queued = 0
+    burst_frame_rows = [{"shipment_id": k, "status": "delayed", "vendor": "x" * 40} for k in range(BURST_ROWS)]
+    started = time.perf_counter()
+    for k in range(events):
+        published[change_feed.publish("inventory", _inventory_diff(k, 10))] = time.perf_counter()
+        if k == events // 4:
+            for _ in range(BURST_EVENTS):
+                change_feed.publish("shipment", {"changes": burst_frame_rows})
+        max_queued = max(max_queued, max(s.queue.qsize() for s in change_feed.subscribers))
+        await asyncio.sleep(max(0.0, started + (k + 1) / rate - time.perf_counter()))
+    
+    # Let the live clients drain, then the slow ones
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline and any(len(c.received) < len(published) for c in fast):
+        await asyncio.sleep(0.05)
+    for client in slow:
+        client.resumed.set()
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline and any(c.resyncs == 0 for c in slow):
+        await asyncio.sleep(0.05)
+    
+    latencies = np.array([
+        received - published[event_id]
+        for client in fast for event_id, received in client.received.items() if event_id in published
+    ])
+    lost = sum(len(published.keys() - client.received.keys()) for client in fast)
+    metrics = change_feed.metrics()
+    
+    server.should_exit = True
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await serving
+    return {
+        "subscribers": subscribers,
+        "slow_subscribers": slow_subscribers,
+        "connect_seconds": connect_seconds,
+        "events": len(published),
+        "burst_events": BURST_EVENTS,
+        "latency_ms": {q: float(np.percentile(latencies, q) * 1000) for q in (50, 95, 99, 100)} if len(latencies) else {},
+        "lost": lost,
+        "slow_resynced": sum(1 for c in slow if c.resyncs),
+        "feed_resyncs": metrics["resyncs"],
+        "max_queued_per_subscriber": max_queued,
+        "queue_size": change_feed.queue_size,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+def main():
+    subscribers = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    slow_subscribers = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    result = asyncio.run(run(subscribers, slow_subscribers))
+    print(f"{result['subscribers']} live + {result['slow_subscribers']} slow subscribers "
+          f"connected in {result['connect_seconds']:.2f}s")
+    print(f"{result['events']} inventory events at {RATE}/s, {result['burst_events']} shipment events in one burst")
+    print("Delivery latency (ms): " + ", ".join(
+        f"p{q}={value:.1f}" if q < 100 else f"max={value:.1f}" for q, value in result["latency_ms"].items()))
+    print(f"Events lost by live subscribers: {result['lost']}")
+    print(f"Slow subscribers resynced: {result['slow_resynced']}/{result['slow_subscribers']} "
+          f"({result['feed_resyncs']} resyncs sent)")
+    print(f"Largest backlog: {result['max_queued_per_subscriber']} frames (queue size {result['queue_size']})")
+    print(f"Peak RSS: {result['peak_rss_mb']:.0f} MB (server and clients in one process)")
+
+if __name__ == "__main__":
+    main()
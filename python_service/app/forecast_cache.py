@@ -0,0 +1,142 @@
+"""
+Cache of forecast values keyed by (ingredient_id, horizon, model_version, data_version).
+
+An in-memory LRU sits in front of an optional SQLite file so a restarted
+service starts warm. The data version is a digest of an ingredient's
+consumption history, so an entry goes stale exactly when that history
+or the model changes.
+"""
+import os
+import sqlite3
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+# Maximum entries held in memory
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "10000"))
+# SQLite file for the on-disk tier (unset keeps the cache in memory only)
+FORECAST_CACHE_DB = os.getenv("FORECAST_CACHE_DB", "")
+
+CacheKey = Tuple[str, int, str, str]
+
+class ForecastCache:
+    """Size-bounded LRU of forecast arrays with an optional SQLite tier"""
+    
+    def __init__(self, max_entries: int = FORECAST_CACHE_SIZE, disk_path: str = FORECAST_CACHE_DB):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        
+        self._disk = None
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS forecast_cache (
+                    ingredient_id TEXT,
+                    horizon INTEGER,
+                    model_version TEXT,
+                    data_version TEXT,
+                    forecast BLOB,
+                    PRIMARY KEY (ingredient_id, horizon, model_version, data_version)
+                )
+            """)
+            self._disk.commit()
+    
+    def get_many(self, keys: Iterable[CacheKey]) -> Dict[CacheKey, np.ndarray]:
+        """Cached forecasts for whichever keys are present"""
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                forecast = self._entries.get(key)
+                if forecast is None:
+                    missing.append(key)
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = forecast
+            self.hits += len(found)
+            
+            from_disk = 0
+            if missing and self._disk is not None:
+                for key in missing:
+                    row = self._disk.execute("""
+                        SELECT forecast FROM forecast_cache
+                        WHERE ingredient_id = ? AND horizon = ? AND model_version = ? AND data_version = ?
+                    """, key).fetchone()
+                    if row is not None:
+                        found[key] = np.frombuffer(row[0], dtype=np.float32)
+                        self._store(key, found[key])
+                        from_disk += 1
+            self.disk_hits += from_disk
+            self.misses += len(missing) - from_disk
+        return found
+    
+    def put_many(self, forecasts: Dict[CacheKey, np.ndarray]):
+        """Store forecasts in memory and, if enabled, on disk"""
+        with self._lock:
+            for key, forecast in forecasts.items():
+                self._store(key, np.asarray(forecast, dtype=np.float32))
+            if self._disk is not None:
+                self._disk.executemany(
+                    "INSERT OR REPLACE INTO forecast_cache VALUES (?, ?, ?, ?, ?)",
+                    [(*key, np.asarray(forecast, dtype=np.float32).tobytes())
+                     for key, forecast in forecasts.items()]
+                )
+                self._disk.commit()
+    
+    def _store(self, key: CacheKey, forecast: np.ndarray):
+        """Insert into the LRU, evicting the least recently used entries"""
+        self._entries[key] = forecast
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, ingredient_ids: Optional[Iterable[str]] = None, model_version: Optional[str] = None):
+        """Drop entries for some ingredients, or made by a model version"""
+        ingredient_ids = set(ingredient_ids or ())
+        if not ingredient_ids and model_version is None:
+            return
+        with self._lock:
+            stale = [key for key in self._entries
+                     if key[0] in ingredient_ids or (model_version is not None and key[2] == model_version)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            
+            if self._disk is not None:
+                self._disk.executemany(
+                    "DELETE FROM forecast_cache WHERE ingredient_id = ?", [(i,) for i in ingredient_ids]
+                )
+                if model_version is not None:
+                    self._disk.execute("DELETE FROM forecast_cache WHERE model_version = ?", (model_version,))
+                self._disk.commit()
+    
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and occupancy"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "disk_enabled": self._disk is not None
+            }
+    
+    def close(self):
+        """Close the on-disk tier"""
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
@@ -1,90 +1,235 @@
-import torch
-import torch.nn as nn
-import pandas as pd
+import asyncio
 import numpy as np
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
 from datetime import datetime, timedelta
 import os
 import sys
+import threading
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database import get_db
-from models.lstm_forecaster import LSTMForecaster
+from app.executor import run_io, run_cpu
+from app.forecast_cache import ForecastCache
+from app.forecasters import (
+    BASELINES, BASELINE_HISTORY_DAYS, SEASON, baseline_holdout, best_engines, holdout_errors
+)
+from app.inventory_snapshot import SNAPSHOT_ROWS
+
+# Ratio of standard deviation to mean absolute error for normal errors (sqrt(pi/2))
+MAE_TO_STD = 1.25
+# Days of usage whose spread stands in for forecast error when no holdout error is known
+DEMAND_STD_DAYS = 56
+# Longest forecast served; longer horizons are rolled out past the model's output
+FORECAST_HORIZON_MAX = int(os.getenv("FORECAST_HORIZON_MAX", "365"))
+
+# torch and pandas (via the feature, training and model modules) are imported
+# on first use so processes that never forecast start without them
+if TYPE_CHECKING:
+    from app.features import FeatureSet, FeatureStore
+    from models.inference import InferenceModel
+
+def check_horizon(horizon: int):
+    """Reject horizons outside 1..FORECAST_HORIZON_MAX days"""
+    if not 1 <= horizon <= FORECAST_HORIZON_MAX:
+        raise ValueError(f"horizon must be between 1 and {FORECAST_HORIZON_MAX}")
 
 class ForecastService:
     def __init__(self):
         self.model = None
+        self.model_version = None
+        self.inference_mode = os.getenv("INFERENCE_MODE", "fp32")
+        # "auto" picks the engine per ingredient by holdout error; "lstm" or a
+        # baseline name forces one engine for every ingredient
+        self.forecast_engine = os.getenv("FORECAST_ENGINE", "auto")
+        # Days held out when choosing engines
+        self.engine_holdout_days = int(os.getenv("ENGINE_HOLDOUT_DAYS", "14"))
+        # Relative error reduction the LSTM needs over the best baseline to be chosen
+        self.lstm_min_gain = float(os.getenv("ENGINE_LSTM_MIN_GAIN", "0.05"))
+        # Version tag used in forecast cache keys: model version, inference mode, engine setting
+        self._cache_version = self._cache_tag(None, None)
         self.model_path = os.getenv("MODEL_PATH", "./data/models/lstm_forecaster.pt")
-        self.input_size = 10  # Features: usage, day_of_week, month, etc.
+        self.model_dir = os.path.dirname(self.model_path)
+        # Pointer file naming the active model version
+        self.pointer_path = os.path.join(self.model_dir, "CURRENT")
+        self.keep_versions = int(os.getenv("MODEL_KEEP_VERSIONS", "3"))
         self.hidden_size = 128
         self.num_layers = 2
-        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
+        self.train_horizon = int(os.getenv("TRAIN_HORIZON", "30"))
+        self.train_epochs = int(os.getenv("TRAIN_MAX_EPOCHS", "50"))
+        self.max_batch_size = int(os.getenv("FORECAST_MAX_BATCH", "256"))
+        self._features: Optional["FeatureStore"] = None
+        # Shared in-flight model load, so concurrent callers wait on one read
+        self._load_task: Optional[asyncio.Future] = None
+        # Longest forecast computed per ingredient for the current model and
+        # features; shorter horizons are served by slicing it
+        self._forecasts: Dict[str, np.ndarray] = {}
+        self._forecasts_key = None
+        # Engine chosen per ingredient for the same model and features
+        self._engines: Optional[Dict[str, Dict[str, any]]] = None
+        self._forecasts_lock = threading.Lock()
+        # Forecast values by (ingredient_id, horizon, model_version, data_version)
+        self.cache = ForecastCache()
+        self._data_versions: Dict[str, str] = {}
+        os.makedirs(self.model_dir, exist_ok=True)
+    
+    @property
+    def seq_len(self) -> int:
+        """Window length for new models (FEATURE_SEQ_LEN)"""
+        from app.features import SEQ_LEN
+        return SEQ_LEN
+    
+    @property
+    def input_size(self) -> int:
+        """Features per day: usage, lags, rolling stats, calendar"""
+        from app.features import FEATURE_NAMES
+        return len(FEATURE_NAMES)
+    
+    @property
+    def features(self) -> "FeatureStore":
+        """Feature cache, created on first use"""
+        if self._features is None:
+            from app.features import FeatureStore
+            self._features = FeatureStore()
+        return self._features
     
     def load_model(self, path: Optional[str] = None):
-        """Load trained model"""
+        """Load trained model, preferring the active version from the pointer file"""
+        version = self._current_version() if path is None else None
+        if version:
+            self._swap_model(self._read_model(self._version_path(version)), version)
+            return
+        
         path = path or self.model_path
         if os.path.exists(path):
-            self.model = LSTMForecaster(
-                input_size=self.input_size,
-                hidden_size=self.hidden_size,
-                num_layers=self.num_layers,
-                out_len=90
-            )
-            self.model.load_state_dict(torch.load(path, map_location='cpu'))
-            self.model.eval()
+            self._swap_model(self._read_model(path), os.path.basename(path))
+    
+    async def load_model_async(self):
+        """Load the model in the I/O pool, sharing one load between concurrent callers"""
+        if self._load_task is None or self._load_task.done():
+            self._load_task = asyncio.ensure_future(run_io(self.load_model))
+        await asyncio.shield(self._load_task)
+    
+    def activate_version(self, version: str):
+        """Load a trained version, point CURRENT at it and swap it in atomically"""
+        model = self._read_model(self._version_path(version))
+        
+        tmp_path = self.pointer_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, self.pointer_path)
+        
+        self._swap_model(model, version)
+        self._prune_versions()
     
-    async def train_model(self) -> Dict[str, any]:
-        """Train the LSTM forecasting model"""
+    def _read_model(self, path: str) -> "InferenceModel":
+        """Rebuild a model from a checkpoint and prepare it for the configured inference mode"""
+        import torch
+        from models.lstm_forecaster import LSTMForecaster
+        from models.inference import optimize_for_inference
+        
+        model = LSTMForecaster.from_checkpoint(torch.load(path, map_location='cpu'))
+        model.eval()
+        return optimize_for_inference(model, self.inference_mode, model.metadata.get("seq_len", self.seq_len))
+    
+    def _swap_model(self, model: "InferenceModel", version: str):
+        """Replace the served model with a fully loaded one in a single assignment"""
+        previous = self._cache_version
+        cache_version = self._cache_tag(model, version)
+        self.model, self.model_version, self._cache_version = model, version, cache_version
+        if previous != cache_version:
+            self.cache.invalidate(model_version=previous)
+    
+    def _cache_tag(self, model: Optional["InferenceModel"], version: Optional[str]) -> str:
+        """Forecast cache version for a model: its version, inference mode and the engine setting"""
+        tag = version or "baseline"
+        if model is not None and model.mode != "fp32":
+            tag += f"+{model.mode}"
+        if self.forecast_engine != "lstm":
+            tag += f"@{self.forecast_engine}"
+        return tag
+    
+    def _version_path(self, version: str) -> str:
+        """Path of the checkpoint file for a model version"""
+        base, ext = os.path.splitext(self.model_path)
+        return f"{base}_{version}{ext}"
+    
+    def _current_version(self) -> Optional[str]:
+        """Read the active version from the pointer file, if any"""
+        if not os.path.exists(self.pointer_path):
+            return None
+        with open(self.pointer_path) as f:
+            version = f.read().strip()
+        return version if version and os.path.exists(self._version_path(version)) else None
+    
+    def _prune_versions(self):
+        """Delete old checkpoints, keeping the newest keep_versions"""
+        base, ext = os.path.splitext(os.path.basename(self.model_path))
+        versions = sorted(
+            name[len(base) + 1:-len(ext)]
+            for name in os.listdir(self.model_dir)
+            if name.startswith(base + "_") and name.endswith(ext)
+        )
+        for version in versions[:-self.keep_versions]:
+            if version != self.model_version:
+                os.remove(self._version_path(version))
+    
+    async def train_model(self, progress=None, cancel_event=None) -> Dict[str, any]:
+        """Train the LSTM forecasting model in the CPU process pool"""
+        result = await run_cpu(train_model_worker, self.model_path, progress, cancel_event)
+        if result.get("status") == "success":
+            await run_io(self.activate_version, result["version"])
+        return result
+    
+    def _train_model_sync(self, progress=None, cancel_event=None) -> Dict[str, any]:
+        """Train the LSTM forecasting model (blocking; runs in a worker process)
+        
+        progress and cancel_event are optional multiprocessing proxies shared
+        with the training job that owns this run.
+        """
+        from app.trainer import fit
+        from models.lstm_forecaster import LSTMForecaster
+        
         try:
-            # Load historical data
-            data = await self._load_training_data()
+            # Load historical data; windows are gathered batch by batch during training
+            feature_set = self._load_features()
+            rows, _ = feature_set.window_samples(self.seq_len, self.train_horizon)
             
-            if len(data) < 30:
+            if len(rows) == 0:
                 return {
                     "status": "insufficient_data",
-                    "message": "Need at least 30 days of data for training"
+                    "message": f"Need at least {self.seq_len + self.train_horizon} days of usage history for training"
                 }
             
-            # Prepare features and targets
-            X, y = self._prepare_training_data(data)
-            
             # Initialize model
-            self.model = LSTMForecaster(
+            model = LSTMForecaster(
                 input_size=self.input_size,
                 hidden_size=self.hidden_size,
                 num_layers=self.num_layers,
-                out_len=30
+                out_len=self.train_horizon
             )
             
-            # Training loop (simplified)
-            optimizer = torch.optim.Adam(self.model.parameters(), lr=0.001)
-            criterion = nn.MSELoss()
-            
-            # Convert to tensors
-            X_tensor = torch.FloatTensor(X)
-            y_tensor = torch.FloatTensor(y)
+            # Mini-batch training with early stopping; the best weights are
+            # checkpointed to a temp file so a reader never sees a partial one
+            version = datetime.now().strftime("%Y%m%d%H%M%S%f")
+            path = self._version_path(version)
+            result = fit(model, feature_set, self.seq_len, self.train_horizon, self.train_epochs,
+                         path + ".tmp", progress, cancel_event)
             
-            # Train for a few epochs
-            self.model.train()
-            for epoch in range(50):
-                optimizer.zero_grad()
-                outputs = self.model(X_tensor)
-                loss = criterion(outputs, y_tensor)
-                loss.backward()
-                optimizer.step()
-                
-                if epoch % 10 == 0:
-                    print(f"Epoch {epoch}, Loss: {loss.item()}")
-            
-            # Save model
-            torch.save(self.model.state_dict(), self.model_path)
+            if result["status"] == "cancelled":
+                if os.path.exists(path + ".tmp"):
+                    os.remove(path + ".tmp")
+                return {
+                    "status": "cancelled",
+                    "message": f"Training cancelled after {result['epochs_run']} epochs"
+                }
             
+            os.replace(path + ".tmp", path)
             return {
-                "status": "success",
+                **result,
                 "message": "Model trained successfully",
-                "loss": loss.item()
+                "version": version
             }
         except Exception as e:
             return {
@@ -94,53 +239,14 @@ class ForecastService:
     
     async def predict(self, ingredient_id: str, horizon: int = 30) -> Dict[str, any]:
         """Predict demand for a specific ingredient"""
-        if self.model is None:
-            self.load_model()
-        
-        if self.model is None:
-            # Return synthetic forecast if no model
-            return await self._synthetic_forecast(ingredient_id, horizon)
-        
-        # Load recent data for the ingredient
-        data = await self._load_ingredient_data(ingredient_id)
-        
-        if len(data) == 0:
-            return await self._synthetic_forecast(ingredient_id, horizon)
-        
-        # Prepare input features
-        features = self._prepare_features(data, horizon)
-        
-        # Make prediction
-        self.model.eval()
-        with torch.no_grad():
-            X = torch.FloatTensor(features).unsqueeze(0)
-            prediction = self.model(X).squeeze().numpy()
-        
-        # Generate forecast dates
-        start_date = datetime.now()
-        forecast_dates = [start_date + timedelta(days=i) for i in range(horizon)]
-        
-        return {
-            "ingredient_id": ingredient_id,
-            "horizon": horizon,
-            "forecast": [
-                {
-                    "date": date.isoformat(),
-                    "predicted_demand": float(pred)
-                }
-                for date, pred in zip(forecast_dates, prediction[:horizon])
-            ],
-            "reorder_date": self._calculate_reorder_date(prediction, horizon),
-            "reorder_quantity": float(np.sum(prediction[:7]))  # Sum of next 7 days
-        }
+        forecasts = await self._predict_batch([ingredient_id], horizon)
+        return forecasts[0]
     
     async def bulk_predict(self, horizon: int = 30) -> List[Dict[str, any]]:
         """Predict demand for all ingredients"""
+        check_horizon(horizon)
         # Get all ingredients
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT DISTINCT ingredient_id FROM ingredients")
-            ingredients = [row[0] for row in cursor.fetchall()]
+        ingredients = await run_io(self._list_ingredient_ids)
         
         if not ingredients:
             # Return synthetic data for known ingredients
@@ -151,47 +257,342 @@ class ForecastService:
                 "carrot", "bokchoy", "tapioca_starch"
             ]
         
-        forecasts = []
-        for ingredient_id in ingredients:
-            forecast = await self.predict(ingredient_id, horizon)
-            forecasts.append(forecast)
+        return await self._predict_batch(ingredients, horizon)
+    
+    def _list_ingredient_ids(self) -> List[str]:
+        """List all known ingredient ids"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT ingredient_id FROM ingredients")
+            return [row[0] for row in cursor.fetchall()]
+    
+    async def _predict_batch(self, ingredient_ids: List[str], horizon: int) -> List[Dict[str, any]]:
+        """Predict demand for many ingredients, batching each engine's work across them"""
+        check_horizon(horizon)
+        if self.model is None:
+            await self.load_model_async()
+        
+        # Hold one reference for the whole batch so a concurrent swap
+        # cannot mix two model versions in a single response
+        model, model_version = self.model, self._cache_version
         
+        # Refresh cached features for all ingredients (only new days are recomputed)
+        feature_set = await run_io(self._load_features)
+        with_data = [i for i in ingredient_ids if feature_set.has_history(i)]
+        
+        forecasts = {}
+        if with_data:
+            predictions = await run_io(
+                self._cached_forecasts, model, model_version, feature_set, with_data, horizon
+            )
+            
+            position, reorder_point, order_quantity = await run_io(self._stock_levels, with_data)
+            reorder_dates = self._calculate_reorder_dates(predictions, horizon, position, reorder_point)
+            # Replenishment's order quantity where it has run, else the next 7 days of demand
+            reorder_quantities = np.where(np.isnan(order_quantity), predictions[:, :7].sum(axis=1), order_quantity)
+            
+            # Generate forecast dates
+            start_date = datetime.now()
+            forecast_dates = [(start_date + timedelta(days=i)).isoformat() for i in range(horizon)]
+            
+            for row, (ingredient_id, values) in enumerate(zip(with_data, predictions.tolist())):
+                forecasts[ingredient_id] = {
+                    "ingredient_id": ingredient_id,
+                    "horizon": horizon,
+                    "forecast": [
+                        {
+                            "date": date,
+                            "predicted_demand": float(pred)
+                        }
+                        for date, pred in zip(forecast_dates, values)
+                    ],
+                    "reorder_date": reorder_dates[row],
+                    "reorder_quantity": float(reorder_quantities[row])
+                }
+        
+        results = []
+        for ingredient_id in ingredient_ids:
+            if ingredient_id not in forecasts:
+                forecasts[ingredient_id] = await self._synthetic_forecast(ingredient_id, horizon)
+            results.append(forecasts[ingredient_id])
+        return results
+    
+    def _stock_levels(self, ingredient_ids: List[str]):
+        """Stock position (on hand + incoming), reorder point and order quantity (NaN if never computed)"""
+        with get_db() as conn:
+            records = {record["ingredient_id"]: record for record in conn.execute(SNAPSHOT_ROWS.format(where=""))}
+        levels = np.full((3, len(ingredient_ids)), np.nan)
+        for column, ingredient_id in enumerate(ingredient_ids):
+            record = records.get(ingredient_id)
+            if record is not None:
+                levels[:, column] = ((record["current_stock"] or 0) + (record["incoming_qty"] or 0),
+                                     record["reorder_point"] or 0,
+                                     np.nan if record["order_quantity"] is None else record["order_quantity"])
+        return np.nan_to_num(levels[0]), np.nan_to_num(levels[1]), levels[2]
+    
+    async def demand_outlook(self, horizon: int = 30) -> Dict[str, any]:
+        """Forecast demand and its error spread for every ingredient with usage history
+        
+        The spread is the selected engine's holdout MAE scaled to a standard
+        deviation, or the standard deviation of recent usage where no holdout
+        error is available.
+        """
+        check_horizon(horizon)
+        if self.model is None:
+            await self.load_model_async()
+        model, model_version = self.model, self._cache_version
+        feature_set = await run_io(self._load_features)
+        ids = [i for i in feature_set.ingredient_ids if feature_set.has_history(i)]
+        if not ids:
+            return {"ingredient_ids": [], "forecasts": np.zeros((0, horizon)), "demand_std": np.zeros(0)}
+        
+        forecasts = await run_io(self._cached_forecasts, model, model_version, feature_set, ids, horizon)
+        engines = await run_io(self._engine_selection, model, feature_set)
+        usage, _ = feature_set.usage_tail(ids, DEMAND_STD_DAYS)
+        demand_std = usage.std(axis=1)
+        for row, ingredient_id in enumerate(ids):
+            choice = engines.get(ingredient_id, {})
+            error = choice.get("errors", {}).get(choice.get("engine"))
+            if error is not None and np.isfinite(error):
+                demand_std[row] = MAE_TO_STD * error
+        return {"ingredient_ids": ids, "forecasts": forecasts, "demand_std": demand_std}
+    
+    def _cached_forecasts(self, model: "InferenceModel", model_version: str, feature_set: "FeatureSet",
+                          ingredient_ids: List[str], horizon: int) -> np.ndarray:
+        """(N, horizon) forecasts from the forecast cache, computing and storing only misses"""
+        data_versions = feature_set.data_versions()
+        keys = [(i, horizon, model_version, data_versions[i]) for i in ingredient_ids]
+        cached = self.cache.get_many(keys)
+        
+        missing = [key for key in keys if key not in cached]
+        if missing:
+            computed = self._forecast_matrix(model, feature_set, [key[0] for key in missing], horizon)
+            fresh = dict(zip(missing, computed))
+            self.cache.put_many(fresh)
+            cached.update(fresh)
+        
+        return np.stack([cached[key] for key in keys])
+    
+    def _forecast_matrix(self, model: "InferenceModel", feature_set: "FeatureSet",
+                         ingredient_ids: List[str], horizon: int) -> np.ndarray:
+        """(N, horizon) demand forecasts, slicing cached longer forecasts where possible"""
+        with self._forecasts_lock:
+            self._reset_if_stale(model, feature_set)
+            known = {i: self._forecasts[i] for i in ingredient_ids
+                     if len(self._forecasts.get(i, ())) >= horizon}
+        
+        missing = [i for i in ingredient_ids if i not in known]
+        if missing:
+            rolled = dict(zip(missing, self._engine_forecasts(model, feature_set, missing, horizon)))
+            known.update(rolled)
+            with self._forecasts_lock:
+                if self._forecasts_current(model, feature_set):
+                    self._forecasts.update(rolled)
+        
+        return np.stack([known[i][:horizon] for i in ingredient_ids])
+    
+    def _forecasts_current(self, model: "InferenceModel", feature_set: "FeatureSet") -> bool:
+        """True if cached forecasts were made by this model from these features"""
+        return (self._forecasts_key is not None
+                and self._forecasts_key[0] is model and self._forecasts_key[1] is feature_set)
+    
+    def _reset_if_stale(self, model: "InferenceModel", feature_set: "FeatureSet"):
+        """Drop forecasts and engine choices made for another model or features (caller holds the lock)"""
+        if not self._forecasts_current(model, feature_set):
+            self._forecasts, self._engines = {}, None
+            self._forecasts_key = (model, feature_set)
+    
+    def _engine_forecasts(self, model: Optional["InferenceModel"], feature_set: "FeatureSet",
+                          ingredient_ids: List[str], horizon: int) -> List[np.ndarray]:
+        """Forecasts of at least horizon days, each from the ingredient's selected engine"""
+        engines = self._engine_selection(model, feature_set)
+        by_engine: Dict[str, List[int]] = {}
+        for position, ingredient_id in enumerate(ingredient_ids):
+            by_engine.setdefault(engines[ingredient_id]["engine"], []).append(position)
+        
+        forecasts: List[Optional[np.ndarray]] = [None] * len(ingredient_ids)
+        for engine, positions in by_engine.items():
+            ids = [ingredient_ids[position] for position in positions]
+            if engine == "lstm":
+                values = self._rollout(model, feature_set, ids, horizon)
+            else:
+                usage, _ = feature_set.usage_tail(ids, BASELINE_HISTORY_DAYS)
+                values = BASELINES[engine].forecast(usage, horizon)
+            for position, row in zip(positions, values):
+                forecasts[position] = row
         return forecasts
     
-    async def _load_training_data(self) -> pd.DataFrame:
-        """Load historical usage data for training"""
+    def _engine_selection(self, model: Optional["InferenceModel"], feature_set: "FeatureSet") -> Dict[str, Dict[str, any]]:
+        """Engine per ingredient with history, chosen once per model and feature set"""
+        with self._forecasts_lock:
+            self._reset_if_stale(model, feature_set)
+            if self._engines is not None:
+                return self._engines
+        
+        engines = self._select_engines(model, feature_set)
+        with self._forecasts_lock:
+            if self._forecasts_current(model, feature_set):
+                self._engines = engines
+        return engines
+    
+    def _select_engines(self, model: Optional["InferenceModel"], feature_set: "FeatureSet") -> Dict[str, Dict[str, any]]:
+        """Pick each ingredient's engine by mean absolute error over the last holdout days
+        
+        Baselines are refitted on the days before the holdout; the LSTM is
+        run on the window ending just before it and is only chosen when it
+        beats the best baseline by lstm_min_gain.
+        """
+        ids = [i for i in feature_set.ingredient_ids if feature_set.has_history(i)]
+        fallback = "lstm" if model is not None else "seasonal_naive"
+        if self.forecast_engine != "auto":
+            forced = self.forecast_engine
+            engine = forced if forced in BASELINES or (forced == "lstm" and model is not None) else fallback
+            return {i: {"engine": engine} for i in ids}
+        
+        holdout = self.engine_holdout_days if model is None else min(self.engine_holdout_days, model.out_len)
+        if not ids or feature_set.days < holdout + 2 * SEASON:
+            return {i: {"engine": fallback} for i in ids}
+        
+        usage, _ = feature_set.usage_tail(ids, BASELINE_HISTORY_DAYS + holdout)
+        forecasts = baseline_holdout(usage, holdout)
+        if model is not None:
+            forecasts["lstm"] = self._lstm_forecast(model, feature_set, ids, holdout, holdout)
+        errors = holdout_errors(forecasts, usage[:, -holdout:])
+        
+        ranked = dict(errors)
+        if "lstm" in ranked:
+            ranked["lstm"] = ranked["lstm"] / (1 - self.lstm_min_gain)
+        choices = best_engines(ranked)
+        return {
+            ingredient_id: {
+                "engine": engine,
+                "errors": {name: float(error[row]) for name, error in errors.items()}
+            }
+            for row, (ingredient_id, engine) in enumerate(zip(ids, choices))
+        }
+    
+    def _lstm_forecast(self, model: "InferenceModel", feature_set: "FeatureSet",
+                       ingredient_ids: List[str], offset: int, horizon: int) -> np.ndarray:
+        """LSTM forecast of up to model.out_len days from windows ending offset days before the last day"""
+        seq_len = model.metadata.get("seq_len", self.seq_len)
+        windows = feature_set.latest_windows(ingredient_ids, seq_len, offset=offset)
+        return self._forward_batched(model, windows)[:, :horizon] * feature_set.scales(ingredient_ids)[:, None]
+    
+    async def run_backtest(self) -> Dict[str, any]:
+        """Rolling-origin backtest of every engine over all ingredients with usage history
+        
+        The LSTM is included when a model is loaded and its output covers
+        the backtest horizon.
+        """
+        from app.backtest import BACKTEST_HORIZON, run_backtest
+        
+        if self.model is None:
+            await self.load_model_async()
+        model = self.model
+        feature_set = await run_io(self._load_features)
+        ids = [i for i in feature_set.ingredient_ids if feature_set.has_history(i)]
+        usage = feature_set.usage[[feature_set.index[i] for i in ids]]
+        
+        model_forecast = None
+        if model is not None and model.out_len >= BACKTEST_HORIZON:
+            def model_forecast(offset: int, horizon: int) -> np.ndarray:
+                return self._lstm_forecast(model, feature_set, ids, offset, horizon)
+        return await run_backtest(ids, usage, model_forecast)
+    
+    async def explode_menu_forecast(self, menu_forecasts: Dict[str, List[float]]) -> Dict[str, List[float]]:
+        """Daily ingredient demand implied by per-menu-item demand forecasts"""
+        return await run_io(self._explode_menu_forecast, menu_forecasts)
+    
+    def _explode_menu_forecast(self, menu_forecasts: Dict[str, List[float]]) -> Dict[str, List[float]]:
+        """Explode menu-item forecasts through the cached recipe matrix"""
+        with get_db() as conn:
+            recipe = self.features.recipes.refresh(conn)
+        return recipe.explode_forecasts(menu_forecasts)
+    
+    async def engine_summary(self) -> Dict[str, any]:
+        """Engine chosen per ingredient and the holdout errors behind each choice"""
+        if self.model is None:
+            await self.load_model_async()
+        model = self.model
+        feature_set = await run_io(self._load_features)
+        engines = await run_io(self._engine_selection, model, feature_set)
+        
+        counts: Dict[str, int] = {}
+        for choice in engines.values():
+            counts[choice["engine"]] = counts.get(choice["engine"], 0) + 1
+        return {
+            "setting": self.forecast_engine,
+            "holdout_days": self.engine_holdout_days,
+            "counts": counts,
+            "ingredients": engines
+        }
+    
+    def _rollout(self, model: "InferenceModel", feature_set: "FeatureSet",
+                 ingredient_ids: List[str], horizon: int) -> np.ndarray:
+        """Forecast at least horizon days, feeding predictions back in for horizons past the model's output
+        
+        Each step is one batched forward pass over all ingredients and
+        yields model.out_len days, so the result is rounded up to whole steps.
+        """
+        check_horizon(horizon)
+        import pandas as pd
+        from app.features import CONTEXT_DAYS, window_from_usage
+        
+        seq_len = model.metadata.get("seq_len", self.seq_len)
+        scale = feature_set.scales(ingredient_ids)
+        usage, dates = feature_set.usage_tail(ingredient_ids, seq_len + CONTEXT_DAYS)
+        features = feature_set.latest_windows(ingredient_ids, seq_len)
+        
+        steps = -(-horizon // model.out_len)
+        outputs = []
+        for step in range(steps):
+            # Outputs are in units of each ingredient's scale
+            predictions = self._forward_batched(model, features) * scale[:, None]
+            outputs.append(predictions)
+            if step == steps - 1:
+                break
+            
+            # Append the predicted days and rebuild the window from them
+            usage = np.concatenate([usage, predictions], axis=1)[:, -(seq_len + CONTEXT_DAYS):]
+            dates = dates.append(pd.date_range(dates[-1] + timedelta(days=1), periods=model.out_len))
+            dates = dates[-(seq_len + CONTEXT_DAYS):]
+            features = window_from_usage(usage, dates, scale, seq_len)
+        
+        return np.concatenate(outputs, axis=1)
+    
+    def _forward_batched(self, model: "InferenceModel", features: np.ndarray) -> np.ndarray:
+        """Run the model over features in chunks of at most max_batch_size"""
+        import torch
+        
+        outputs = []
+        with torch.inference_mode():
+            for start in range(0, len(features), self.max_batch_size):
+                X = torch.from_numpy(features[start:start + self.max_batch_size])
+                outputs.append(model(X).numpy())
+        return np.concatenate(outputs, axis=0)
+    
+    def _load_features(self) -> "FeatureSet":
+        """Daily consumption features for every ingredient, refreshed from the database
+        
+        Cached forecasts of ingredients whose history changed are dropped.
+        """
         with get_db() as conn:
-            query = "SELECT * FROM usage ORDER BY date"
-            df = pd.read_sql_query(query, conn)
-        return df
-    
-    async def _load_ingredient_data(self, ingredient_id: str) -> pd.DataFrame:
-        """Load historical data for a specific ingredient"""
-        # This would join usage, sales, and recipe tables
-        # For now, return empty DataFrame
-        return pd.DataFrame()
-    
-    def _prepare_training_data(self, data: pd.DataFrame) -> tuple:
-        """Prepare features and targets for training"""
-        # Simplified feature preparation
-        # In practice, would include: usage, day_of_week, month, rolling averages, etc.
-        n_samples = len(data) - 30
-        if n_samples < 1:
-            n_samples = 1
-        
-        X = np.random.randn(n_samples, 10, self.input_size)
-        y = np.random.randn(n_samples, 30)
-        
-        return X, y
-    
-    def _prepare_features(self, data: pd.DataFrame, horizon: int) -> np.ndarray:
-        """Prepare input features for prediction"""
-        # Simplified feature preparation
-        features = np.random.randn(10, self.input_size)
-        return features
+            feature_set = self.features.refresh(conn)
+        
+        versions = feature_set.data_versions()
+        with self._forecasts_lock:
+            if versions is not self._data_versions:
+                changed = [i for i, version in self._data_versions.items() if versions.get(i) != version]
+                self._data_versions = versions
+                self.cache.invalidate(changed)
+        return feature_set
+    
+    async def refresh_data(self):
+        """Pick up newly ingested rows now rather than on the next forecast request"""
+        await run_io(self._load_features)
     
     async def _synthetic_forecast(self, ingredient_id: str, horizon: int) -> Dict[str, any]:
-        """Generate synthetic forecast when no model/data available"""
+        """Generate synthetic forecast for an ingredient without usage history"""
         start_date = datetime.now()
         base_demand = np.random.uniform(10, 100)
         trend = np.linspace(0, 5, horizon)
@@ -216,16 +617,30 @@ class ForecastService:
             "reorder_quantity": float(np.sum(forecast_values[:7]))
         }
     
-    def _calculate_reorder_date(self, prediction: np.ndarray, horizon: int) -> str:
-        """Calculate when to reorder based on forecast"""
-        # Simple logic: reorder when cumulative demand exceeds threshold
-        cumulative = np.cumsum(prediction)
-        threshold = 200  # Example threshold
-        reorder_idx = np.argmax(cumulative > threshold)
+    def _calculate_reorder_dates(self, predictions: np.ndarray, horizon: int,
+                                 position: np.ndarray, reorder_point: np.ndarray) -> List[str]:
+        """Day each ingredient's stock position is forecast to fall to its reorder point
+        
+        Today if it already has; the end of the horizon if it does not within it.
+        """
+        cumulative = np.cumsum(predictions, axis=1)
+        headroom = position - reorder_point
+        exceeded = cumulative > headroom[:, None]
         
-        if reorder_idx == 0 and cumulative[0] <= threshold:
-            reorder_idx = 7  # Default to 7 days
+        reorder_idx = np.where(exceeded.any(axis=1), exceeded.argmax(axis=1), horizon)
+        reorder_idx = np.where(headroom <= 0, 0, reorder_idx)
         
-        reorder_date = datetime.now() + timedelta(days=min(reorder_idx, horizon))
-        return reorder_date.isoformat()
+        now = datetime.now()
+        return [(now + timedelta(days=int(idx))).isoformat() for idx in reorder_idx]
 
+def train_model_worker(model_path: str, progress=None, cancel_event=None) -> Dict[str, any]:
+    """Process pool entry point: train and save a new model version"""
+    from app.trainer import configure_threads
+    
+    service = ForecastService()
+    service.model_path = model_path
+    service.model_dir = os.path.dirname(model_path)
+    configure_threads()
+    if progress is not None:
+        progress.update(status="running", epochs=service.train_epochs)
+    return service._train_model_sync(progress, cancel_event)
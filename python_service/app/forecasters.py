@@ -0,0 +1,119 @@
+"""
+Statistical baseline forecasters.
+
+Every forecaster fits all ingredients at once: it takes an (N, T) matrix
+of daily usage and returns an (N, horizon) forecast. Recursive methods
+loop over days only, with each step a NumPy operation across all
+ingredients, so a full catalog fits in milliseconds.
+"""
+import os
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+# Days of history the baselines fit on
+BASELINE_HISTORY_DAYS = int(os.getenv("BASELINE_HISTORY_DAYS", "182"))
+# Weekly seasonality of restaurant demand
+SEASON = 7
+
+class Forecaster(ABC):
+    """Forecasts (N, horizon) daily usage from (N, T) history"""
+    
+    name = ""
+    
+    @abstractmethod
+    def forecast(self, usage: np.ndarray, horizon: int) -> np.ndarray:
+        """(N, horizon) forecast from (N, T) usage"""
+
+class SeasonalNaive(Forecaster):
+    """Repeats the last week"""
+    
+    name = "seasonal_naive"
+    
+    def __init__(self, season: int = SEASON):
+        self.season = season
+    
+    def forecast(self, usage: np.ndarray, horizon: int) -> np.ndarray:
+        last = usage[:, -self.season:]
+        if last.shape[1] < self.season:
+            last = np.pad(last, ((0, 0), (self.season - last.shape[1], 0)))
+        reps = -(-horizon // self.season)
+        return np.tile(last, (1, reps))[:, :horizon].astype(np.float32)
+
+class HoltWinters(Forecaster):
+    """Additive Holt-Winters with a damped trend and weekly seasonality"""
+    
+    name = "holt_winters"
+    
+    def __init__(self, alpha: float = 0.2, beta: float = 0.02, gamma: float = 0.1,
+                 phi: float = 0.98, season: int = SEASON):
+        self.alpha, self.beta, self.gamma, self.phi = alpha, beta, gamma, phi
+        self.season = season
+    
+    def forecast(self, usage: np.ndarray, horizon: int) -> np.ndarray:
+        n, t = usage.shape
+        if t < 2 * self.season:
+            return SeasonalNaive(self.season).forecast(usage, horizon)
+        
+        # Initialise from the first week, then smooth day by day across all rows
+        level = usage[:, :self.season].mean(axis=1)
+        trend = np.zeros(n)
+        seasonal = usage[:, :self.season] - level[:, None]
+        for day in range(self.season, t):
+            slot = day % self.season
+            y = usage[:, day]
+            previous = level
+            level = self.alpha * (y - seasonal[:, slot]) + (1 - self.alpha) * (level + self.phi * trend)
+            trend = self.beta * (level - previous) + (1 - self.beta) * self.phi * trend
+            seasonal[:, slot] = self.gamma * (y - level) + (1 - self.gamma) * seasonal[:, slot]
+        
+        steps = np.arange(1, horizon + 1)
+        damping = np.cumsum(self.phi ** steps)
+        slots = (t + steps - 1) % self.season
+        forecast = level[:, None] + damping[None, :] * trend[:, None] + seasonal[:, slots]
+        return np.maximum(forecast, 0).astype(np.float32)
+
+class Croston(Forecaster):
+    """Croston's method with the Syntetos-Boylan correction, for intermittent demand"""
+    
+    name = "croston"
+    
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+    
+    def forecast(self, usage: np.ndarray, horizon: int) -> np.ndarray:
+        n, t = usage.shape
+        demand_days = (usage > 0).sum(axis=1)
+        active = demand_days > 0
+        # Start from whole-history averages so short series are not dominated by the first demand
+        size = np.where(active, usage.sum(axis=1) / np.maximum(demand_days, 1), 0.0)
+        interval = np.where(active, t / np.maximum(demand_days, 1), 1.0)
+        since = np.ones(n)
+        for day in range(t):
+            y = usage[:, day]
+            demand = y > 0
+            size = np.where(demand, self.alpha * y + (1 - self.alpha) * size, size)
+            interval = np.where(demand, self.alpha * since + (1 - self.alpha) * interval, interval)
+            since = np.where(demand, 1.0, since + 1)
+        
+        rate = (1 - self.alpha / 2) * size / interval
+        return np.repeat(rate[:, None], horizon, axis=1).astype(np.float32)
+
+BASELINES: Dict[str, Forecaster] = {
+    forecaster.name: forecaster for forecaster in (SeasonalNaive(), HoltWinters(), Croston())
+}
+
+def holdout_errors(forecasts: Dict[str, np.ndarray], actual: np.ndarray) -> Dict[str, np.ndarray]:
+    """Mean absolute error per ingredient of each engine's forecast over the holdout days"""
+    return {name: np.abs(forecast - actual).mean(axis=1) for name, forecast in forecasts.items()}
+
+def baseline_holdout(usage: np.ndarray, holdout: int) -> Dict[str, np.ndarray]:
+    """Forecasts of every baseline for the last holdout days, fitted on the days before"""
+    history = usage[:, :-holdout][:, -BASELINE_HISTORY_DAYS:]
+    return {name: forecaster.forecast(history, holdout) for name, forecaster in BASELINES.items()}
+
+def best_engines(errors: Dict[str, np.ndarray]) -> List[str]:
+    """Engine with the lowest error for each ingredient"""
+    names = list(errors)
+    best = np.stack([errors[name] for name in names]).argmin(axis=0)
+    return [names[k] for k in best]
@@ -0,0 +1,103 @@
+"""
+Rows/sec and peak memory of streaming ingestion versus whole-file loading.
+    
+    python -m app.ingest_benchmark [rows ...]
+
+Writes a canonical usage CSV of each size (default 100,000, 500,000 and
+1,000,000 rows) and loads it into a scratch database twice, each in a
+fresh interpreter:
+
+- whole-file: what /upload did before streaming; read the file into one
+  DataFrame, write the processed copy, read that back and insert all rows
+- streaming: DataProcessor.ingest_path, which parses, maps and inserts
+  CHUNK_ROWS rows at a time
+
+Reports rows/sec and how far RSS (sampled every 10 ms) rose above the
+interpreter's footprint after imports. Linux only (reads /proc).
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MENU_ITEMS = 500
+
+# Runs in the child interpreter so each load starts from the same footprint
+CHILD = """
+import json, os, sys, threading, time
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join({scratch!r}, {mode!r} + ".db")
+sys.path.insert(0, {service_dir!r})
+import pandas as pd
+from app.database import get_db, init_db
+from app.data_processor import DataProcessor
+init_db()
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+baseline, peak, done = rss(), [0], threading.Event()
+def sample():
+    while not done.wait(0.01):
+        peak[0] = max(peak[0], rss())
+sampler = threading.Thread(target=sample)
+sampler.start()
+started = time.perf_counter()
+if {mode!r} == "streaming":
+    rows = DataProcessor(os.path.join({scratch!r}, "processed")).ingest_path({path!r}, "usage.csv", ".csv")["rows_processed"]
+else:
+    df = pd.read_csv({path!r})
+    processed = os.path.join({scratch!r}, "whole.csv")
+    df.to_csv(processed, index=False)
+    df = pd.read_csv(processed)
+    with get_db(write=True) as conn:
+        conn.executemany(
+            "INSERT INTO usage (date, menu_item_id, menu_item_name, quantity_sold) VALUES (?, ?, ?, ?)",
+            df[["date", "menu_item_id", "menu_item_name", "quantity_sold"]].itertuples(index=False, name=None)
+        )
+        conn.commit()
+    rows = len(df)
+seconds = time.perf_counter() - started
+done.set()
+sampler.join()
+print(json.dumps({{"rows": rows, "seconds": seconds, "peak_mb": (max(peak[0], rss()) - baseline) / 1e6}}))
+"""
+
+def write_usage_csv(path: str, rows: int, seed: int = 0):
+    """Canonical usage rows: MENU_ITEMS menu items per day"""
+    rng = np.random.default_rng(seed)
+    index = np.arange(rows)
+    dates = pd.date_range("2020-01-01", periods=rows // MENU_ITEMS + 1).strftime("%Y-%m-%d").to_numpy()
+    pd.DataFrame({
+        "date": dates[index // MENU_ITEMS],
+        "menu_item_id": np.char.add("item", (index % MENU_ITEMS).astype(str)),
+        "menu_item_name": np.char.add("Item ", (index % MENU_ITEMS).astype(str)),
+        "quantity_sold": rng.poisson(20, rows)
+    }).to_csv(path, index=False)
+
+def load(mode: str, path: str, scratch: str) -> dict:
+    """Rows, seconds and peak MB above baseline for one load in a fresh interpreter"""
+    code = CHILD.format(service_dir=SERVICE_DIR, scratch=scratch, mode=mode, path=path)
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                               cwd=SERVICE_DIR, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100_000, 500_000, 1_000_000]
+    print(f"{'rows':>10}{'file MB':>9}{'mode':>12}{'rows/s':>10}{'seconds':>9}{'peak MB':>9}")
+    for size in sizes:
+        scratch = tempfile.mkdtemp(prefix="msy-ingest-")
+        path = os.path.join(scratch, "usage.csv")
+        write_usage_csv(path, size)
+        file_mb = os.path.getsize(path) / 1e6
+        for mode in ("whole-file", "streaming"):
+            result = load(mode, path, scratch)
+            print(f"{size:>10}{file_mb:>9.1f}{mode:>12}{result['rows'] / result['seconds']:>10.0f}"
+                  f"{result['seconds']:>9.1f}{result['peak_mb']:>9.0f}")
+        shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,74 +1,114 @@
-import pandas as pd
-from typing import Dict, List, Any
+import asyncio
+import json
+from typing import Dict, List, Any, Optional
 from datetime import datetime
+from app.change_feed import ChangeFeed
 from app.database import get_db
+from app.executor import run_io
+from app.inventory_snapshot import InventorySnapshot
+
+# Ingested tables that can change any ingredient's row
+FULL_REFRESH_TABLES = {"ingredients", "recipe", "shipments"}
+
+# Alert when an ingredient moves to a more severe status than these
+SEVERITY = {"adequate": 0, "overstocked": 0, "low_stock": 1, "critical": 2}
 
 class InventoryService:
-    def __init__(self):
-        pass
+    def __init__(self, feed: Optional[ChangeFeed] = None):
+        self.snapshot = InventorySnapshot()
+        self.feed = feed
+        # Keeps diffs published in version order when ingests overlap
+        self._publish_lock = asyncio.Lock()
+    
+    def load_snapshot(self, conn):
+        """Build the in-memory snapshot (blocking; called at startup)"""
+        self.snapshot.load(conn)
+        conn.commit()
     
     async def get_inventory_levels(self) -> Dict[str, Any]:
         """Get current inventory levels and KPIs"""
+        return await run_io(self._query_inventory_levels)
+    
+    async def apply_ingest(self, summary: Dict[str, Any]) -> int:
+        """Update the snapshot after an upload or /process and publish the diff
+        
+        Returns the number of changed rows.
+        """
+        return await self._refresh_and_publish(self._apply_ingest, summary)
+    
+    async def refresh(self, ingredient_ids: Optional[List[str]] = None) -> int:
+        """Re-read some ingredients (all if None) after their thresholds changed and publish the diff"""
+        return await self._refresh_and_publish(self._refresh, ingredient_ids)
+    
+    async def _refresh_and_publish(self, func, *args) -> int:
+        """Run a blocking snapshot refresh and publish its diff in version order"""
+        async with self._publish_lock:
+            diff = await run_io(func, *args)
+            if diff is None:
+                return 0
+            if self.feed is not None and diff["changes"]:
+                self._publish(diff)
+            return len(diff["changes"])
+    
+    def _refresh(self, ingredient_ids: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+        """Refresh snapshot rows (blocking; runs in the I/O pool)"""
+        with get_db(write=True) as conn:
+            if not self.snapshot.loaded:
+                self.load_snapshot(conn)
+                return None
+            diff = self.snapshot.refresh(conn, ingredient_ids)
+            conn.commit()
+        return diff
+    
+    def _apply_ingest(self, summary: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Refresh the ingredients an ingest touched (blocking; runs in the I/O pool)"""
+        rows_loaded = summary.get("rows_loaded") or {}
+        if not rows_loaded:
+            return None
+        with get_db(write=True) as conn:
+            if not self.snapshot.loaded:
+                self.load_snapshot(conn)
+                return None
+            # Thresholds, recipes and incoming shipments are not tracked per
+            # ingredient by the ingest summary, so those reload every row
+            if FULL_REFRESH_TABLES & rows_loaded.keys():
+                diff = self.snapshot.refresh(conn)
+            else:
+                diff = self.snapshot.refresh(conn, summary.get("stock_changes", {}).keys())
+            conn.commit()
+        return diff
+    
+    def _publish(self, diff: Dict[str, Any]):
+        """Inventory diff and any new low-stock alerts to the change feed"""
+        self.feed.publish("inventory", {
+            "version": diff["version"],
+            "changes": [new if new is not None else {"ingredient_id": old["ingredient_id"], "removed": True}
+                        for old, new in diff["changes"]],
+            "kpis": diff["kpis"]
+        })
+        for old, new in diff["changes"]:
+            if new is None:
+                continue
+            previous = old["status"] if old is not None else None
+            if SEVERITY[new["status"]] > SEVERITY.get(previous, 0):
+                self.feed.publish("alert", {
+                    "ingredient_id": new["ingredient_id"],
+                    "ingredient_name": new["ingredient_name"],
+                    "status": new["status"],
+                    "previous_status": previous,
+                    "current_stock": new["current_stock"],
+                    "reorder_point": new["reorder_point"],
+                    "safety_stock": new["safety_stock"],
+                    "version": diff["version"]
+                })
+    
+    def _query_inventory_levels(self) -> Dict[str, Any]:
+        """Inventory levels and KPIs from the snapshot (blocking; runs in the I/O pool)"""
         try:
-            with get_db() as conn:
-                # Get ingredients with inventory levels
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT 
-                        i.ingredient_id,
-                        i.ingredient_name,
-                        i.unit,
-                        i.reorder_point,
-                        i.safety_stock,
-                        i.par_level,
-                        COALESCE(SUM(p.quantity), 0) - COALESCE(SUM(u.quantity_sold), 0) as current_stock
-                    FROM ingredients i
-                    LEFT JOIN purchases p ON i.ingredient_id = p.ingredient_id
-                    LEFT JOIN usage u ON i.ingredient_id = u.menu_item_id
-                    GROUP BY i.ingredient_id
-                """)
-                
-                ingredients = []
-                for row in cursor.fetchall():
-                    current_stock = row[6] if row[6] else 0
-                    reorder_point = row[3] if row[3] else 0
-                    safety_stock = row[4] if row[4] else 0
-                    
-                    status = "adequate"
-                    if current_stock < reorder_point:
-                        status = "low_stock"
-                    elif current_stock < safety_stock:
-                        status = "critical"
-                    elif current_stock > par_level * 1.5:
-                        status = "overstocked"
-                    
-                    ingredients.append({
-                        "ingredient_id": row[0],
-                        "ingredient_name": row[1],
-                        "unit": row[2],
-                        "current_stock": current_stock,
-                        "reorder_point": reorder_point,
-                        "safety_stock": safety_stock,
-                        "par_level": row[5] if row[5] else 0,
-                        "status": status
-                    })
-                
-                # Calculate KPIs
-                total_ingredients = len(ingredients)
-                low_stock_count = sum(1 for ing in ingredients if ing["status"] in ["low_stock", "critical"])
-                overstocked_count = sum(1 for ing in ingredients if ing["status"] == "overstocked")
-                
-                return {
-                    "ingredients": ingredients,
-                    "kpis": {
-                        "total_ingredients": total_ingredients,
-                        "low_stock_count": low_stock_count,
-                        "overstocked_count": overstocked_count,
-                        "adequate_count": total_ingredients - low_stock_count - overstocked_count,
-                        "low_stock_percentage": (low_stock_count / total_ingredients * 100) if total_ingredients > 0 else 0
-                    },
-                    "timestamp": datetime.now().isoformat()
-                }
+            if not self.snapshot.loaded:
+                with get_db(write=True) as conn:
+                    self.load_snapshot(conn)
+            return json.loads(self.snapshot.body())
         except Exception as e:
             # Return synthetic data if database is empty
             return self._get_synthetic_inventory_levels()
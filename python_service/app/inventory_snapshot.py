@@ -0,0 +1,192 @@
+"""
+In-memory inventory snapshot with incrementally maintained KPIs.
+
+Rows (stock, thresholds, status) are loaded once and then refreshed only
+for the ingredients an ingest touched; status counts are adjusted as rows
+change instead of being recounted. Every change bumps the snapshot
+version, which is the ETag of /inventory/levels, and the serialized
+response is built once per version.
+
+The version is persisted with a digest of the rows it was loaded with,
+so a restart over unchanged data keeps serving the same ETag and a
+restart over changed data never reuses an old one.
+"""
+import hashlib
+import json
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SNAPSHOT_ROWS = """
+    SELECT
+        i.ingredient_id,
+        i.ingredient_name,
+        i.unit,
+        i.reorder_point,
+        i.safety_stock,
+        i.par_level,
+        COALESCE(l.on_hand, 0) AS current_stock,
+        COALESCE(s.incoming, 0) AS incoming_qty,
+        i.order_quantity
+    FROM ingredients i
+    LEFT JOIN stock_ledger l ON l.ingredient_id = i.ingredient_id
+    LEFT JOIN (
+        SELECT ingredient_id, SUM(quantity) AS incoming
+        FROM shipments
+        WHERE arrived_date IS NULL OR status != 'delivered'
+        GROUP BY ingredient_id
+    ) s ON s.ingredient_id = i.ingredient_id
+    {where}
+"""
+
+def stock_status(current_stock: float, reorder_point: float, safety_stock: float, par_level: float) -> str:
+    """critical, low_stock, overstocked or adequate"""
+    if current_stock < safety_stock:
+        return "critical"
+    if current_stock < reorder_point:
+        return "low_stock"
+    if par_level > 0 and current_stock > par_level * 1.5:
+        return "overstocked"
+    return "adequate"
+
+def _row(record) -> Dict[str, Any]:
+    """Response row for a SNAPSHOT_ROWS record (a sqlite3.Row)"""
+    current_stock = record["current_stock"] or 0
+    reorder_point = record["reorder_point"] or 0
+    safety_stock = record["safety_stock"] or 0
+    par_level = record["par_level"] or 0
+    return {
+        "ingredient_id": record["ingredient_id"],
+        "ingredient_name": record["ingredient_name"],
+        "unit": record["unit"],
+        "current_stock": current_stock,
+        "incoming_qty": record["incoming_qty"] or 0,
+        "reorder_point": reorder_point,
+        "safety_stock": safety_stock,
+        "par_level": par_level,
+        "order_quantity": record["order_quantity"] or 0,
+        "status": stock_status(current_stock, reorder_point, safety_stock, par_level)
+    }
+
+class InventorySnapshot:
+    """Inventory rows, status counters and the serialized response for the current version"""
+    
+    def __init__(self):
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.counts: Counter = Counter()
+        self.version = 0
+        self.updated_at: Optional[str] = None
+        self.loaded = False
+        self._body: Optional[bytes] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def etag(self) -> str:
+        return f'"{self.version}"'
+    
+    def load(self, conn):
+        """Build the snapshot from the database, resuming the persisted version"""
+        rows = {record["ingredient_id"]: _row(record) for record in conn.execute(SNAPSHOT_ROWS.format(where=""))}
+        digest = hashlib.sha1(json.dumps(rows, sort_keys=True).encode()).hexdigest()
+        
+        stored = conn.execute("SELECT version, digest FROM inventory_snapshot WHERE id = 1").fetchone()
+        version = stored[0] if stored else 0
+        if stored is None or stored[1] != digest:
+            version += 1
+            self._persist(conn, version, digest)
+        
+        with self._lock:
+            self.rows = rows
+            self.counts = Counter(row["status"] for row in rows.values())
+            self.version = version
+            self.updated_at = datetime.now().isoformat()
+            self.loaded = True
+            self._body = None
+    
+    def refresh(self, conn, ingredient_ids: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Re-read some ingredients (all if None) and apply the rows that changed
+        
+        Returns the new version, the (old row, new row) pairs that changed
+        (None for an added or removed ingredient) and the KPIs after them.
+        The caller commits.
+        """
+        if ingredient_ids is None:
+            records = conn.execute(SNAPSHOT_ROWS.format(where="")).fetchall()
+            requested = None
+        else:
+            requested = list(dict.fromkeys(ingredient_ids))
+            records = []
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(requested), 500):
+                batch = requested[start:start + 500]
+                records += conn.execute(
+                    SNAPSHOT_ROWS.format(where=f"WHERE i.ingredient_id IN ({','.join('?' * len(batch))})"),
+                    batch
+                ).fetchall()
+        fresh = {record["ingredient_id"]: _row(record) for record in records}
+        
+        with self._lock:
+            gone = (self.rows.keys() if requested is None else set(requested)) - fresh.keys()
+            changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]] = []
+            for ingredient_id in list(gone):
+                row = self.rows.pop(ingredient_id, None)
+                if row is not None:
+                    self.counts[row["status"]] -= 1
+                    changes.append((row, None))
+            for ingredient_id, row in fresh.items():
+                old = self.rows.get(ingredient_id)
+                if old == row:
+                    continue
+                if old is not None:
+                    self.counts[old["status"]] -= 1
+                self.counts[row["status"]] += 1
+                self.rows[ingredient_id] = row
+                changes.append((old, row))
+            
+            if changes:
+                self.version += 1
+                self.updated_at = datetime.now().isoformat()
+                self._body = None
+            diff = {"version": self.version, "changes": changes, "kpis": self.kpis()}
+        if changes:
+            # The rows for this version are only known in memory; a restart recomputes the digest
+            self._persist(conn, diff["version"], None)
+        return diff
+    
+    def kpis(self) -> Dict[str, Any]:
+        """KPIs from the status counters"""
+        total = len(self.rows)
+        low_stock = self.counts["low_stock"] + self.counts["critical"]
+        overstocked = self.counts["overstocked"]
+        return {
+            "total_ingredients": total,
+            "low_stock_count": low_stock,
+            "critical_count": self.counts["critical"],
+            "overstocked_count": overstocked,
+            "adequate_count": total - low_stock - overstocked,
+            "low_stock_percentage": (low_stock / total * 100) if total > 0 else 0
+        }
+    
+    def body(self) -> bytes:
+        """Serialized /inventory/levels response for the current version"""
+        return self.tagged_body()[1]
+    
+    def tagged_body(self) -> Tuple[str, bytes]:
+        """ETag and serialized response of the same version"""
+        with self._lock:
+            if self._body is None:
+                self._body = json.dumps({
+                    "ingredients": list(self.rows.values()),
+                    "kpis": self.kpis(),
+                    "version": self.version,
+                    "timestamp": self.updated_at
+                }).encode()
+            return self.etag, self._body
+    
+    def _persist(self, conn, version: int, digest: Optional[str]):
+        """Store the current version (and the digest of its rows, if known)"""
+        conn.execute("""
+            INSERT INTO inventory_snapshot (id, version, digest) VALUES (1, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET version = excluded.version, digest = excluded.digest
+        """, (version, digest))
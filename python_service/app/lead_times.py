@@ -0,0 +1,104 @@
+"""
+Incremental lead-time distributions per vendor and ingredient.
+
+Each delivered shipment contributes one lead time (lead_time_days, or
+arrived_date - shipped_date when that is missing). Count, mean and sum of
+squared deviations (Welford's M2) are stored per (vendor, ingredient) and
+new shipments are merged in batches with Chan's parallel update, so only
+the rows an ingest inserted are read. Like the stock ledger, the
+statistics are rebuilt when uploads replace shipment rows.
+"""
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, Set, Tuple
+
+LEAD_TIME_DELTAS = """
+    SELECT vendor, ingredient_id, COUNT(*), SUM(lead), SUM(lead * lead)
+    FROM (
+        SELECT COALESCE(vendor, '') AS vendor, ingredient_id,
+               COALESCE(lead_time_days, julianday(arrived_date) - julianday(shipped_date)) AS lead
+        FROM shipments
+        WHERE shipment_id > ? AND shipment_id <= ? AND ingredient_id IS NOT NULL
+    )
+    WHERE lead IS NOT NULL AND lead >= 0
+    GROUP BY vendor, ingredient_id
+"""
+
+# (samples, mean, m2)
+Moments = Tuple[int, float, float]
+
+def merge_moments(a: Moments, b: Moments) -> Moments:
+    """Chan et al. combination of two sets of moments"""
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n
+
+def pooled(moments: Iterable[Moments]) -> Moments:
+    """Moments of the union of several samples"""
+    total = (0, 0.0, 0.0)
+    for m in moments:
+        total = merge_moments(total, m)
+    return total
+
+def _watermark(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT last_id FROM lead_time_watermark WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+def sync_lead_times(conn: sqlite3.Connection) -> Set[str]:
+    """Fold shipments added since the last sync into lead_time_stats
+    
+    Shipments still in transit are skipped; they count once an upload
+    brings them in delivered. Returns the ingredient ids whose
+    distributions changed. The caller commits.
+    """
+    mark = _watermark(conn)
+    last_id = conn.execute("SELECT COALESCE(MAX(shipment_id), 0) FROM shipments").fetchone()[0]
+    if last_id <= mark:
+        return set()
+    
+    batches = conn.execute(LEAD_TIME_DELTAS, (mark, last_id)).fetchall()
+    existing = {
+        (vendor, ingredient_id): (samples, mean, m2)
+        for vendor, ingredient_id, samples, mean, m2 in conn.execute(
+            "SELECT vendor, ingredient_id, samples, mean, m2 FROM lead_time_stats"
+        )
+    }
+    now = datetime.now().isoformat()
+    rows = []
+    for vendor, ingredient_id, count, total, squares in batches:
+        mean = total / count
+        batch = (count, mean, max(squares - total * mean, 0.0))
+        merged = merge_moments(existing.get((vendor, ingredient_id), (0, 0.0, 0.0)), batch)
+        rows.append((vendor, ingredient_id, *merged, now))
+    conn.executemany("""
+        INSERT INTO lead_time_stats (vendor, ingredient_id, samples, mean, m2, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(vendor, ingredient_id) DO UPDATE SET
+            samples = excluded.samples, mean = excluded.mean, m2 = excluded.m2,
+            updated_at = excluded.updated_at
+    """, rows)
+    conn.execute("""
+        INSERT INTO lead_time_watermark (id, last_id) VALUES (1, ?)
+        ON CONFLICT(id) DO UPDATE SET last_id = excluded.last_id
+    """, (last_id,))
+    return {row[1] for row in rows}
+
+def rebuild_lead_times(conn: sqlite3.Connection) -> Set[str]:
+    """Recompute every distribution from the shipments table (after deletes)"""
+    before = {row[0] for row in conn.execute("SELECT DISTINCT ingredient_id FROM lead_time_stats")}
+    conn.execute("DELETE FROM lead_time_stats")
+    conn.execute("DELETE FROM lead_time_watermark")
+    return sync_lead_times(conn) | before
+
+def lead_time_moments(conn: sqlite3.Connection) -> Dict[Tuple[str, str], Moments]:
+    """Stored moments by (vendor, ingredient_id)"""
+    return {
+        (vendor, ingredient_id): (samples, mean, m2)
+        for vendor, ingredient_id, samples, mean, m2 in conn.execute(
+            "SELECT vendor, ingredient_id, samples, mean, m2 FROM lead_time_stats"
+        )
+    }
@@ -0,0 +1,158 @@
+"""
+Inventory levels over a large usage history: full-history queries vs the stock ledger.
+    
+    python -m app.ledger_benchmark [usage_rows] [menu_items]
+
+Seeds a scratch database with `usage_rows` (default 1,000,000) daily
+usage rows over `menu_items` (default 500) menu items, three recipe lines
+per item, 200 ingredients and a purchase per ingredient per week, then
+times:
+
+- the levels query as it was before the ledger (ingredients LEFT JOIN
+  purchases and usage, GROUP BY) on a copy without the secondary indexes
+- the same totals computed correctly from full history (usage exploded
+  through recipe) with the indexes
+- the levels query the service runs now, reading stock_ledger
+- rebuild_stock_ledger over the whole history, and sync_stock_ledger
+  folding in one more day of usage
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+INGREDIENTS = 200
+RECIPE_LINES = 3
+# Usage rows inserted per executemany call while seeding
+SEED_BATCH = 100_000
+
+OLD_LEVELS = """
+    SELECT
+        i.ingredient_id,
+        COALESCE(SUM(p.quantity), 0) - COALESCE(SUM(u.quantity_sold), 0) as current_stock
+    FROM ingredients i
+    LEFT JOIN purchases p ON i.ingredient_id = p.ingredient_id
+    LEFT JOIN usage u ON i.ingredient_id = u.menu_item_id
+    GROUP BY i.ingredient_id
+"""
+
+HISTORY_LEVELS = """
+    SELECT
+        i.ingredient_id,
+        COALESCE(p.qty, 0) - COALESCE(u.qty, 0) AS current_stock
+    FROM ingredients i
+    LEFT JOIN (
+        SELECT ingredient_id, SUM(quantity) AS qty FROM purchases GROUP BY ingredient_id
+    ) p ON p.ingredient_id = i.ingredient_id
+    LEFT JOIN (
+        SELECT r.ingredient_id, SUM(u.quantity_sold * r.qty_per_serving) AS qty
+        FROM usage u
+        JOIN recipe r ON r.menu_item_id = u.menu_item_id
+        GROUP BY r.ingredient_id
+    ) u ON u.ingredient_id = i.ingredient_id
+"""
+
+def seed(usage_rows: int, menu_items: int, random_seed: int = 0) -> int:
+    """Ingredients, recipe, weekly purchases and daily usage in DATABASE_URL
+    
+    Returns the number of days of usage.
+    """
+    from datetime import date, timedelta
+    from app.database import get_db, init_db
+    
+    rng = np.random.default_rng(random_seed)
+    init_db()
+    days = -(-usage_rows // menu_items)
+    start = date(2025, 1, 1) - timedelta(days=days)
+    dates = [(start + timedelta(days=day)).isoformat() for day in range(days + 1)]
+    with get_db(write=True) as conn:
+        conn.executemany(
+            "INSERT INTO ingredients (ingredient_id, ingredient_name, unit, reorder_point, safety_stock, par_level) "
+            "VALUES (?, ?, 'g', 200, 100, 1000)",
+            [(f"ing{k}", f"Ingredient {k}") for k in range(INGREDIENTS)]
+        )
+        conn.executemany(
+            "INSERT INTO recipe (menu_item_id, ingredient_id, qty_per_serving) VALUES (?, ?, ?)",
+            [(f"item{m}", f"ing{(m * RECIPE_LINES + line) % INGREDIENTS}", float(rng.uniform(10, 200)))
+             for m in range(menu_items) for line in range(RECIPE_LINES)]
+        )
+        conn.executemany(
+            "INSERT INTO purchases (ingredient_id, quantity, unit_cost, purchase_date) VALUES (?, ?, 1.0, ?)",
+            [(f"ing{k}", float(rng.uniform(1000, 5000)), dates[day])
+             for day in range(0, days, 7) for k in range(INGREDIENTS)]
+        )
+        for first in range(0, usage_rows, SEED_BATCH):
+            rows = range(first, min(first + SEED_BATCH, usage_rows))
+            sold = rng.poisson(20, len(rows))
+            conn.executemany(
+                "INSERT INTO usage (date, menu_item_id, menu_item_name, quantity_sold) VALUES (?, ?, ?, ?)",
+                [(dates[row // menu_items], f"item{row % menu_items}", f"Item {row % menu_items}", int(qty))
+                 for row, qty in zip(rows, sold)]
+            )
+        conn.commit()
+    return days
+
+def timed(func, repeats: int = 1) -> float:
+    """Best-of-repeats seconds for func()"""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    usage_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    menu_items = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    scratch = tempfile.mkdtemp(prefix="msy-ledger-")
+    path = os.path.join(scratch, "ledger.db")
+    # app.database reads DATABASE_URL on import
+    os.environ["DATABASE_URL"] = "sqlite:///" + path
+    from app.database import get_db
+    from app.inventory_snapshot import SNAPSHOT_ROWS
+    from app.stock_ledger import rebuild_stock_ledger, sync_stock_ledger
+    
+    started = time.perf_counter()
+    days = seed(usage_rows, menu_items)
+    print(f"Seeded {usage_rows:,} usage rows ({menu_items} menu items x {days} days), "
+          f"{INGREDIENTS} ingredients in {time.perf_counter() - started:.1f}s")
+    
+    # The pre-ledger schema had no secondary indexes
+    unindexed_path = os.path.join(scratch, "unindexed.db")
+    with get_db() as conn:
+        target = sqlite3.connect(unindexed_path)
+        conn.backup(target)
+    indexes = target.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall()
+    for (name,) in indexes:
+        target.execute(f"DROP INDEX {name}")
+    target.commit()
+    
+    results = [("old levels query, no indexes", timed(lambda: target.execute(OLD_LEVELS).fetchall()))]
+    target.close()
+    with get_db(write=True) as conn:
+        results.append(("full-history totals", timed(lambda: conn.execute(HISTORY_LEVELS).fetchall(), 3)))
+        results.append(("rebuild_stock_ledger", timed(lambda: rebuild_stock_ledger(conn))))
+        conn.commit()
+        
+        conn.executemany(
+            "INSERT INTO usage (date, menu_item_id, menu_item_name, quantity_sold) VALUES ('2025-01-01', ?, ?, 20)",
+            [(f"item{m}", f"Item {m}") for m in range(menu_items)]
+        )
+        results.append((f"sync_stock_ledger, +{menu_items} rows", timed(lambda: sync_stock_ledger(conn))))
+        conn.commit()
+    with get_db() as conn:
+        query = SNAPSHOT_ROWS.format(where="")
+        results.append(("ledger levels query", timed(lambda: conn.execute(query).fetchall(), 20)))
+    
+    print(f"{'step':<34}{'ms':>12}")
+    for step, seconds in results:
+        print(f"{step:<34}{seconds * 1000:>12.1f}")
+    shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
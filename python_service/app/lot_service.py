@@ -0,0 +1,117 @@
+import asyncio
+import numpy as np
+from typing import Dict, List, Any, Optional
+from datetime import date, timedelta
+from app.database import get_async_db, get_db
+from app.executor import run_io
+from app.forecast_service import ForecastService
+from app.lots import day_iso, load_lots, project_waste, rebuild_lots
+
+# Days of past waste reported next to the projection
+RECENT_WASTE_DAYS = 30
+
+class LotService:
+    def __init__(self, forecast_service: ForecastService):
+        self.forecast_service = forecast_service
+        self.last_rebuild: Optional[Dict[str, Any]] = None
+        # Rebuilds replace every lot, so they never overlap
+        self._lock = asyncio.Lock()
+    
+    async def rebuild(self) -> Dict[str, Any]:
+        """Replay the full purchase and usage history into lots and waste"""
+        async with self._lock:
+            self.last_rebuild = await run_io(self._rebuild)
+            return self.last_rebuild
+    
+    def _rebuild(self) -> Dict[str, Any]:
+        with get_db(write=True) as conn:
+            summary = rebuild_lots(conn)
+            conn.commit()
+        return summary
+    
+    async def get_lots(self, ingredient_id: Optional[str] = None) -> Dict[str, Any]:
+        """Open lots per ingredient, earliest expiry first
+        
+        A plain read, so it goes through the aiosqlite pool and does not
+        wait for a slot in the I/O thread pool behind slower work.
+        """
+        where, params = ("WHERE ingredient_id = ?", (ingredient_id,)) if ingredient_id else ("", ())
+        async with get_async_db() as conn:
+            state = await conn.execute_fetchall("SELECT as_of, rebuilt_at FROM lot_state WHERE id = 1")
+            rows = await conn.execute_fetchall(f"""
+                SELECT ingredient_id, lot_id, purchase_id, received_date, expiry_date, quantity, remaining, unit_cost
+                FROM stock_lots {where}
+                ORDER BY ingredient_id, expiry_date IS NULL, expiry_date, lot_id
+            """, params)
+        return self._group_lots(state[0] if state else None, rows)
+    
+    def _group_lots(self, state, rows) -> Dict[str, Any]:
+        """Lots grouped per ingredient with their on-hand totals"""
+        ingredients: Dict[str, Dict[str, Any]] = {}
+        for ingredient_id, lot_id, purchase_id, received, expiry, quantity, remaining, unit_cost in rows:
+            entry = ingredients.setdefault(ingredient_id, {"ingredient_id": ingredient_id, "on_hand": 0.0, "lots": []})
+            entry["on_hand"] += remaining
+            entry["lots"].append({
+                "lot_id": lot_id,
+                "purchase_id": purchase_id,
+                "received_date": received,
+                "expiry_date": expiry,
+                "quantity": quantity,
+                "remaining": remaining,
+                "unit_cost": unit_cost
+            })
+        return {
+            "as_of": state[0] if state else None,
+            "rebuilt_at": state[1] if state else None,
+            "ingredients": list(ingredients.values())
+        }
+    
+    async def waste_projection(self, horizon: int = 30) -> Dict[str, Any]:
+        """Stock expected to expire unused over the horizon if usage follows the forecast
+        
+        Ingredients are sorted by projected waste cost; each also reports
+        what expired over the last RECENT_WASTE_DAYS.
+        """
+        if not 1 <= horizon <= 365:
+            raise ValueError("horizon must be between 1 and 365")
+        outlook = await self.forecast_service.demand_outlook(horizon)
+        forecasts = dict(zip(outlook["ingredient_ids"], outlook["forecasts"]))
+        return await run_io(self._project, forecasts, horizon)
+    
+    def _project(self, forecasts: Dict[str, np.ndarray], horizon: int) -> Dict[str, Any]:
+        """Run forecasts through the open lots (blocking; runs in the I/O pool)"""
+        today = date.today()
+        since = (today - timedelta(days=RECENT_WASTE_DAYS)).isoformat()
+        with get_db() as conn:
+            heaps = load_lots(conn)
+            names = dict(conn.execute("SELECT ingredient_id, ingredient_name FROM ingredients"))
+            recent = {
+                ingredient_id: (quantity, cost)
+                for ingredient_id, quantity, cost in conn.execute("""
+                    SELECT ingredient_id, SUM(quantity), SUM(cost) FROM lot_waste
+                    WHERE expiry_date >= ? GROUP BY ingredient_id
+                """, (since,))
+            }
+        
+        no_demand = np.zeros(horizon)
+        rows: List[Dict[str, Any]] = []
+        for ingredient_id, heap in heaps.items():
+            projection = project_waste(heap, forecasts.get(ingredient_id, no_demand), today.toordinal())
+            past_quantity, past_cost = recent.get(ingredient_id, (0.0, 0.0))
+            rows.append({
+                "ingredient_id": ingredient_id,
+                "ingredient_name": names.get(ingredient_id, ingredient_id),
+                "on_hand": heap.on_hand(),
+                "next_expiry": day_iso(heap.lots[0][0]) if heap.lots else None,
+                **projection,
+                "recent_waste_qty": past_quantity,
+                "recent_waste_cost": past_cost
+            })
+        rows.sort(key=lambda row: -row["projected_waste_cost"])
+        return {
+            "horizon": horizon,
+            "start_date": today.isoformat(),
+            "projected_waste_cost": sum(row["projected_waste_cost"] for row in rows),
+            "recent_waste_cost": sum(row["recent_waste_cost"] for row in rows),
+            "ingredients": rows
+        }
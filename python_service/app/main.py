@@ -1,19 +1,26 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import pandas as pd
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import asyncio
 import os
-from typing import Optional, List
-from pydantic import BaseModel
+from typing import Any, Dict, Optional, List
+from pydantic import BaseModel, Field
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.database import init_db, get_db
-from app.data_processor import DataProcessor
-from app.forecast_service import ForecastService
+from app.change_feed import ChangeFeed, TOPICS
+from app.database import init_db, get_db, pool_metrics, async_pool
+from app.forecast_service import FORECAST_HORIZON_MAX, ForecastService
 from app.inventory_service import InventoryService
+from app.lead_times import sync_lead_times
+from app.lot_service import LotService
+from app.order_plan_service import ORDER_HORIZON_MAX, OrderPlanService
+from app.replenishment_service import ReplenishmentService
 from app.shipment_service import ShipmentService
+from app.executor import executor_metrics, run_io, shutdown_executors
+from app.training_jobs import TrainingJobManager
+from app.stock_ledger import sync_stock_ledger
 
 app = FastAPI(title="Mai Shan Yun Inventory Intelligence API", version="1.0.0")
 
@@ -26,35 +33,124 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-data_processor = DataProcessor()
+# Initialize services; pandas, pyarrow and torch are only imported once
+# an upload, forecast or training request needs them
 forecast_service = ForecastService()
-inventory_service = InventoryService()
-shipment_service = ShipmentService()
+# Inventory diffs, low-stock alerts and shipment status changes for /events
+change_feed = ChangeFeed()
+inventory_service = InventoryService(change_feed)
+shipment_service = ShipmentService(change_feed)
+replenishment_service = ReplenishmentService(forecast_service, inventory_service)
+lot_service = LotService(forecast_service)
+order_plan_service = OrderPlanService(forecast_service, replenishment_service)
+training_jobs = TrainingJobManager(forecast_service)
+_data_processor = None
+
+# Startup progress reported by /ready
+readiness = {"database": False, "model": "pending"}
+
+# Ingested tables that change demand, stock position or lead times
+REPLENISH_TABLES = {"usage", "purchases", "shipments", "shipment_schedule", "recipe"}
+# Ingested tables that change lots: receipts, usage and how it explodes, shelf lives
+LOT_TABLES = {"usage", "purchases", "recipe", "ingredients"}
+
+def get_data_processor():
+    """Upload processor, created on first use"""
+    global _data_processor
+    if _data_processor is None:
+        from app.data_processor import DataProcessor
+        _data_processor = DataProcessor()
+    return _data_processor
+
+async def load_model_in_background():
+    """Load the active model version (or legacy MODEL_PATH) after the API is up"""
+    readiness["model"] = "loading"
+    try:
+        await forecast_service.load_model_async()
+        readiness["model"] = "loaded" if forecast_service.model is not None else "absent"
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        readiness["model"] = "error"
+        return
+    schedule_replenishment()
+
+def schedule_replenishment():
+    """Recompute replenishment levels in the background"""
+    async def run():
+        try:
+            await replenishment_service.run()
+        except Exception as e:
+            print(f"Error computing replenishment levels: {e}")
+    app.state.replenishment = asyncio.create_task(run())
+
+async def rebuild_lots() -> Dict[str, Any]:
+    """Replay lots and refresh the inventory rows whose expired stock was written off"""
+    summary = await lot_service.rebuild()
+    if summary["stock_changes"]:
+        await inventory_service.refresh(list(summary["stock_changes"]))
+    return summary
+
+def schedule_lot_rebuild():
+    """Replay purchase and usage history into lots in the background"""
+    async def run():
+        try:
+            await rebuild_lots()
+        except Exception as e:
+            print(f"Error rebuilding lots: {e}")
+    app.state.lot_rebuild = asyncio.create_task(run())
+
+def schedule_after_ingest(rows_loaded: Dict[str, int]):
+    """Background recomputes that depend on the tables an ingest loaded"""
+    if REPLENISH_TABLES & rows_loaded.keys():
+        schedule_replenishment()
+    if LOT_TABLES & rows_loaded.keys():
+        schedule_lot_rebuild()
 
 @app.on_event("startup")
 async def startup_event():
     init_db()
-    # Load existing model if available
-    model_path = os.getenv("MODEL_PATH", "./data/models/lstm_forecaster.pt")
-    if os.path.exists(model_path):
-        forecast_service.load_model(model_path)
+    # Fold in rows written outside the API (seed script, manual loads)
+    with get_db(write=True) as conn:
+        sync_stock_ledger(conn)
+        sync_lead_times(conn)
+        conn.commit()
+        inventory_service.load_snapshot(conn)
+        shipment_service.load_states(conn)
+    readiness["database"] = True
+    schedule_lot_rebuild()
+    app.state.model_loader = asyncio.create_task(load_model_in_background())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    training_jobs.shutdown()
+    shutdown_executors()
+    forecast_service.cache.close()
+    await async_pool.close()
 
 # Request/Response models
 class ForecastRequest(BaseModel):
     ingredient_id: str
-    horizon: int = 30
+    horizon: int = Field(30, ge=1, le=FORECAST_HORIZON_MAX)
 
 class BulkForecastRequest(BaseModel):
-    horizon: int = 30
+    horizon: int = Field(30, ge=1, le=FORECAST_HORIZON_MAX)
 
 class UploadResponse(BaseModel):
     message: str
     file_id: str
     rows_processed: int
+    rows_per_second: float
+    status: str
+    rows_skipped: int
+    bytes_skipped: int
+
+class MenuForecastRequest(BaseModel):
+    forecasts: Dict[str, List[float]]  # menu_item_id -> daily quantities
 
 class ProcessRequest(BaseModel):
     file_id: Optional[str] = None
+    since: Optional[str] = None  # YYYY-MM
+    until: Optional[str] = None  # YYYY-MM
 
 # Health check
 @app.get("/")
@@ -65,6 +161,46 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once the database is initialised and the model load has finished"""
+    is_ready = readiness["database"] and readiness["model"] not in ("pending", "loading")
+    return JSONResponse(
+        {"status": "ready" if is_ready else "starting", **readiness},
+        status_code=200 if is_ready else 503
+    )
+
+@app.get("/metrics/db")
+async def db_metrics():
+    """Connection pool metrics"""
+    return pool_metrics()
+
+@app.get("/metrics/executor")
+async def executor_pool_metrics():
+    """Worker pool sizes and tasks in flight"""
+    return executor_metrics()
+
+@app.get("/metrics/forecast-cache")
+async def forecast_cache_metrics():
+    """Forecast cache hit/miss counters"""
+    return forecast_service.cache.stats()
+
+@app.get("/metrics/inference")
+async def inference_metrics():
+    """Served model version, inference mode and its drift from fp32"""
+    model = forecast_service.model
+    return {
+        "model_version": forecast_service.model_version,
+        "requested_mode": forecast_service.inference_mode,
+        "mode": model.mode if model is not None else None,
+        "drift": model.drift if model is not None else {}
+    }
+
+@app.get("/metrics/feed")
+async def feed_metrics():
+    """Change feed subscribers, events published/delivered and slow-client resyncs"""
+    return change_feed.metrics()
+
 # Upload endpoint
 @app.post("/upload", response_model=UploadResponse)
 async def upload_file(file: UploadFile = File(...)):
@@ -72,22 +208,34 @@ async def upload_file(file: UploadFile = File(...)):
     try:
         file_ext = os.path.splitext(file.filename)[1].lower()
         
-        if file_ext == '.csv':
-            df = pd.read_csv(file.file)
-        elif file_ext in ['.xlsx', '.xls']:
-            df = pd.read_excel(file.file)
-        else:
+        if file_ext not in ['.csv', '.xlsx', '.xls']:
             raise HTTPException(status_code=400, detail="Unsupported file format. Use CSV or XLSX.")
         
-        # Process the file
-        file_id = await data_processor.process_file(df, file.filename)
-        rows_processed = len(df)
+        # Stream the file into the processed store and canonical tables
+        data_processor = await run_io(get_data_processor)
+        summary = await data_processor.ingest_upload(file.file, file.filename, file_ext)
+        if summary["rows_loaded"]:
+            # Drop cached forecasts of ingredients whose history just changed
+            await forecast_service.refresh_data()
+            await inventory_service.apply_ingest(summary)
+            await shipment_service.apply_ingest(summary)
+            schedule_after_ingest(summary["rows_loaded"])
+        
+        message = "File uploaded and processed successfully"
+        if summary["status"] == "unchanged":
+            message = "File already uploaded; nothing to process"
         
         return UploadResponse(
-            message="File uploaded and processed successfully",
-            file_id=file_id,
-            rows_processed=rows_processed
+            message=message,
+            file_id=summary["file_id"],
+            rows_processed=summary["rows_processed"],
+            rows_per_second=summary["rows_per_second"],
+            status=summary["status"],
+            rows_skipped=summary["rows_skipped"],
+            bytes_skipped=summary["bytes_skipped"]
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
@@ -96,28 +244,53 @@ async def upload_file(file: UploadFile = File(...)):
 async def process_data(request: ProcessRequest):
     """Clean and canonicalize uploaded data"""
     try:
-        result = await data_processor.canonicalize_data(request.file_id)
+        data_processor = await run_io(get_data_processor)
+        result = await data_processor.canonicalize_data(request.file_id, request.since, request.until)
+        await forecast_service.refresh_data()
+        await inventory_service.apply_ingest(result)
+        await shipment_service.apply_ingest(result)
+        schedule_after_ingest(result.get("rows_loaded") or {})
         return {"message": "Data processed successfully", "result": result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing data: {str(e)}")
 
-# Training endpoint
+# Training endpoints
 @app.post("/train")
 async def train_model():
-    """Trigger model training"""
+    """Start a background training job (or join the one already running)"""
     try:
-        result = await forecast_service.train_model()
-        return {"message": "Model training completed", "result": result}
+        job = await training_jobs.submit()
+        return {"message": "Model training started", "job": job}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error training model: {str(e)}")
 
+@app.get("/train/{job_id}")
+async def get_training_job(job_id: str):
+    """Get epoch, loss and ETA for a training job"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job
+
+@app.delete("/train/{job_id}")
+async def cancel_training_job(job_id: str):
+    """Cancel a running training job"""
+    job = training_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job
+
 # Forecast endpoints
 @app.get("/forecast/predict")
-async def predict_forecast(ingredient_id: str, horizon: int = 30):
+async def predict_forecast(ingredient_id: str, horizon: int = Query(30, ge=1, le=FORECAST_HORIZON_MAX)):
     """Forecast demand for a specific ingredient"""
     try:
         forecast = await forecast_service.predict(ingredient_id, horizon)
         return forecast
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating forecast: {str(e)}")
 
@@ -126,30 +299,184 @@ async def bulk_forecast(request: BulkForecastRequest):
     """Forecast demand for all ingredients"""
     try:
         forecasts = await forecast_service.bulk_predict(request.horizon)
-        return {"forecasts": forecasts}
+        # Forecasts are plain JSON types; skip re-encoding every point
+        return JSONResponse({"forecasts": forecasts})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating bulk forecast: {str(e)}")
 
+@app.post("/forecast/backtest")
+async def run_forecast_backtest():
+    """Run a rolling-origin backtest of every forecast engine and store the results"""
+    try:
+        return JSONResponse(await forecast_service.run_backtest())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running backtest: {str(e)}")
+
+@app.get("/forecast/backtest")
+async def get_forecast_backtest(ingredient_id: Optional[str] = None):
+    """Latest backtest: MAPE/WAPE/bias, wall-clock and memory per engine (and per ingredient if given)"""
+    from app.backtest import latest_backtest
+    result = await run_io(latest_backtest, ingredient_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No backtest has been run")
+    return result
+
+@app.post("/forecast/menu-items")
+async def explode_menu_forecast(request: MenuForecastRequest):
+    """Turn per-menu-item demand forecasts into per-ingredient demand via the recipe"""
+    try:
+        ingredients = await forecast_service.explode_menu_forecast(request.forecasts)
+        return {"ingredients": ingredients}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error exploding menu forecast: {str(e)}")
+
+@app.get("/forecast/engines")
+async def forecast_engines():
+    """Forecast engine chosen per ingredient and the holdout errors behind each choice"""
+    try:
+        return JSONResponse(await forecast_service.engine_summary())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error selecting forecast engines: {str(e)}")
+
 # Inventory endpoints
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names etag (weak comparison)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
 @app.get("/inventory/levels")
-async def get_inventory_levels():
-    """Get current inventory levels and KPIs"""
+async def get_inventory_levels(request: Request):
+    """Get current inventory levels and KPIs
+    
+    Served from the in-memory snapshot; the ETag is the snapshot version,
+    so polling clients sending If-None-Match get 304 until stock changes.
+    """
     try:
-        levels = await inventory_service.get_inventory_levels()
-        return levels
+        snapshot = inventory_service.snapshot
+        if not snapshot.loaded:
+            return await inventory_service.get_inventory_levels()
+        etag, body = snapshot.tagged_body()
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching inventory levels: {str(e)}")
 
+# Replenishment endpoints
+@app.post("/replenishment/run")
+async def run_replenishment():
+    """Recompute reorder points, safety stock and order quantities now"""
+    try:
+        return JSONResponse(await replenishment_service.run())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing replenishment: {str(e)}")
+
+@app.get("/replenishment")
+async def get_replenishment():
+    """Latest replenishment plan with the lead-time statistics behind it"""
+    try:
+        return JSONResponse(await replenishment_service.get_plan())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing replenishment: {str(e)}")
+
+@app.get("/inventory/stockout-risk")
+async def get_stockout_risk(paths: Optional[int] = Query(None, ge=1),
+                            horizon: Optional[int] = Query(None, ge=1, le=365)):
+    """Monte Carlo stockout probability before the next delivery and days of cover per ingredient"""
+    try:
+        return JSONResponse(await replenishment_service.stockout_risk(paths, horizon))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error simulating stockout risk: {str(e)}")
+
+# Lot endpoints
+@app.get("/inventory/lots")
+async def get_inventory_lots(ingredient_id: Optional[str] = None):
+    """Open lots per ingredient with received and expiry dates"""
+    try:
+        return JSONResponse(await lot_service.get_lots(ingredient_id))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching lots: {str(e)}")
+
+@app.post("/inventory/lots/rebuild")
+async def rebuild_inventory_lots():
+    """Replay the full purchase and usage history into lots now"""
+    try:
+        return JSONResponse(await rebuild_lots())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rebuilding lots: {str(e)}")
+
+@app.get("/inventory/waste-projection")
+async def get_waste_projection(horizon: int = Query(30, ge=1, le=365)):
+    """Stock projected to expire unused over the horizon, per ingredient"""
+    try:
+        return JSONResponse(await lot_service.waste_projection(horizon))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error projecting waste: {str(e)}")
+
+# Order planning endpoints
+@app.post("/orders/plan")
+async def plan_orders(horizon: int = Query(30, ge=1, le=ORDER_HORIZON_MAX), method: str = "heuristic"):
+    """Compute a minimum-cost purchase schedule per vendor (method: heuristic, milp or lp)"""
+    try:
+        return JSONResponse(await order_plan_service.plan(horizon, method))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error planning orders: {str(e)}")
+
+@app.get("/orders/plan")
+async def get_order_plan():
+    """Latest purchase schedule per vendor"""
+    try:
+        return JSONResponse(await order_plan_service.get_plan())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error planning orders: {str(e)}")
+
 # Shipment endpoints
 @app.get("/shipments")
-async def get_shipments():
-    """Get shipment and delay information"""
+async def get_shipments(vendor: Optional[str] = None, ingredient_id: Optional[str] = None,
+                        status: Optional[str] = None, since: Optional[str] = None,
+                        until: Optional[str] = None, cursor: Optional[str] = None, limit: int = 100):
+    """Get a page of shipments (newest first) with delay statistics over every matching shipment
+    
+    Pass next_cursor from the previous page as cursor to continue.
+    """
     try:
-        shipments = await shipment_service.get_shipments()
+        shipments = await shipment_service.get_shipments(vendor, ingredient_id, status, since, until, cursor, limit)
         return shipments
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching shipments: {str(e)}")
 
+# Push endpoint
+@app.get("/events")
+async def stream_events(request: Request, topics: Optional[str] = None):
+    """Server-sent events: inventory diffs, low-stock alerts and shipment status changes
+    
+    topics is a comma-separated subset of inventory, alert and shipment.
+    A `resync` event means events were dropped; refetch the REST endpoints.
+    """
+    selected = [topic.strip() for topic in topics.split(",") if topic.strip()] if topics else None
+    unknown = set(selected or ()) - set(TOPICS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown topics: {', '.join(sorted(unknown))}")
+    subscriber = change_feed.subscribe(selected, request.headers.get("last-event-id"))
+    return StreamingResponse(
+        change_feed.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
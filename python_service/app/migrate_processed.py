@@ -0,0 +1,80 @@
+"""
+Convert CSV processed copies to the columnar Parquet store.
+
+Run once after upgrading:
+
+    python -m app.migrate_processed [processed_dir]
+
+Each upload's CSV copy is rewritten as typed Parquet parts and removed.
+CSV and Parquet read throughput is measured per file and summarized.
+"""
+import os
+import sys
+import time
+from typing import Dict, Any
+from app.canonicalizer import parse_period
+from app.data_processor import DataProcessor, iter_chunks
+from app.database import get_db, init_db
+
+def _timed_rows(read) -> tuple:
+    """(rows, seconds) taken by a read callable returning row counts"""
+    started = time.perf_counter()
+    rows = read()
+    return rows, time.perf_counter() - started
+
+def migrate(processed_data_dir: str = "./data/processed") -> Dict[str, Any]:
+    """Migrate every CSV processed copy under processed_data_dir"""
+    processor = DataProcessor(processed_data_dir)
+    with get_db() as conn:
+        filenames = dict(conn.execute("SELECT file_id, filename FROM files").fetchall())
+    
+    file_ids = set()
+    for name in os.listdir(processed_data_dir):
+        path = os.path.join(processed_data_dir, name)
+        if name.endswith(".csv"):
+            file_ids.add(name[:-4])
+        elif os.path.isdir(path) and not name.startswith("month="):
+            file_ids.add(name)
+    
+    totals = {"files": 0, "rows": 0, "csv_seconds": 0.0, "parquet_seconds": 0.0}
+    for file_id in sorted(file_ids):
+        parts = processor._legacy_parts(file_id)
+        if not parts:
+            continue
+        period = parse_period(filenames.get(file_id, ""))
+        
+        processor.store.reset(file_id)
+        rows, csv_seconds = _timed_rows(lambda: sum(
+            len(chunk) for _, path in parts for _, chunk in iter_chunks(path, ".csv")
+        ))
+        for sheet, path in parts:
+            for _, chunk in iter_chunks(path, ".csv"):
+                processor.store.write_chunk(file_id, period, sheet, chunk)
+        _, parquet_seconds = _timed_rows(lambda: sum(
+            len(chunk) for _, chunk in processor.store.iter_file(file_id)
+        ))
+        processor._remove_legacy_copy(file_id)
+        
+        print(f"Migrated {file_id}: {rows} rows, CSV read {csv_seconds:.3f}s, "
+              f"Parquet read {parquet_seconds:.3f}s")
+        totals["files"] += 1
+        totals["rows"] += rows
+        totals["csv_seconds"] += csv_seconds
+        totals["parquet_seconds"] += parquet_seconds
+    
+    for fmt in ("csv", "parquet"):
+        seconds = totals[f"{fmt}_seconds"]
+        totals[f"{fmt}_rows_per_second"] = totals["rows"] / seconds if seconds > 0 else 0.0
+    return totals
+
+def main():
+    """Run the migration and print the read-throughput comparison"""
+    init_db()
+    processed_data_dir = sys.argv[1] if len(sys.argv) > 1 else "./data/processed"
+    totals = migrate(processed_data_dir)
+    print(f"Migrated {totals['files']} uploads ({totals['rows']} rows)")
+    print(f"Read throughput: CSV {totals['csv_rows_per_second']:.0f} rows/s, "
+          f"Parquet {totals['parquet_rows_per_second']:.0f} rows/s")
+
+if __name__ == "__main__":
+    main()
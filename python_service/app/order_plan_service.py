@@ -0,0 +1,190 @@
+import asyncio
+import os
+import numpy as np
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import date, datetime, timedelta
+from app.database import get_db
+from app.executor import run_cpu, run_io
+from app.forecast_service import ForecastService
+from app.order_optimizer import METHODS, make_problem, solve
+from app.replenishment import unit_factor
+from app.replenishment_service import ReplenishmentService
+
+# Most recent purchases per vendor and ingredient averaged into its price
+ORDER_PRICE_HISTORY = int(os.getenv("ORDER_PRICE_HISTORY", "5"))
+# Storage limit as a multiple of par level (stock above 1.5x par already counts as overstocked)
+ORDER_STORAGE_PAR_MULTIPLE = float(os.getenv("ORDER_STORAGE_PAR_MULTIPLE", "1.5"))
+ORDER_HORIZON_MAX = 90
+
+PRICES = """
+    SELECT vendor, ingredient_id, unit, unit_cost FROM (
+        SELECT vendor, ingredient_id, unit,
+               COALESCE(unit_cost, total_cost / NULLIF(quantity, 0)) AS unit_cost,
+               ROW_NUMBER() OVER (
+                   PARTITION BY vendor, ingredient_id ORDER BY purchase_date DESC, purchase_id DESC
+               ) AS recency
+        FROM purchases
+        WHERE vendor IS NOT NULL AND ingredient_id IS NOT NULL
+    )
+    WHERE recency <= ? AND unit_cost IS NOT NULL
+"""
+
+class OrderPlanService:
+    def __init__(self, forecast_service: ForecastService, replenishment_service: ReplenishmentService):
+        self.forecast_service = forecast_service
+        self.replenishment_service = replenishment_service
+        self.last_plan: Optional[Dict[str, Any]] = None
+        # Solves can take ORDER_SOLVER_TIME_LIMIT seconds; requests arriving meanwhile wait
+        self._lock = asyncio.Lock()
+    
+    async def plan(self, horizon: int = 30, method: str = "heuristic") -> Dict[str, Any]:
+        """Minimum-cost purchase schedule per vendor over the horizon
+        
+        Demand is the forecast; prices are each vendor's recent purchase
+        prices; shipment sizes and order frequency come from the shipment
+        schedule, lead times from shipment history. Stock is kept between
+        safety stock and the lower of the storage limit and what can be used
+        within shelf life. method is heuristic (fast) or milp (exact within
+        the solver time limit); lp gives the relaxation's cost bound.
+        """
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {', '.join(METHODS)}")
+        if not 1 <= horizon <= ORDER_HORIZON_MAX:
+            raise ValueError(f"horizon must be between 1 and {ORDER_HORIZON_MAX}")
+        async with self._lock:
+            started = datetime.now()
+            outlook = await self.forecast_service.demand_outlook(horizon)
+            ids: List[str] = outlook["ingredient_ids"]
+            inputs = await run_io(self.replenishment_service.planning_inputs, ids)
+            prices = await run_io(self._prices, ids, inputs["units"])
+            problem = self._problem(ids, outlook["forecasts"], inputs, prices)
+            # The solvers are CPU-bound; the heuristic is quick enough for the I/O pool
+            run = run_io if method == "heuristic" else run_cpu
+            solution = await run(solve, problem, method)
+            self.last_plan = self._schedule(ids, inputs, problem, solution, method, started)
+            return self.last_plan
+    
+    async def get_plan(self) -> Dict[str, Any]:
+        """Latest purchase plan, computing a heuristic one if none has run yet"""
+        if self.last_plan is None:
+            return await self.plan()
+        return self.last_plan
+    
+    def _prices(self, ids: List[str], units: List[Optional[str]]) -> Dict[str, List[Tuple[str, float]]]:
+        """(vendor, price per stock unit) offers per ingredient (blocking; runs in the I/O pool)
+        
+        Prices in units that do not convert to the stock unit are taken as
+        per stock unit, as the stock ledger takes purchased quantities.
+        """
+        stock_unit = dict(zip(ids, units))
+        samples: Dict[Tuple[str, str], List[float]] = {}
+        with get_db() as conn:
+            for vendor, ingredient_id, unit, unit_cost in conn.execute(PRICES, (ORDER_PRICE_HISTORY,)):
+                if ingredient_id not in stock_unit:
+                    continue
+                factor = unit_factor(unit, stock_unit[ingredient_id])
+                samples.setdefault((ingredient_id, vendor), []).append(unit_cost / factor if factor else unit_cost)
+        
+        offers: Dict[str, List[Tuple[str, float]]] = {}
+        for (ingredient_id, vendor), values in sorted(samples.items()):
+            offers.setdefault(ingredient_id, []).append((vendor, float(np.mean(values))))
+        return offers
+    
+    def _problem(self, ids: List[str], forecasts: np.ndarray, inputs: Dict[str, Any],
+                 offers: Dict[str, List[Tuple[str, float]]]) -> Dict[str, Any]:
+        """Optimizer inputs; ingredients never purchased get one unpriced offer with no vendor"""
+        vendors: List[Optional[str]] = sorted({vendor for entries in offers.values() for vendor, _ in entries})
+        index = {vendor: column for column, vendor in enumerate(vendors)}
+        if any(i not in offers for i in ids):
+            vendors.append(None)
+        width = max([len(offers.get(i, ())) for i in ids] + [1])
+        candidate_vendor = np.full((len(ids), width), -1, dtype=np.int64)
+        candidate_cost = np.zeros((len(ids), width))
+        candidate_lead = np.zeros((len(ids), width))
+        for row, ingredient_id in enumerate(ids):
+            default_lead = inputs["lead_time_mean"][row]
+            entries = offers.get(ingredient_id)
+            if not entries:
+                candidate_vendor[row, 0], candidate_lead[row, 0] = len(vendors) - 1, default_lead
+                continue
+            for column, (vendor, price) in enumerate(entries):
+                candidate_vendor[row, column] = index[vendor]
+                candidate_cost[row, column] = price
+                candidate_lead[row, column] = inputs["lead_times"].get((vendor, ingredient_id), default_lead)
+        
+        par_level = inputs["par_level"]
+        capacity = np.where(par_level > 0, ORDER_STORAGE_PAR_MULTIPLE * par_level, np.inf)
+        return make_problem(forecasts, inputs["position"], inputs["safety_stock"], capacity, inputs["shelf_life"],
+                            inputs["pack_size"], inputs["review_days"], vendors,
+                            candidate_vendor, candidate_cost, candidate_lead)
+    
+    def _schedule(self, ids: List[str], inputs: Dict[str, Any], problem: Dict[str, Any],
+                  solution: Dict[str, Any], method: str, started: datetime) -> Dict[str, Any]:
+        """Orders grouped by vendor and order date, with plan costs and per-ingredient outcome"""
+        today = date.today()
+        orders = solution["orders"]
+        evaluation = solution["evaluation"]
+        vendors = problem["vendors"]
+        by_vendor: Dict[int, Dict[str, Any]] = {}
+        ordered = np.zeros(len(ids))
+        used: Dict[int, set] = {}
+        
+        for row, column, day in zip(*np.nonzero(orders > 0)):
+            vendor = int(problem["candidate_vendor"][row, column])
+            quantity = float(orders[row, column, day])
+            unit_cost = float(problem["candidate_cost"][row, column])
+            pack = float(problem["pack"][row])
+            entry = by_vendor.setdefault(vendor, {"vendor": vendors[vendor], "purchase_cost": 0.0, "orders": {}})
+            order = entry["orders"].setdefault(int(day), {
+                "order_date": (today + timedelta(days=int(day))).isoformat(),
+                "cost": 0.0,
+                "lines": []
+            })
+            arrival = int(day + problem["candidate_lead"][row, column])
+            order["lines"].append({
+                "ingredient_id": ids[row],
+                "ingredient_name": inputs["names"][row],
+                "unit": inputs["units"][row],
+                "quantity": quantity,
+                "shipments": round(quantity / pack) if pack > 0 else None,
+                "unit_cost": unit_cost,
+                "cost": quantity * unit_cost,
+                "delivery_date": (today + timedelta(days=arrival)).isoformat()
+            })
+            order["cost"] += quantity * unit_cost
+            entry["purchase_cost"] += quantity * unit_cost
+            ordered[row] += quantity
+            used.setdefault(row, set()).add(vendors[vendor])
+        
+        schedule = sorted(by_vendor.values(), key=lambda entry: -entry["purchase_cost"])
+        for entry in schedule:
+            entry["orders"] = [entry["orders"][day] for day in sorted(entry["orders"])]
+        
+        return {
+            "method": method,
+            "horizon": problem["demand"].shape[1],
+            "start_date": today.isoformat(),
+            "computed_at": started.isoformat(),
+            "duration_seconds": (datetime.now() - started).total_seconds(),
+            "solve_seconds": solution["seconds"],
+            "status": solution["status"],
+            "cost_bound": solution["bound"],
+            **{key: evaluation[key] for key in ("total_cost", "purchase_cost", "holding_cost", "delivery_cost",
+                                                "shortage_cost", "deliveries")},
+            "vendors": schedule,
+            "ingredients": [
+                {
+                    "ingredient_id": ingredient_id,
+                    "ingredient_name": inputs["names"][row],
+                    "unit": inputs["units"][row],
+                    "stock_position": float(problem["position"][row]),
+                    "forecast_demand": float(problem["demand"][row].sum()),
+                    "ordered_quantity": float(ordered[row]),
+                    "shortage": float(evaluation["shortage"][row]),
+                    "excess": float(evaluation["excess"][row]),
+                    "vendors": sorted(vendor for vendor in used.get(row, ()) if vendor is not None),
+                    "unpriced": vendors[problem["candidate_vendor"][row, 0]] is None
+                }
+                for row, ingredient_id in enumerate(ids)
+            ]
+        }
@@ -0,0 +1,142 @@
+"""
+Requests/sec of the inventory levels query with and without connection pooling.
+    
+    python -m app.pool_benchmark [ingredients] [seconds]
+
+Seeds two scratch databases with `ingredients` (default 500) ingredients,
+their ledger rows and in-transit shipments. Reader threads run the
+inventory levels query (the one behind the /inventory/levels snapshot) for `seconds` (default 3) per setting while one
+writer thread keeps committing ledger updates, as an upload would:
+
+- before: a new connection per request, rollback journal, default pragmas
+- after: the thread-affine read/write pools, WAL and the tuned pragmas
+
+Reports requests/sec for 1, 4 and 8 reader threads.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+THREADS = (1, 4, 8)
+# Pause between the writer's commits
+WRITE_INTERVAL = 0.005
+
+def seed(ingredients: int):
+    """Ingredients, ledger rows and shipments in DATABASE_URL"""
+    from app.database import get_db, init_db
+    
+    init_db()
+    with get_db(write=True) as conn:
+        conn.executemany(
+            "INSERT INTO ingredients (ingredient_id, ingredient_name, unit, reorder_point, safety_stock, par_level) "
+            "VALUES (?, ?, 'g', 200, 100, 1000)",
+            [(f"ing{k}", f"Ingredient {k}") for k in range(ingredients)]
+        )
+        conn.executemany("INSERT INTO stock_ledger (ingredient_id, on_hand) VALUES (?, ?)",
+                         [(f"ing{k}", float(k % 1500)) for k in range(ingredients)])
+        conn.executemany(
+            "INSERT INTO shipments (vendor, ingredient_id, quantity, shipped_date, status) "
+            "VALUES ('Sysco', ?, 50, '2025-01-01', 'in_transit')",
+            [(f"ing{k}",) for k in range(0, ingredients, 3)]
+        )
+        conn.commit()
+
+def unpooled(path: str):
+    """Open, query and close per request, as get_db() did before pooling"""
+    def levels(query: str):
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute(query).fetchall()
+        finally:
+            conn.close()
+    
+    def write(ingredient_id: str):
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute("UPDATE stock_ledger SET on_hand = on_hand + 1 WHERE ingredient_id = ?", (ingredient_id,))
+            conn.commit()
+        finally:
+            conn.close()
+    return levels, write
+
+def pooled():
+    """Checkouts from the read and write pools"""
+    from app.database import get_db
+    
+    def levels(query: str):
+        with get_db() as conn:
+            return conn.execute(query).fetchall()
+    
+    def write(ingredient_id: str):
+        with get_db(write=True) as conn:
+            conn.execute("UPDATE stock_ledger SET on_hand = on_hand + 1 WHERE ingredient_id = ?", (ingredient_id,))
+            conn.commit()
+    return levels, write
+
+def requests_per_second(levels, write, threads: int, seconds: float) -> float:
+    """Levels queries per second across reader threads while a writer commits"""
+    from app.inventory_snapshot import SNAPSHOT_ROWS
+    
+    query = SNAPSHOT_ROWS.format(where="")
+    stop = threading.Event()
+    
+    def writer():
+        k = 0
+        while not stop.is_set():
+            write(f"ing{k % 100}")
+            k += 1
+            time.sleep(WRITE_INTERVAL)
+    
+    def reader(deadline: float) -> int:
+        count = 0
+        while time.perf_counter() < deadline:
+            levels(query)
+            count += 1
+        return count
+    
+    writing = threading.Thread(target=writer)
+    writing.start()
+    try:
+        deadline = time.perf_counter() + seconds
+        with ThreadPoolExecutor(threads) as pool:
+            total = sum(pool.map(reader, [deadline] * threads))
+    finally:
+        stop.set()
+        writing.join()
+    return total / seconds
+
+def main():
+    ingredients = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    scratch = tempfile.mkdtemp(prefix="msy-pool-")
+    after_path = os.path.join(scratch, "after.db")
+    # app.database reads DATABASE_URL on import
+    os.environ["DATABASE_URL"] = "sqlite:///" + after_path
+    seed(ingredients)
+    
+    # The backup API also copies rows still in the WAL file
+    before_path = os.path.join(scratch, "before.db")
+    source, target = sqlite3.connect(after_path), sqlite3.connect(before_path)
+    source.backup(target)
+    target.execute("PRAGMA journal_mode=DELETE")
+    source.close()
+    target.close()
+    
+    print(f"/inventory/levels query over {ingredients} ingredients, one writer committing every "
+          f"{WRITE_INTERVAL * 1000:.0f} ms")
+    print(f"{'threads':>8}{'before req/s':>15}{'after req/s':>14}{'speedup':>10}")
+    for threads in THREADS:
+        before = requests_per_second(*unpooled(before_path), threads, seconds)
+        after = requests_per_second(*pooled(), threads, seconds)
+        print(f"{threads:>8}{before:>15.0f}{after:>14.0f}{after / before:>9.1f}x")
+    shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Columnar store for the processed copy of each upload.
+
+Chunks are written as typed Parquet files partitioned by month and file:
+    
+    <root>/month=YYYY-MM/file_id=<id>/<sheet>-<part>.parquet
+
+Reads go through Arrow with memory mapping and can be limited to a set
+of columns and a range of months.
+"""
+import glob
+import os
+import shutil
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+def month_of(period: Optional[str]) -> str:
+    """Partition month (YYYY-MM) for a period date, defaulting to the current month"""
+    if period:
+        return period[:7]
+    return datetime.now().strftime("%Y-%m")
+
+def to_arrow_frame(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Give a raw chunk unique string headers and a single type per column"""
+    columns, seen = [], {}
+    for column in map(str, chunk.columns):
+        count = seen.get(column, 0)
+        seen[column] = count + 1
+        columns.append(column if count == 0 else f"{column}.{count}")
+    
+    typed = chunk.set_axis(columns, axis=1).infer_objects()
+    # Mixed object columns (e.g. numbers and "7,969" strings) are kept as text
+    mixed = [c for c in typed.columns if typed[c].dtype == object]
+    if mixed:
+        typed = typed.astype({c: "string" for c in mixed})
+    return typed
+
+class ProcessedStore:
+    """Parquet files holding the processed copy of every upload"""
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    def file_dirs(self, file_id: str) -> List[str]:
+        """Partition directories holding parts of file_id"""
+        return sorted(glob.glob(os.path.join(self.root, "month=*", f"file_id={file_id}")))
+    
+    def reset(self, file_id: str):
+        """Remove every stored part of file_id"""
+        for file_dir in self.file_dirs(file_id):
+            shutil.rmtree(file_dir, ignore_errors=True)
+    
+    def write_chunk(self, file_id: str, period: Optional[str], sheet: str, chunk: pd.DataFrame) -> str:
+        """Write a chunk as the next part of its sheet and return the part path"""
+        file_dir = os.path.join(self.root, f"month={month_of(period)}", f"file_id={file_id}")
+        os.makedirs(file_dir, exist_ok=True)
+        
+        path = self._next_part(file_dir, sheet)
+        table = pa.Table.from_pandas(to_arrow_frame(chunk), preserve_index=False)
+        pq.write_table(table, path)
+        return path
+    
+    def _next_part(self, file_dir: str, sheet: str) -> str:
+        """Path of the next part of sheet in a partition directory"""
+        part = len(glob.glob(os.path.join(file_dir, f"{glob.escape(sheet)}-*.parquet")))
+        return os.path.join(file_dir, f"{sheet}-{part:05d}.parquet")
+    
+    def staging(self) -> "ProcessedStore":
+        """Empty store for parts that must not be visible until promoted
+        
+        It lives under the root so promoting is a rename on one filesystem.
+        """
+        staging_root = os.path.join(self.root, "_staging")
+        os.makedirs(staging_root, exist_ok=True)
+        return ProcessedStore(tempfile.mkdtemp(dir=staging_root))
+    
+    def promote(self, staged: "ProcessedStore", file_id: str, replace: bool = True):
+        """Move the parts of file_id written to a staging store into place
+        
+        With replace=True the current parts of file_id are removed first;
+        otherwise the staged parts are added after them.
+        """
+        if replace:
+            self.reset(file_id)
+        for source_dir in staged.file_dirs(file_id):
+            month_dir = os.path.basename(os.path.dirname(source_dir))
+            target_dir = os.path.join(self.root, month_dir, f"file_id={file_id}")
+            os.makedirs(target_dir, exist_ok=True)
+            for name in sorted(os.listdir(source_dir)):
+                os.replace(os.path.join(source_dir, name), self._next_part(target_dir, name.rsplit("-", 1)[0]))
+        staged.discard()
+    
+    def discard(self):
+        """Delete this store and everything in it"""
+        shutil.rmtree(self.root, ignore_errors=True)
+    
+    def parts(self, file_id: str) -> List[Tuple[str, str]]:
+        """(sheet, path) of every part of file_id in write order"""
+        parts = []
+        for file_dir in self.file_dirs(file_id):
+            for name in sorted(os.listdir(file_dir)):
+                if name.endswith(".parquet"):
+                    parts.append((name.rsplit("-", 1)[0], os.path.join(file_dir, name)))
+        return parts
+    
+    def schema(self, path: str) -> List[str]:
+        """Column names of a part, read from the footer only"""
+        return pq.read_schema(path, memory_map=True).names
+    
+    def read(self, path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read a part, optionally only some of its columns"""
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+    
+    def iter_file(self, file_id: str, columns: Optional[List[str]] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """Stream the parts of file_id back as (sheet, chunk) pairs"""
+        for sheet, path in self.parts(file_id):
+            yield sheet, self.read(path, columns)
+    
+    def file_months(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, str]:
+        """{file_id: month} for files partitioned within [since, until] (YYYY-MM)"""
+        files = {}
+        for month_dir in sorted(glob.glob(os.path.join(self.root, "month=*"))):
+            month = os.path.basename(month_dir).split("=", 1)[1]
+            if (since and month < since) or (until and month > until):
+                continue
+            for file_dir in glob.glob(os.path.join(month_dir, "file_id=*")):
+                files[os.path.basename(file_dir).split("=", 1)[1]] = month
+        return files
@@ -0,0 +1,93 @@
+"""
+Reorder point, safety stock and order quantity for every ingredient at once.
+
+Ingredients are reviewed every R days (the gap between scheduled
+deliveries) and a replenishment takes a random lead time L. Stock has to
+cover demand over the protection interval L + R, so with daily demand
+mean d, forecast error sigma_d and lead time mean/std mu_L, sigma_L:
+
+    safety stock  = z * sqrt((mu_L + R) * sigma_d^2 + d^2 * sigma_L^2)
+    reorder point = d * mu_L + safety stock
+    order-up-to   = d * (mu_L + R) + safety stock
+    order qty     = order-up-to - (on hand + incoming), rounded up to whole shipments
+
+where z is the normal quantile of the target cycle service level and d is
+the forecast's average over the protection interval.
+"""
+import os
+import numpy as np
+from statistics import NormalDist
+from typing import Dict, Optional
+
+# Probability of not running out between deliveries
+REPLENISH_SERVICE_LEVEL = float(os.getenv("REPLENISH_SERVICE_LEVEL", "0.95"))
+# Lead time assumed where no shipment history exists
+DEFAULT_LEAD_TIME_DAYS = float(os.getenv("DEFAULT_LEAD_TIME_DAYS", "3"))
+# Review period where the shipment schedule does not list an ingredient
+DEFAULT_REVIEW_DAYS = float(os.getenv("DEFAULT_REVIEW_DAYS", "7"))
+# Shipments a (vendor, ingredient) pair needs before its own distribution is used
+LEAD_TIME_MIN_SAMPLES = int(os.getenv("LEAD_TIME_MIN_SAMPLES", "3"))
+
+# Grams per mass unit; other units convert only to themselves or between count-like units
+MASS_UNITS = {"g": 1.0, "gram": 1.0, "grams": 1.0, "kg": 1000.0, "lb": 453.592, "lbs": 453.592, "oz": 28.3495}
+COUNT_UNITS = {"count", "pcs", "pc", "piece", "pieces", "each", "ea", "egg", "eggs", "roll", "rolls", "unit", "units"}
+
+def unit_factor(from_unit: Optional[str], to_unit: Optional[str]) -> Optional[float]:
+    """Multiplier from one unit to another, or None if they are not comparable"""
+    source = (from_unit or "").strip().lower()
+    target = (to_unit or "").strip().lower()
+    if not source or not target:
+        return None
+    if source == target:
+        return 1.0
+    if source in MASS_UNITS and target in MASS_UNITS:
+        return MASS_UNITS[source] / MASS_UNITS[target]
+    if _counted(source) and _counted(target):
+        return 1.0
+    return None
+
+def _counted(unit: str) -> bool:
+    """Units that count items ("eggs", "pcs", "whole onion")"""
+    return unit in COUNT_UNITS or unit.startswith("whole ")
+
+def protection_demand(forecasts: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """Average daily forecast over each row's first `days` days (fractional days interpolate)"""
+    n, horizon = forecasts.shape
+    if horizon == 0:
+        return np.zeros(n)
+    days = np.clip(days, 1.0, horizon)
+    cumulative = np.cumsum(forecasts, axis=1)
+    whole = np.floor(days).astype(np.int64)
+    rows = np.arange(n)
+    total = cumulative[rows, whole - 1]
+    partial = np.where(whole < horizon, forecasts[rows, np.minimum(whole, horizon - 1)] * (days - whole), 0.0)
+    return (total + partial) / days
+
+def replenishment_levels(forecasts: np.ndarray, demand_std: np.ndarray, lead_mean: np.ndarray,
+                         lead_std: np.ndarray, review_days: np.ndarray, position: np.ndarray,
+                         pack_size: np.ndarray, service_level: float = REPLENISH_SERVICE_LEVEL) -> Dict[str, np.ndarray]:
+    """Replenishment levels for N ingredients
+    
+    forecasts is the (N, horizon) daily demand forecast; the other inputs
+    are length-N arrays. pack_size is the shipment size in stock units
+    (0 or NaN where unknown, which leaves the order quantity unrounded).
+    """
+    z = NormalDist().inv_cdf(service_level)
+    protection = lead_mean + review_days
+    demand = protection_demand(forecasts, protection)
+    safety_stock = z * np.sqrt(protection * demand_std ** 2 + demand ** 2 * lead_std ** 2)
+    reorder_point = demand * lead_mean + safety_stock
+    order_up_to = demand * protection + safety_stock
+    shortfall = np.maximum(order_up_to - position, 0.0)
+    
+    packs = np.nan_to_num(pack_size, nan=0.0)
+    rounded = np.ceil(shortfall / np.where(packs > 0, packs, 1.0)) * packs
+    order_quantity = np.where(packs > 0, rounded, shortfall)
+    return {
+        "daily_demand": demand,
+        "protection_days": protection,
+        "safety_stock": safety_stock,
+        "reorder_point": reorder_point,
+        "order_up_to": order_up_to,
+        "order_quantity": order_quantity
+    }
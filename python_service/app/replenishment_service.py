@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import math
+import os
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import datetime
+from app.database import get_db
+from app.executor import run_io
+from app.forecast_service import ForecastService
+from app.inventory_service import InventoryService
+from app.inventory_snapshot import SNAPSHOT_ROWS
+from app.lead_times import Moments, lead_time_moments, pooled
+from app.replenishment import (
+    DEFAULT_LEAD_TIME_DAYS, DEFAULT_REVIEW_DAYS, LEAD_TIME_MIN_SAMPLES, REPLENISH_SERVICE_LEVEL,
+    replenishment_levels, unit_factor
+)
+from app.stockout_risk import SIMULATION_PATHS, simulate_stockouts
+
+# Days of forecast demand the protection interval is drawn from
+REPLENISH_HORIZON = int(os.getenv("REPLENISH_HORIZON", "30"))
+SIMULATION_PATHS_MAX = 100000
+# Stockout simulations kept for unchanged inputs
+SIMULATION_CACHE_SIZE = 8
+
+def lead_time_summary(moments: Moments) -> Tuple[float, float]:
+    """Mean and sample standard deviation"""
+    samples, mean, m2 = moments
+    return mean, math.sqrt(m2 / (samples - 1)) if samples > 1 else 0.0
+
+def schedule_terms(conn, ids: List[str], stock: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Review period in days and shipment size in stock units (NaN if unknown) per ingredient
+    
+    Both come from the shipment schedule; stock maps ingredient ids to
+    SNAPSHOT_ROWS records (sqlite3.Row) for their units.
+    """
+    schedule = {
+        row[0]: row[1:] for row in conn.execute("""
+            SELECT ingredient_id, quantity_per_shipment, unit, shipments_per_period, period_days
+            FROM shipment_schedule
+        """)
+    }
+    review_days = np.full(len(ids), DEFAULT_REVIEW_DAYS)
+    pack_size = np.full(len(ids), np.nan)
+    for row, ingredient_id in enumerate(ids):
+        entry = schedule.get(ingredient_id)
+        if entry is None:
+            continue
+        quantity, unit, per_period, period_days = entry
+        if per_period and period_days:
+            review_days[row] = period_days / per_period
+        record = stock.get(ingredient_id)
+        factor = unit_factor(unit, record["unit"] if record is not None else None)
+        if quantity and factor is not None:
+            pack_size[row] = quantity * factor
+    return review_days, pack_size
+
+class ReplenishmentService:
+    def __init__(self, forecast_service: ForecastService, inventory_service: InventoryService):
+        self.forecast_service = forecast_service
+        self.inventory_service = inventory_service
+        self.service_level = REPLENISH_SERVICE_LEVEL
+        self.horizon = REPLENISH_HORIZON
+        self.last_plan: Optional[Dict[str, Any]] = None
+        # One run at a time; triggers arriving during a run wait for it
+        self._lock = asyncio.Lock()
+        # Simulation results by digest of their inputs; runs are seeded, so reuse is exact
+        self._simulations: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    
+    async def run(self) -> Dict[str, Any]:
+        """Recompute reorder point, safety stock and order quantity for every ingredient with usage history
+        
+        The results are written to the ingredients table and the inventory
+        snapshot is refreshed so stock status reflects them.
+        """
+        async with self._lock:
+            outlook = await self.forecast_service.demand_outlook(self.horizon)
+            plan = await run_io(self._apply, outlook)
+            await self.inventory_service.refresh([row["ingredient_id"] for row in plan["ingredients"]])
+            self.last_plan = plan
+            return plan
+    
+    async def get_plan(self) -> Dict[str, Any]:
+        """Latest replenishment plan, computing one if none has run yet"""
+        if self.last_plan is None:
+            return await self.run()
+        return self.last_plan
+    
+    async def stockout_risk(self, paths: Optional[int] = None, horizon: Optional[int] = None) -> Dict[str, Any]:
+        """Monte Carlo probability of running out before the next delivery, and days of cover
+        
+        Demand paths follow the forecast and its error spread, delivery
+        times the ingredient's lead-time distribution; stock is what is on
+        hand now. Ingredients are sorted by stockout probability.
+        """
+        paths = SIMULATION_PATHS if paths is None else paths
+        horizon = self.horizon if horizon is None else horizon
+        if not 1 <= paths <= SIMULATION_PATHS_MAX:
+            raise ValueError(f"paths must be between 1 and {SIMULATION_PATHS_MAX}")
+        if not 1 <= horizon <= 365:
+            raise ValueError("horizon must be between 1 and 365")
+        
+        outlook = await self.forecast_service.demand_outlook(horizon)
+        ids: List[str] = outlook["ingredient_ids"]
+        names, units, on_hand, lead_mean, lead_std = await run_io(self._simulation_inputs, ids)
+        arrays = (outlook["forecasts"], outlook["demand_std"], on_hand, lead_mean, lead_std)
+        digest = hashlib.sha1(repr((paths, horizon, ids)).encode())
+        for values in arrays:
+            digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        key = digest.hexdigest()
+        if key in self._simulations:
+            self._simulations.move_to_end(key)
+            return self._simulations[key]
+        
+        started = datetime.now()
+        result = await simulate_stockouts(*arrays, paths) if ids else {}
+        rows = [
+            {
+                "ingredient_id": ingredient_id,
+                "ingredient_name": names[row],
+                "unit": units[row],
+                "current_stock": float(on_hand[row]),
+                "stockout_probability": float(result["stockout_probability"][row]),
+                "expected_days_of_cover": float(result["days_of_cover"][row]),
+                "days_of_cover_p10": float(result["days_of_cover_p10"][row]),
+                "lead_time_mean": float(lead_mean[row])
+            }
+            for row, ingredient_id in enumerate(ids)
+        ]
+        rows.sort(key=lambda row: (-row["stockout_probability"], row["expected_days_of_cover"]))
+        risk = {
+            "paths": paths,
+            "horizon": horizon,
+            "computed_at": started.isoformat(),
+            "duration_seconds": (datetime.now() - started).total_seconds(),
+            "ingredients": rows
+        }
+        self._simulations[key] = risk
+        while len(self._simulations) > SIMULATION_CACHE_SIZE:
+            self._simulations.popitem(last=False)
+        return risk
+    
+    def _simulation_inputs(self, ids: List[str]):
+        """Names, units, on-hand stock and lead-time moments per ingredient (blocking; runs in the I/O pool)"""
+        with get_db() as conn:
+            moments = lead_time_moments(conn)
+            stock = {record["ingredient_id"]: record for record in conn.execute(SNAPSHOT_ROWS.format(where=""))}
+        names = [stock[i]["ingredient_name"] if i in stock else i for i in ids]
+        units = [stock[i]["unit"] if i in stock else None for i in ids]
+        on_hand = np.array([(stock[i]["current_stock"] or 0) if i in stock else 0.0 for i in ids], dtype=np.float64)
+        lead_mean, lead_std, _ = self._lead_times(ids, moments)
+        return names, units, on_hand, lead_mean, lead_std
+    
+    def planning_inputs(self, ids: List[str]) -> Dict[str, Any]:
+        """Stock, limits, shipment terms and lead times per ingredient for purchase planning
+        
+        Blocking; runs in the I/O pool. Safety stock is the level from the
+        last run (0 before one), lead_time_mean the pooled per-ingredient
+        mean that vendors without enough shipments of their own fall back to.
+        """
+        with get_db() as conn:
+            moments = lead_time_moments(conn)
+            stock = {record["ingredient_id"]: record for record in conn.execute(SNAPSHOT_ROWS.format(where=""))}
+            shelf_life = dict(conn.execute("SELECT ingredient_id, shelf_life_days FROM ingredients"))
+            review_days, pack_size = schedule_terms(conn, ids, stock)
+        lead_mean, _, _ = self._lead_times(ids, moments)
+        
+        def column(name: str) -> np.ndarray:
+            return np.array([(stock[i][name] or 0) if i in stock else 0.0 for i in ids], dtype=np.float64)
+        
+        return {
+            "names": [stock[i]["ingredient_name"] if i in stock else i for i in ids],
+            "units": [stock[i]["unit"] if i in stock else None for i in ids],
+            "position": column("current_stock") + column("incoming_qty"),
+            "safety_stock": column("safety_stock"),
+            "par_level": column("par_level"),
+            "shelf_life": np.array([shelf_life.get(i) or np.nan for i in ids], dtype=np.float64),
+            "review_days": review_days,
+            "pack_size": pack_size,
+            "lead_time_mean": lead_mean,
+            "lead_times": {key: lead_time_summary(stats)[0] for key, stats in moments.items()
+                           if stats[0] >= LEAD_TIME_MIN_SAMPLES}
+        }
+    
+    def _apply(self, outlook: Dict[str, Any]) -> Dict[str, Any]:
+        """Compute levels from the outlook and write them back (blocking; runs in the I/O pool)"""
+        ids: List[str] = outlook["ingredient_ids"]
+        with get_db(write=True) as conn:
+            moments = lead_time_moments(conn)
+            stock = {record["ingredient_id"]: record for record in conn.execute(SNAPSHOT_ROWS.format(where=""))}
+            lead_mean, lead_std, lead_source = self._lead_times(ids, moments)
+            review_days, pack_size = schedule_terms(conn, ids, stock)
+            position = np.array([
+                (stock[i]["current_stock"] or 0) + (stock[i]["incoming_qty"] or 0) if i in stock else 0.0
+                for i in ids
+            ], dtype=np.float64)
+            
+            levels = replenishment_levels(outlook["forecasts"], outlook["demand_std"], lead_mean, lead_std,
+                                          review_days, position, pack_size, self.service_level)
+            conn.executemany(
+                "UPDATE ingredients SET reorder_point = ?, safety_stock = ?, order_quantity = ? WHERE ingredient_id = ?",
+                zip(levels["reorder_point"].tolist(), levels["safety_stock"].tolist(),
+                    levels["order_quantity"].tolist(), ids)
+            )
+            conn.commit()
+        
+        return {
+            "service_level": self.service_level,
+            "horizon": self.horizon,
+            "computed_at": datetime.now().isoformat(),
+            "ingredients": [
+                {
+                    "ingredient_id": ingredient_id,
+                    "daily_demand": float(levels["daily_demand"][row]),
+                    "demand_std": float(outlook["demand_std"][row]),
+                    "lead_time_mean": float(lead_mean[row]),
+                    "lead_time_std": float(lead_std[row]),
+                    "lead_time_source": lead_source[row],
+                    "review_days": float(review_days[row]),
+                    "pack_size": None if np.isnan(pack_size[row]) else float(pack_size[row]),
+                    "stock_position": float(position[row]),
+                    "safety_stock": float(levels["safety_stock"][row]),
+                    "reorder_point": float(levels["reorder_point"][row]),
+                    "order_up_to": float(levels["order_up_to"][row]),
+                    "order_quantity": float(levels["order_quantity"][row])
+                }
+                for row, ingredient_id in enumerate(ids)
+            ],
+            "lead_times": [
+                {
+                    "vendor": vendor,
+                    "ingredient_id": ingredient_id,
+                    "samples": stats[0],
+                    "mean": lead_time_summary(stats)[0],
+                    "std": lead_time_summary(stats)[1]
+                }
+                for (vendor, ingredient_id), stats in sorted(moments.items())
+            ]
+        }
+    
+    def _lead_times(self, ids: List[str], moments: Dict[Tuple[str, str], Moments]):
+        """Lead time mean and std per ingredient, pooled over its vendors
+        
+        Ingredients with fewer than LEAD_TIME_MIN_SAMPLES shipments fall back
+        to the pool of every shipment, then to DEFAULT_LEAD_TIME_DAYS.
+        """
+        by_ingredient: Dict[str, List[Moments]] = {}
+        for (_, ingredient_id), stats in moments.items():
+            by_ingredient.setdefault(ingredient_id, []).append(stats)
+        overall = pooled(moments.values())
+        
+        lead_mean, lead_std, source = np.empty(len(ids)), np.empty(len(ids)), []
+        for row, ingredient_id in enumerate(ids):
+            own = pooled(by_ingredient.get(ingredient_id, ()))
+            if own[0] >= LEAD_TIME_MIN_SAMPLES:
+                (lead_mean[row], lead_std[row]), kind = lead_time_summary(own), "ingredient"
+            elif overall[0] >= LEAD_TIME_MIN_SAMPLES:
+                (lead_mean[row], lead_std[row]), kind = lead_time_summary(overall), "all_shipments"
+            else:
+                lead_mean[row], lead_std[row], kind = DEFAULT_LEAD_TIME_DAYS, 0.0, "default"
+            source.append(kind)
+        return lead_mean, lead_std, source
@@ -6,6 +6,7 @@ import os
 import random
 from datetime import datetime, timedelta
 from app.database import DB_PATH, init_db
+from app.stock_ledger import sync_stock_ledger
 
 def seed_ingredients():
     """Seed ingredients table"""
@@ -248,6 +249,12 @@ def main():
     seed_sales()
     seed_recipe()
     
+    conn = sqlite3.connect(DB_PATH)
+    sync_stock_ledger(conn)
+    conn.commit()
+    conn.close()
+    print("Stock ledger updated")
+    
     print("Data seeding completed!")
 
 if __name__ == "__main__":
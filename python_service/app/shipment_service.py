@@ -1,65 +1,241 @@
-import pandas as pd
-from typing import Dict, List, Any
+import asyncio
+import base64
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
+from app.change_feed import ChangeFeed
 from app.database import get_db
+from app.executor import run_io
+
+# Statistics cached per filter combination
+SHIPMENT_STATS_CACHE_SIZE = int(os.getenv("SHIPMENT_STATS_CACHE_SIZE", "256"))
+SHIPMENT_PAGE_MAX = 1000
+
+# Shipments whose status can still change; matches the partial index idx_shipments_open
+OPEN_SHIPMENTS = "arrived_date IS NULL OR status != 'delivered'"
+
+# Shipments are matched across re-uploads by tracking id (row id if missing)
+SHIPMENT_STATES = """
+    SELECT COALESCE(tracking_id, 'id:' || shipment_id), shipment_id, vendor, ingredient_id,
+           quantity, status, arrived_date, tracking_id
+    FROM shipments
+"""
+
+SHIPMENT_COLUMNS = ("shipment_id", "vendor", "ingredient_id", "quantity", "shipped_date",
+                    "arrived_date", "status", "lead_time_days", "tracking_id")
+
+def encode_cursor(shipped_date: Optional[str], shipment_id: int) -> str:
+    """Opaque cursor for the page after a row (a missing shipped_date stays null)"""
+    return base64.urlsafe_b64encode(json.dumps([shipped_date, shipment_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[Optional[str], int]:
+    try:
+        shipped_date, shipment_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (None if shipped_date is None else str(shipped_date)), int(shipment_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def after_cursor(after: Tuple[Optional[str], int]) -> Tuple[str, Tuple[Any, ...]]:
+    """WHERE term for rows after a cursor in (shipped_date DESC, shipment_id DESC) order
+    
+    SQLite sorts NULL below every date, so shipments without a shipped
+    date come last; a row-value comparison never matches them.
+    """
+    shipped_date, shipment_id = after
+    if shipped_date is None:
+        return "shipped_date IS NULL AND shipment_id < ?", (shipment_id,)
+    return "((shipped_date, shipment_id) < (?, ?) OR shipped_date IS NULL)", (shipped_date, shipment_id)
+
+def shipment_filters(vendor: Optional[str] = None, ingredient_id: Optional[str] = None,
+                     status: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None) -> Tuple[Tuple[str, ...], Tuple[Any, ...]]:
+    """WHERE terms and parameters for the shipment filters
+    
+    since/until bound shipped_date and are ISO dates or datetimes; a date
+    in until includes that whole day.
+    """
+    terms, params = [], []
+    for column, value in (("vendor", vendor), ("ingredient_id", ingredient_id), ("status", status)):
+        if value is not None:
+            terms.append(f"{column} = ?")
+            params.append(value)
+    for name, value in (("since", since), ("until", until)):
+        if value is None:
+            continue
+        try:
+            bound = datetime.fromisoformat(value)
+        except ValueError as e:
+            raise ValueError(f"Invalid {name} date: {value}") from e
+        # Compared as text, so dates stay dates whatever the time format stored
+        if name == "since":
+            terms.append("shipped_date >= ?")
+            params.append(value)
+        elif len(value) == 10:
+            terms.append("shipped_date < ?")
+            params.append((bound + timedelta(days=1)).date().isoformat())
+        else:
+            terms.append("shipped_date <= ?")
+            params.append(value)
+    return tuple(terms), tuple(params)
 
 class ShipmentService:
-    def __init__(self):
-        pass
+    def __init__(self, feed: Optional[ChangeFeed] = None):
+        self.feed = feed
+        # Open (not yet delivered) shipments by key, and the highest row already seen
+        self._open: Dict[str, tuple] = {}
+        self._last_id = 0
+        # Overlapping ingests diff one after the other
+        self._diff_lock = asyncio.Lock()
+        self._stats: "OrderedDict[tuple, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+        self._stats_lock = threading.Lock()
+    
+    def load_states(self, conn):
+        """Remember open shipments so later ingests can be diffed (blocking)"""
+        self._open = {row[0]: tuple(row) for row in conn.execute(f"{SHIPMENT_STATES} WHERE {OPEN_SHIPMENTS}")}
+        self._last_id = conn.execute("SELECT COALESCE(MAX(shipment_id), 0) FROM shipments").fetchone()[0]
+    
+    async def apply_ingest(self, summary: Dict[str, Any]) -> int:
+        """Publish shipment status changes after an upload or /process; returns how many changed"""
+        if "shipments" not in (summary.get("rows_loaded") or {}):
+            return 0
+        with self._stats_lock:
+            self._stats.clear()
+        async with self._diff_lock:
+            changes = await run_io(self._diff_states)
+            if changes and self.feed is not None:
+                self.feed.publish("shipment", {"changes": changes})
+            return len(changes)
+    
+    def _diff_states(self) -> List[Dict[str, Any]]:
+        """Shipments that opened, changed status or arrival, or were removed since the last diff
+        
+        Uploads only insert and delete rows, so only open shipments and rows
+        above the last seen id are read; delivered history is never rescanned.
+        """
+        with get_db() as conn:
+            open_now = {row[0]: tuple(row) for row in conn.execute(f"{SHIPMENT_STATES} WHERE {OPEN_SHIPMENTS}")}
+            added = {row[0]: tuple(row) for row in conn.execute(
+                f"{SHIPMENT_STATES} WHERE shipment_id > ?", (self._last_id,)
+            )}
+            current = {**added, **open_now}
+            # Previously open shipments not seen above were closed in place or deleted
+            missing = [old[1] for key, old in self._open.items() if key not in current]
+            for start in range(0, len(missing), 500):
+                batch = missing[start:start + 500]
+                for row in conn.execute(
+                    f"{SHIPMENT_STATES} WHERE shipment_id IN ({','.join('?' * len(batch))})", batch
+                ):
+                    current[row[0]] = tuple(row)
+            last_id = conn.execute("SELECT COALESCE(MAX(shipment_id), 0) FROM shipments").fetchone()[0]
+        previous, self._open, self._last_id = self._open, open_now, last_id
+        
+        changes = []
+        for key, row in current.items():
+            old = previous.get(key)
+            if old is None and key not in open_now:
+                # History re-imported (or loaded already delivered); nothing in flight changed
+                continue
+            if old is not None and old[5:7] == row[5:7]:
+                continue
+            changes.append({
+                "shipment_id": row[1],
+                "vendor": row[2],
+                "ingredient_id": row[3],
+                "quantity": row[4],
+                "status": row[5],
+                "arrived_date": row[6],
+                "tracking_id": row[7],
+                "previous_status": old[5] if old is not None else None
+            })
+        for key in previous.keys() - current.keys():
+            old = previous[key]
+            changes.append({"shipment_id": old[1], "ingredient_id": old[3], "tracking_id": old[7],
+                            "status": None, "previous_status": old[5], "removed": True})
+        return changes
+    
+    async def get_shipments(self, vendor: Optional[str] = None, ingredient_id: Optional[str] = None,
+                            status: Optional[str] = None, since: Optional[str] = None,
+                            until: Optional[str] = None, cursor: Optional[str] = None,
+                            limit: int = 100) -> Dict[str, Any]:
+        """Get a page of shipments (newest first) and delay statistics for the filtered range"""
+        filters = shipment_filters(vendor, ingredient_id, status, since, until)
+        after = decode_cursor(cursor) if cursor else None
+        limit = max(1, min(limit, SHIPMENT_PAGE_MAX))
+        return await run_io(self._query_shipments, filters, after, limit)
     
-    async def get_shipments(self) -> Dict[str, Any]:
-        """Get shipment and delay information"""
+    def _query_shipments(self, filters: Tuple[tuple, tuple], after: Optional[Tuple[Optional[str], int]],
+                         limit: int) -> Dict[str, Any]:
+        """Query one keyset page and the statistics (blocking; runs in the I/O pool)"""
         try:
+            terms, params = filters
+            page_terms, page_params = list(terms), list(params)
+            if after is not None:
+                term, term_params = after_cursor(after)
+                page_terms.append(term)
+                page_params += term_params
+            where = f"WHERE {' AND '.join(page_terms)}" if page_terms else ""
             with get_db() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT 
-                        shipment_id,
-                        vendor,
-                        ingredient_id,
-                        quantity,
-                        shipped_date,
-                        arrived_date,
-                        status,
-                        lead_time_days,
-                        tracking_id
+                rows = conn.execute(f"""
+                    SELECT {', '.join(SHIPMENT_COLUMNS)}
                     FROM shipments
-                    ORDER BY shipped_date DESC
-                    LIMIT 100
-                """)
-                
-                shipments = []
-                for row in cursor.fetchall():
-                    shipments.append({
-                        "shipment_id": row[0],
-                        "vendor": row[1],
-                        "ingredient_id": row[2],
-                        "quantity": row[3],
-                        "shipped_date": row[4],
-                        "arrived_date": row[5],
-                        "status": row[6],
-                        "lead_time_days": row[7],
-                        "tracking_id": row[8]
-                    })
-                
-                # Calculate delay statistics
-                delayed_shipments = [s for s in shipments if s["status"] == "delayed"]
-                on_time_shipments = [s for s in shipments if s["status"] == "delivered" and s.get("lead_time_days", 0) <= 7]
-                
-                return {
-                    "shipments": shipments,
-                    "statistics": {
-                        "total_shipments": len(shipments),
-                        "delayed_count": len(delayed_shipments),
-                        "on_time_count": len(on_time_shipments),
-                        "average_lead_time": sum(s.get("lead_time_days", 0) for s in shipments) / len(shipments) if shipments else 0
-                    },
-                    "timestamp": datetime.now().isoformat()
-                }
+                    {where}
+                    ORDER BY shipped_date DESC, shipment_id DESC
+                    LIMIT ?
+                """, page_params + [limit + 1]).fetchall()
+                statistics = self._statistics(conn, filters)
+            
+            shipments = [dict(zip(SHIPMENT_COLUMNS, row)) for row in rows[:limit]]
+            next_cursor = None
+            if len(rows) > limit:
+                last = shipments[-1]
+                next_cursor = encode_cursor(last["shipped_date"], last["shipment_id"])
+            return {
+                "shipments": shipments,
+                "statistics": statistics,
+                "next_cursor": next_cursor,
+                "timestamp": datetime.now().isoformat()
+            }
         except Exception as e:
             # Return synthetic data if database is empty
             return self._get_synthetic_shipments()
     
+    def _statistics(self, conn, filters: Tuple[tuple, tuple]) -> Dict[str, Any]:
+        """Delay statistics over every shipment matching the filters, cached until shipments change"""
+        terms, params = filters
+        # New rows written outside the API move the highest id and invalidate too
+        mark = conn.execute("SELECT COALESCE(MAX(shipment_id), 0) FROM shipments").fetchone()[0]
+        with self._stats_lock:
+            cached = self._stats.get(filters)
+            if cached is not None and cached[0] == mark:
+                self._stats.move_to_end(filters)
+                return cached[1]
+        
+        where = f"WHERE {' AND '.join(terms)}" if terms else ""
+        total, delayed, on_time, average = conn.execute(f"""
+            SELECT
+                COUNT(*),
+                COALESCE(SUM(status = 'delayed'), 0),
+                COALESCE(SUM(status = 'delivered' AND lead_time_days <= 7), 0),
+                AVG(lead_time_days)
+            FROM shipments
+            {where}
+        """, params).fetchone()
+        statistics = {
+            "total_shipments": total,
+            "delayed_count": delayed,
+            "on_time_count": on_time,
+            "average_lead_time": average or 0
+        }
+        with self._stats_lock:
+            self._stats[filters] = (mark, statistics)
+            self._stats.move_to_end(filters)
+            while len(self._stats) > SHIPMENT_STATS_CACHE_SIZE:
+                self._stats.popitem(last=False)
+        return statistics
+    
     def _get_synthetic_shipments(self) -> Dict[str, Any]:
         """Generate synthetic shipment data for demonstration"""
         shipments = [
@@ -0,0 +1,63 @@
+"""
+Cold-start benchmark for the API process.
+
+    python -m app.startup_benchmark [path ...]
+
+Starts a fresh interpreter per run, imports app.main, runs the startup
+events and requests each path (default /health, /inventory/levels,
+/shipments). Reports import time, time to the first response and
+whether torch or pandas were loaded along the way.
+"""
+import json
+import os
+import subprocess
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; timings start before app.main is imported
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {service_dir!r})
+import app.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+result = {{"import_s": imported - started, "heavy_after_import": sorted(m for m in ("torch", "pandas") if m in sys.modules)}}
+with TestClient(app.main.app) as client:
+    responses = {{}}
+    for path in {paths!r}:
+        status = client.get(path).status_code
+        responses[path] = {{"status": status, "elapsed_s": time.perf_counter() - started}}
+    result["first_response_s"] = responses[{paths!r}[0]]["elapsed_s"]
+    result["responses"] = responses
+    result["heavy_after_requests"] = sorted(m for m in ("torch", "pandas") if m in sys.modules)
+print(json.dumps(result))
+"""
+
+def measure(paths, runs: int = 3):
+    """Cold-start timings of app.main over several fresh interpreters"""
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD.format(service_dir=SERVICE_DIR, paths=list(paths))],
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+def main():
+    paths = sys.argv[1:] or ["/health", "/inventory/levels", "/shipments"]
+    results = measure(paths)
+    for run, result in enumerate(results, start=1):
+        print(f"Run {run}: import {result['import_s']:.3f}s, "
+              f"first response {result['first_response_s']:.3f}s, "
+              f"loaded after import: {result['heavy_after_import'] or 'none'}, "
+              f"after requests: {result['heavy_after_requests'] or 'none'}")
+        for path, response in result["responses"].items():
+            print(f"  {path}: {response['status']} at {response['elapsed_s']:.3f}s")
+    best = min(results, key=lambda r: r["first_response_s"])
+    print(f"Best: import {best['import_s']:.3f}s, first response {best['first_response_s']:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Incremental per-ingredient stock balance.
+
+Purchases add to an ingredient's balance; usage rows are menu-item sales and
+are exploded through the recipe table into ingredient quantities. Each source
+table has a watermark (highest row id applied) so ingestion only has to fold
+in the rows it just inserted.
+
+Stock that expired unused is written off from lot_waste, which the lot
+replay (app/lots.py) fills, so on_hand matches the open lots' remaining
+quantity unless usage ran ahead of purchases.
+"""
+import sqlite3
+from datetime import datetime
+
+PURCHASE_DELTAS = """
+    SELECT ingredient_id, SUM(quantity) AS qty, MAX(purchase_id) AS last_id
+    FROM purchases
+    WHERE purchase_id > ?
+    GROUP BY ingredient_id
+"""
+
+USAGE_DELTAS = """
+    SELECT r.ingredient_id, SUM(u.quantity_sold * r.qty_per_serving) AS qty
+    FROM usage u
+    JOIN recipe r ON r.menu_item_id = u.menu_item_id
+    WHERE u.usage_id > ? AND u.usage_id <= ?
+    GROUP BY r.ingredient_id
+"""
+
+WASTE_TOTALS = """
+    SELECT ingredient_id, SUM(quantity) AS qty
+    FROM lot_waste
+    GROUP BY ingredient_id
+"""
+
+def _watermark(conn: sqlite3.Connection, source: str) -> int:
+    """Highest row id of source already applied to the ledger"""
+    row = conn.execute(
+        "SELECT last_id FROM stock_ledger_watermarks WHERE source = ?", (source,)
+    ).fetchone()
+    return row[0] if row else 0
+
+def _set_watermark(conn: sqlite3.Connection, source: str, last_id: int):
+    """Advance the watermark for source"""
+    conn.execute("""
+        INSERT INTO stock_ledger_watermarks (source, last_id) VALUES (?, ?)
+        ON CONFLICT(source) DO UPDATE SET last_id = excluded.last_id
+    """, (source, last_id))
+
+def _apply_deltas(conn: sqlite3.Connection, column: str, deltas, sign: float):
+    """Add (ingredient_id, qty) deltas to one ledger column and to on_hand"""
+    now = datetime.now().isoformat()
+    conn.executemany(f"""
+        INSERT INTO stock_ledger (ingredient_id, {column}, on_hand, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(ingredient_id) DO UPDATE SET
+            {column} = {column} + excluded.{column},
+            on_hand = on_hand + excluded.on_hand,
+            updated_at = excluded.updated_at
+    """, [(ingredient_id, qty, sign * qty, now) for ingredient_id, qty in deltas])
+
+def sync_stock_ledger(conn: sqlite3.Connection) -> dict:
+    """Fold purchases and usage rows added since the last sync into the ledger
+    
+    Returns the per-ingredient change in on-hand stock. The caller commits.
+    """
+    changes = {}
+    
+    purchase_mark = _watermark(conn, "purchases")
+    rows = conn.execute(PURCHASE_DELTAS, (purchase_mark,)).fetchall()
+    if rows:
+        _apply_deltas(conn, "purchased_qty", [(r[0], r[1]) for r in rows], 1.0)
+        _set_watermark(conn, "purchases", max(r[2] for r in rows))
+        for r in rows:
+            changes[r[0]] = changes.get(r[0], 0.0) + r[1]
+    
+    usage_mark = _watermark(conn, "usage")
+    last_usage_id = conn.execute("SELECT COALESCE(MAX(usage_id), 0) FROM usage").fetchone()[0]
+    if last_usage_id > usage_mark:
+        rows = conn.execute(USAGE_DELTAS, (usage_mark, last_usage_id)).fetchall()
+        _apply_deltas(conn, "used_qty", [(r[0], r[1]) for r in rows], -1.0)
+        _set_watermark(conn, "usage", last_usage_id)
+        for r in rows:
+            changes[r[0]] = changes.get(r[0], 0.0) - r[1]
+    
+    return changes
+
+def sync_waste(conn: sqlite3.Connection) -> dict:
+    """Write off the expired stock recorded in lot_waste
+    
+    Sets each ingredient's wasted_qty to its lot_waste total and moves
+    on_hand by the difference. Returns the per-ingredient change in on-hand
+    stock. The caller commits.
+    """
+    totals = dict(conn.execute(WASTE_TOTALS).fetchall())
+    written_off = dict(conn.execute("SELECT ingredient_id, wasted_qty FROM stock_ledger").fetchall())
+    deltas = [
+        (ingredient_id, totals.get(ingredient_id, 0.0) - written_off.get(ingredient_id, 0.0))
+        for ingredient_id in totals.keys() | written_off.keys()
+    ]
+    deltas = [(ingredient_id, qty) for ingredient_id, qty in deltas if qty]
+    _apply_deltas(conn, "wasted_qty", deltas, -1.0)
+    return {ingredient_id: -qty for ingredient_id, qty in deltas}
+
+def rebuild_stock_ledger(conn: sqlite3.Connection) -> dict:
+    """Recompute the ledger from full history (e.g. after recipe changes or deletes)
+    
+    Returns the per-ingredient change in on-hand stock versus the old ledger.
+    """
+    before = dict(conn.execute("SELECT ingredient_id, on_hand FROM stock_ledger").fetchall())
+    conn.execute("DELETE FROM stock_ledger")
+    conn.execute("DELETE FROM stock_ledger_watermarks")
+    sync_stock_ledger(conn)
+    sync_waste(conn)
+    after = dict(conn.execute("SELECT ingredient_id, on_hand FROM stock_ledger").fetchall())
+    
+    changes = {}
+    for ingredient_id in before.keys() | after.keys():
+        delta = after.get(ingredient_id, 0.0) - before.get(ingredient_id, 0.0)
+        if delta:
+            changes[ingredient_id] = delta
+    return changes
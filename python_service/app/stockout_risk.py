@@ -0,0 +1,158 @@
+"""
+Monte Carlo stockout risk over the forecast horizon.
+
+Each path draws a lead time for the next delivery (gamma with the
+ingredient's lead-time mean and standard deviation) and daily demand
+around the forecast (normal with the forecast's error spread, floored
+at zero). Because cumulative demand never decreases, the days a path's
+on-hand stock covers is just the number of days its cumulative demand
+stays within stock, and the path stocks out if that is shorter than the
+days until the delivery arrives. Blocks of ingredients x paths are
+stepped through the horizon one day at a time as float32 arrays; large
+catalogs are split across the CPU process pool.
+
+    python -m app.stockout_risk [ingredients] [paths]
+
+times a run over a synthetic catalog.
+"""
+import asyncio
+import os
+import sys
+import time
+import numpy as np
+from typing import Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.executor import CPU_WORKERS, run_cpu, run_io
+
+SIMULATION_PATHS = int(os.getenv("SIMULATION_PATHS", "10000"))
+# Catalogs at least this large are split across the CPU process pool
+SIMULATION_POOL_MIN = int(os.getenv("SIMULATION_POOL_MIN", "200"))
+# Ingredient x path cells simulated together; keeps the per-day arrays cache-sized
+SIMULATION_BLOCK = 1 << 18
+
+def lead_time_draws(rng: np.random.Generator, mean: np.ndarray, std: np.ndarray, paths: int) -> np.ndarray:
+    """(N, paths) gamma lead times with the given moments (constant where std is 0)"""
+    mean = np.maximum(mean, 1e-6)
+    variable = std > 0
+    shape = np.where(variable, (mean / np.where(variable, std, 1.0)) ** 2, 1.0)
+    draws = rng.standard_gamma(shape[:, None], size=(len(mean), paths)).astype(np.float32)
+    return np.where(variable[:, None], draws * (mean / shape)[:, None], mean[:, None]).astype(np.float32)
+
+def covered_percentile(covered: np.ndarray, q: float, horizon: int) -> np.ndarray:
+    """Per-row q-th percentile (lower) of integer days of cover in 0..horizon, from counts"""
+    n, paths = covered.shape
+    counts = np.bincount((covered + np.arange(n)[:, None] * (horizon + 1)).ravel(), minlength=n * (horizon + 1))
+    cdf = np.cumsum(counts.reshape(n, horizon + 1), axis=1)
+    return np.argmax(cdf >= q / 100 * paths, axis=1)
+
+def simulate_block(forecasts: np.ndarray, demand_std: np.ndarray, on_hand: np.ndarray,
+                   lead_mean: np.ndarray, lead_std: np.ndarray, paths: int,
+                   seed) -> Dict[str, np.ndarray]:
+    """Stockout probability and days of cover for N ingredients
+    
+    forecasts is (N, horizon); the rest are length N. Days of cover is
+    capped at the horizon, and lead times beyond it are cut to it.
+    
+    All ingredients share one (paths, horizon) block of standard normal
+    demand shocks (common random numbers): each ingredient's estimate is
+    still an independent-path Monte Carlo estimate, and drawing the shocks
+    once instead of per ingredient removes most of the cost.
+    """
+    rng = np.random.default_rng(seed)
+    n, horizon = forecasts.shape
+    forecasts = forecasts.astype(np.float32)
+    demand_std = demand_std.astype(np.float32)
+    on_hand = on_hand.astype(np.float32)
+    shocks = rng.standard_normal((horizon, paths), dtype=np.float32)
+    probability = np.empty(n)
+    cover_mean = np.empty(n)
+    cover_p10 = np.empty(n)
+    
+    step = max(1, SIMULATION_BLOCK // max(paths, 1))
+    for start in range(0, n, step):
+        rows = slice(start, min(start + step, n))
+        shape = (rows.stop - rows.start, paths)
+        cumulative = np.zeros(shape, dtype=np.float32)
+        covered = np.zeros(shape, dtype=np.int32)
+        day = np.empty(shape, dtype=np.float32)
+        within = np.empty(shape, dtype=bool)
+        std, stock = demand_std[rows, None], on_hand[rows, None]
+        # One vectorized step per day over every (ingredient, path) of the block
+        for t in range(horizon):
+            np.multiply(shocks[t], std, out=day)
+            day += forecasts[rows, t, None]
+            np.maximum(day, 0, out=day)
+            cumulative += day
+            np.less_equal(cumulative, stock, out=within)
+            covered += within
+        
+        # The delivery arrives during day ceil(L); demand before then must be met from stock
+        arrival = np.minimum(np.ceil(lead_time_draws(rng, lead_mean[rows], lead_std[rows], paths)), horizon)
+        probability[rows] = (covered < arrival).mean(axis=1)
+        cover_mean[rows] = covered.mean(axis=1)
+        cover_p10[rows] = covered_percentile(covered, 10, horizon)
+    return {"stockout_probability": probability, "days_of_cover": cover_mean, "days_of_cover_p10": cover_p10}
+
+async def simulate_stockouts(forecasts: np.ndarray, demand_std: np.ndarray, on_hand: np.ndarray,
+                             lead_mean: np.ndarray, lead_std: np.ndarray, paths: int = SIMULATION_PATHS,
+                             seed: int = 0) -> Dict[str, np.ndarray]:
+    """simulate_block over the whole catalog, across the process pool when it is large
+    
+    Each part gets its own seed from one SeedSequence, so a run is
+    reproducible for a given seed and split.
+    """
+    n = len(forecasts)
+    parts = CPU_WORKERS if n >= SIMULATION_POOL_MIN and CPU_WORKERS > 1 else 1
+    bounds = np.linspace(0, n, parts + 1).astype(int)
+    seeds = np.random.SeedSequence(seed).spawn(parts)
+    run = run_cpu if parts > 1 else run_io
+    results = await asyncio.gather(*[
+        run(simulate_block, forecasts[lo:hi], demand_std[lo:hi], on_hand[lo:hi],
+            lead_mean[lo:hi], lead_std[lo:hi], paths, part_seed)
+        for lo, hi, part_seed in zip(bounds[:-1], bounds[1:], seeds)
+    ])
+    return {key: np.concatenate([result[key] for result in results]) for key in results[0]}
+
+async def benchmark(ingredients: int = 1000, paths: int = SIMULATION_PATHS, horizon: int = 30) -> Dict[str, float]:
+    """Time one simulation over a synthetic catalog"""
+    rng = np.random.default_rng(1)
+    level = rng.gamma(2.0, 50.0, ingredients)
+    forecasts = level[:, None] * (1 + 0.2 * np.sin(np.arange(horizon) * 2 * np.pi / 7))[None, :]
+    demand_std = level * rng.uniform(0.1, 0.6, ingredients)
+    on_hand = level * rng.uniform(0, 12, ingredients)
+    lead_mean = rng.uniform(2, 7, ingredients)
+    lead_std = lead_mean * rng.uniform(0, 0.4, ingredients)
+    
+    # Warm the pool so process start-up is not counted
+    await simulate_stockouts(forecasts[:SIMULATION_POOL_MIN], demand_std[:SIMULATION_POOL_MIN],
+                             on_hand[:SIMULATION_POOL_MIN], lead_mean[:SIMULATION_POOL_MIN],
+                             lead_std[:SIMULATION_POOL_MIN], 16)
+    started = time.perf_counter()
+    result = await simulate_stockouts(forecasts, demand_std, on_hand, lead_mean, lead_std, paths)
+    return {
+        "ingredients": ingredients,
+        "paths": paths,
+        "horizon": horizon,
+        "seconds": time.perf_counter() - started,
+        "mean_stockout_probability": float(result["stockout_probability"].mean()),
+        "mean_days_of_cover": float(result["days_of_cover"].mean())
+    }
+
+def main():
+    from app.executor import shutdown_executors
+    
+    ingredients = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    paths = int(sys.argv[2]) if len(sys.argv) > 2 else SIMULATION_PATHS
+    try:
+        result = asyncio.run(benchmark(ingredients, paths))
+    finally:
+        shutdown_executors()
+    print(f"{result['ingredients']} ingredients x {result['paths']} paths x {result['horizon']} days "
+          f"in {result['seconds']:.2f}s ({CPU_WORKERS} CPU workers)")
+    print(f"Mean stockout probability {result['mean_stockout_probability']:.3f}, "
+          f"mean days of cover {result['mean_days_of_cover']:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Mini-batch CPU training for the LSTM forecaster.
+
+Windows are gathered batch by batch from strided views of the feature
+matrix, so memory stays proportional to the history rather than to the
+number of windows. The latest windows are held out for validation and
+drive early stopping; the best weights are checkpointed as they improve.
+"""
+import os
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Dataset
+from typing import Dict, Any, Optional, Tuple
+from app.features import FeatureSet, FEATURE_NAMES
+
+TRAIN_BATCH_SIZE = int(os.getenv("TRAIN_BATCH_SIZE", "256"))
+TRAIN_LEARNING_RATE = float(os.getenv("TRAIN_LEARNING_RATE", "0.001"))
+# Share of the most recent windows held out for validation (0 disables it)
+TRAIN_VAL_FRACTION = float(os.getenv("TRAIN_VAL_FRACTION", "0.2"))
+# Epochs without validation improvement before training stops
+TRAIN_PATIENCE = int(os.getenv("TRAIN_PATIENCE", "5"))
+# Intra-op and inter-op threads for torch (unset keeps torch's defaults)
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "0"))
+
+def configure_threads():
+    """Apply TORCH_NUM_THREADS / TORCH_INTEROP_THREADS to this process"""
+    if TORCH_NUM_THREADS > 0:
+        torch.set_num_threads(TORCH_NUM_THREADS)
+    if TORCH_INTEROP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+        except RuntimeError:
+            # Can only be set before the first inter-op parallel work in a process
+            pass
+
+class WindowDataset(Dataset):
+    """Training windows gathered on demand from a FeatureSet"""
+    
+    def __init__(self, feature_set: FeatureSet, seq_len: int, horizon: int,
+                 rows: np.ndarray, starts: np.ndarray):
+        self.inputs, self.targets = feature_set.window_views(seq_len, horizon)
+        self.rows = rows
+        self.starts = starts
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def __getitem__(self, index: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        X, y = self.__getitems__([index])
+        return X[0], y[0]
+    
+    def __getitems__(self, indices) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Gather a whole batch with one fancy-indexing call"""
+        rows, starts = self.rows[indices], self.starts[indices]
+        X = np.ascontiguousarray(np.moveaxis(self.inputs[rows, starts], -1, -2))
+        y = np.ascontiguousarray(self.targets[rows, starts])
+        return torch.from_numpy(X), torch.from_numpy(y)
+
+def _batch(batch):
+    """Collate function for batches already assembled by __getitems__"""
+    return batch
+
+def split_samples(rows: np.ndarray, starts: np.ndarray, horizon: int,
+                  val_fraction: float) -> Tuple[Tuple[np.ndarray, np.ndarray], Optional[Tuple[np.ndarray, np.ndarray]]]:
+    """Chronological train/validation split of (rows, starts)
+    
+    Validation takes the latest windows. Training windows whose targets
+    overlap the validation targets are dropped so no day is seen twice.
+    """
+    if val_fraction <= 0 or len(starts) == 0:
+        return (rows, starts), None
+    cutoff = np.quantile(starts, 1 - val_fraction, method="higher")
+    val = starts >= cutoff
+    train = starts + horizon <= cutoff
+    if not val.any() or not train.any():
+        return (rows, starts), None
+    return (rows[train], starts[train]), (rows[val], starts[val])
+
+def _loader(dataset: WindowDataset, shuffle: bool) -> DataLoader:
+    """Fixed-size batches; the last partial training batch is dropped when there is more than one"""
+    return DataLoader(
+        dataset,
+        batch_size=TRAIN_BATCH_SIZE,
+        shuffle=shuffle,
+        drop_last=shuffle and len(dataset) > TRAIN_BATCH_SIZE,
+        collate_fn=_batch
+    )
+
+def evaluate(model: nn.Module, loader: DataLoader, criterion) -> float:
+    """Mean loss over a loader"""
+    model.eval()
+    total, seen = 0.0, 0
+    with torch.inference_mode():
+        for X, y in loader:
+            total += criterion(model(X), y).item() * len(X)
+            seen += len(X)
+    return total / max(seen, 1)
+
+def fit(model: nn.Module, feature_set: FeatureSet, seq_len: int, horizon: int, max_epochs: int,
+        checkpoint_path: str, progress=None, cancel_event=None) -> Dict[str, Any]:
+    """Train model in place and checkpoint its best weights to checkpoint_path"""
+    if max_epochs < 1:
+        raise ValueError("max_epochs must be at least 1")
+    rows, starts = feature_set.window_samples(seq_len, horizon)
+    (train_rows, train_starts), val_samples = split_samples(rows, starts, horizon, TRAIN_VAL_FRACTION)
+    train_loader = _loader(WindowDataset(feature_set, seq_len, horizon, train_rows, train_starts), shuffle=True)
+    val_loader = None
+    if val_samples is not None:
+        val_loader = _loader(WindowDataset(feature_set, seq_len, horizon, *val_samples), shuffle=False)
+    
+    optimizer = torch.optim.Adam(model.parameters(), lr=TRAIN_LEARNING_RATE)
+    criterion = nn.MSELoss()
+    
+    best_loss, best_epoch, stale = float("inf"), 0, 0
+    samples_seen, train_seconds = 0, 0.0
+    for epoch in range(max_epochs):
+        if cancel_event is not None and cancel_event.is_set():
+            return {"status": "cancelled", "epochs_run": epoch}
+        
+        model.train()
+        started = time.perf_counter()
+        total, seen = 0.0, 0
+        for X, y in train_loader:
+            optimizer.zero_grad()
+            loss = criterion(model(X), y)
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(X)
+            seen += len(X)
+        elapsed = time.perf_counter() - started
+        samples_seen += seen
+        train_seconds += elapsed
+        
+        train_loss = total / max(seen, 1)
+        val_loss = evaluate(model, val_loader, criterion) if val_loader is not None else train_loss
+        if val_loss < best_loss:
+            best_loss, best_epoch, stale = val_loss, epoch + 1, 0
+            torch.save(model.checkpoint(seq_len=seq_len, horizon=horizon,
+                                        feature_names=FEATURE_NAMES), checkpoint_path)
+        else:
+            stale += 1
+        
+        samples_per_second = seen / elapsed if elapsed > 0 else 0.0
+        if progress is not None:
+            progress.update(epoch=epoch + 1, loss=train_loss, val_loss=val_loss,
+                            samples_per_second=samples_per_second)
+        print(f"Epoch {epoch}, Loss: {train_loss:.6f}, Val loss: {val_loss:.6f}, "
+              f"{samples_per_second:.0f} samples/s")
+        
+        if stale >= TRAIN_PATIENCE:
+            break
+    
+    return {
+        "status": "success",
+        "loss": best_loss,
+        "best_epoch": best_epoch,
+        "epochs_run": epoch + 1,
+        "train_samples": len(train_rows),
+        "val_samples": 0 if val_samples is None else len(val_samples[0]),
+        "samples_per_second": samples_seen / train_seconds if train_seconds > 0 else 0.0,
+        "threads": torch.get_num_threads()
+    }
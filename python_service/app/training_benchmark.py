@@ -0,0 +1,66 @@
+"""
+Training throughput (samples/sec) across batch sizes and torch thread counts.
+    
+    python -m app.training_benchmark [ingredients] [epochs]
+
+Builds a year of synthetic usage for `ingredients` (default 50)
+ingredients and trains an LSTMForecaster of the served shape with
+app.trainer.fit for `epochs` (default 2) epochs per configuration. Each
+configuration runs in a fresh interpreter with TRAIN_BATCH_SIZE and
+TORCH_NUM_THREADS set, because both are read on import and inter-op
+threads can only be set once per process. Use the results to size
+training nodes and pick the batch size.
+"""
+import json
+import os
+import subprocess
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH_SIZES = (64, 256, 1024)
+THREADS = (1, 2, 4)
+HISTORY_DAYS = 365
+
+# Runs in the child interpreter with the configuration in its environment
+CHILD = """
+import json, os, sys, tempfile
+sys.path.insert(0, {service_dir!r})
+import torch
+from app.bulk_forecast_benchmark import synthetic_features
+from app.forecast_service import ForecastService
+from app.trainer import configure_threads, fit
+from models.lstm_forecaster import LSTMForecaster
+configure_threads()
+torch.manual_seed(0)
+service = ForecastService()
+feature_set = synthetic_features({ingredients}, days={days})
+model = LSTMForecaster(service.input_size, hidden_size=service.hidden_size, num_layers=service.num_layers,
+                       out_len=service.train_horizon)
+with tempfile.TemporaryDirectory() as scratch:
+    result = fit(model, feature_set, service.seq_len, service.train_horizon, {epochs},
+                 os.path.join(scratch, "model.pt"))
+print(json.dumps(result))
+"""
+
+def run(batch_size: int, threads: int, ingredients: int, epochs: int) -> dict:
+    """fit() result for one configuration in a fresh interpreter"""
+    env = dict(os.environ, TRAIN_BATCH_SIZE=str(batch_size), TORCH_NUM_THREADS=str(threads),
+               TORCH_INTEROP_THREADS="1", TRAIN_PATIENCE=str(epochs))
+    code = CHILD.format(service_dir=SERVICE_DIR, ingredients=ingredients, days=HISTORY_DAYS, epochs=epochs)
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                               cwd=SERVICE_DIR, env=env, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    ingredients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    epochs = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    print(f"{ingredients} ingredients x {HISTORY_DAYS} days, {epochs} epochs, {os.cpu_count()} CPUs")
+    print(f"{'batch':>7}{'threads':>9}{'train samples':>15}{'samples/s':>11}{'val loss':>10}")
+    for batch_size in BATCH_SIZES:
+        for threads in THREADS:
+            result = run(batch_size, threads, ingredients, epochs)
+            print(f"{batch_size:>7}{result['threads']:>9}{result['train_samples']:>15}"
+                  f"{result['samples_per_second']:>11.0f}{result['loss']:>10.4f}")
+
+if __name__ == "__main__":
+    main()
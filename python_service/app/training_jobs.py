@@ -0,0 +1,144 @@
+import asyncio
+import multiprocessing
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional
+from app.executor import run_io
+
+class TrainingJob:
+    """A single background training run and its shared progress state"""
+    
+    def __init__(self, job_id: str, progress, cancel_event):
+        self.job_id = job_id
+        self.progress = progress  # Manager dict updated by the worker process
+        self.cancel_event = cancel_event  # Manager event polled every epoch
+        self.created_at = datetime.now().isoformat()
+        self.result: Optional[Dict[str, Any]] = None
+        self.task: Optional[asyncio.Task] = None
+    
+    @property
+    def status(self) -> str:
+        """queued, running, cancelling, or the final result status"""
+        if self.result is not None:
+            return self.result.get("status", "error")
+        if self.cancel_event.is_set():
+            return "cancelling"
+        return self.progress.get("status", "queued")
+    
+    @property
+    def active(self) -> bool:
+        """True until the worker has returned"""
+        return self.result is None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize job state, including an ETA extrapolated from epoch timings"""
+        progress = dict(self.progress) if self.active else self._final_progress
+        epoch = progress.get("epoch", 0)
+        epochs = progress.get("epochs")
+        
+        eta_seconds = None
+        if self.active and epoch and epochs:
+            elapsed = time.monotonic() - progress["started"]
+            eta_seconds = elapsed / epoch * (epochs - epoch)
+        
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "epoch": epoch,
+            "epochs": epochs,
+            "loss": progress.get("loss"),
+            "val_loss": progress.get("val_loss"),
+            "samples_per_second": progress.get("samples_per_second"),
+            "eta_seconds": eta_seconds,
+            "result": self.result
+        }
+    
+    def finish(self, result: Dict[str, Any]):
+        """Record the result and detach from the manager proxies"""
+        self._final_progress = dict(self.progress)
+        self.result = result
+
+class TrainingJobManager:
+    """Runs training jobs in the CPU pool, one at a time, with progress and cancellation"""
+    
+    def __init__(self, forecast_service, max_history: int = 20):
+        self.forecast_service = forecast_service
+        self.max_history = max_history
+        self.jobs: "OrderedDict[str, TrainingJob]" = OrderedDict()
+        self._manager = None
+        self._lock = asyncio.Lock()
+    
+    def _get_manager(self):
+        """Start the multiprocessing manager that hosts shared job state"""
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager
+    
+    async def submit(self) -> Dict[str, Any]:
+        """Start a training job, or return the one already in progress"""
+        async with self._lock:
+            for job in self.jobs.values():
+                if job.active:
+                    return {**job.to_dict(), "deduplicated": True}
+            
+            manager = await run_io(self._get_manager)
+            job = TrainingJob(
+                job_id=str(uuid.uuid4()),
+                progress=manager.dict(status="queued", started=time.monotonic()),
+                cancel_event=manager.Event()
+            )
+            self.jobs[job.job_id] = job
+            self._trim_history()
+            job.task = asyncio.create_task(self._run(job))
+            return {**job.to_dict(), "deduplicated": False}
+    
+    async def _run(self, job: TrainingJob):
+        """Run the job to completion and record its result"""
+        try:
+            job.progress.update(started=time.monotonic())
+            result = await self.forecast_service.train_model(job.progress, job.cancel_event)
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+        # Shutdown may already have finished the job
+        if job.active:
+            job.finish(result)
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return job state, or None for an unknown id"""
+        job = self.jobs.get(job_id)
+        return job.to_dict() if job else None
+    
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Ask a running job to stop after its current epoch"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job.active:
+            job.cancel_event.set()
+        return job.to_dict()
+    
+    def _trim_history(self):
+        """Drop the oldest finished jobs beyond max_history"""
+        finished = [job_id for job_id, job in self.jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_history)]:
+            del self.jobs[job_id]
+    
+    def shutdown(self):
+        """Cancel unfinished jobs and stop the manager process (called on application shutdown)
+        
+        Jobs are finished while their manager proxies still work; a later
+        startup in the same process gets a fresh manager.
+        """
+        for job in self.jobs.values():
+            if not job.active:
+                continue
+            job.cancel_event.set()
+            job.finish({"status": "cancelled", "message": "Server shut down"})
+            if job.task is not None:
+                job.task.cancel()
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
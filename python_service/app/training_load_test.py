@@ -0,0 +1,147 @@
+"""
+Request latency while a model trains.
+    
+    python -m app.training_load_test [ingredients] [epochs]
+
+Seeds a scratch database with a year of synthetic usage for
+`ingredients` (default 50) ingredients, starts the API with uvicorn in a
+child process and polls /health and /inventory/levels at a steady rate:
+first with the server idle, then while a /train job of `epochs`
+(default 5) epochs runs. Reports p50, p99 and max latency per path for
+both phases; with training in the CPU process pool the two should match.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ("/health", "/inventory/levels")
+# Requests per second per path
+RATE = 20
+IDLE_SECONDS = 5.0
+TRAIN_TIMEOUT = 600.0
+
+def seed(ingredients: int, days: int = 365, random_seed: int = 0):
+    """Ingredients, one menu item per ingredient and daily usage in DATABASE_URL"""
+    from datetime import date, timedelta
+    from app.database import get_db, init_db
+    from app.stock_ledger import sync_stock_ledger
+    
+    rng = np.random.default_rng(random_seed)
+    init_db()
+    start = date.today() - timedelta(days=days)
+    level = rng.gamma(2.0, 20.0, ingredients)
+    sold = rng.poisson(level[:, None] * (1 + 0.3 * np.sin(np.arange(days) * 2 * np.pi / 7)), (ingredients, days))
+    with get_db(write=True) as conn:
+        conn.executemany(
+            "INSERT INTO ingredients (ingredient_id, ingredient_name, unit, reorder_point, safety_stock, par_level) "
+            "VALUES (?, ?, 'g', ?, ?, ?)",
+            [(f"ing{k}", f"Ingredient {k}", 5 * level[k], 2 * level[k], 20 * level[k]) for k in range(ingredients)]
+        )
+        conn.executemany("INSERT INTO recipe (menu_item_id, ingredient_id, qty_per_serving) VALUES (?, ?, 1.0)",
+                         [(f"item{k}", f"ing{k}") for k in range(ingredients)])
+        conn.executemany(
+            "INSERT INTO purchases (ingredient_id, quantity, unit_cost, purchase_date) VALUES (?, ?, 1.0, ?)",
+            [(f"ing{k}", float(sold[k].sum() * 1.1), start.isoformat()) for k in range(ingredients)]
+        )
+        conn.executemany(
+            "INSERT INTO usage (date, menu_item_id, menu_item_name, quantity_sold) VALUES (?, ?, ?, ?)",
+            [((start + timedelta(days=day)).isoformat(), f"item{k}", f"Item {k}", int(sold[k, day]))
+             for k in range(ingredients) for day in range(days)]
+        )
+        sync_stock_ledger(conn)
+        conn.commit()
+
+async def poll(client, path: str, latencies: list, stop: asyncio.Event):
+    """Request path RATE times a second until stop is set"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(max(0.0, started + 1 / RATE - time.perf_counter()))
+
+async def measure(client, until) -> dict:
+    """Latencies per path while `until` (a coroutine) runs"""
+    latencies = {path: [] for path in PATHS}
+    stop = asyncio.Event()
+    pollers = [asyncio.create_task(poll(client, path, latencies[path], stop)) for path in PATHS]
+    try:
+        result = await until
+    finally:
+        stop.set()
+        await asyncio.gather(*pollers)
+    return {"result": result, "latency_ms": {path: np.array(values) * 1000 for path, values in latencies.items()}}
+
+async def train(client) -> dict:
+    """Start a training job and wait for it to finish"""
+    job = (await client.post("/train")).json()["job"]
+    deadline = time.perf_counter() + TRAIN_TIMEOUT
+    while job["status"] in ("queued", "running", "cancelling") and time.perf_counter() < deadline:
+        await asyncio.sleep(0.5)
+        job = (await client.get(f"/train/{job['job_id']}")).json()
+    return job
+
+async def run(port: int) -> dict:
+    import httpx
+    
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        deadline = time.perf_counter() + 60
+        while True:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                if time.perf_counter() > deadline:
+                    raise
+            await asyncio.sleep(0.2)
+        
+        idle = await measure(client, asyncio.sleep(IDLE_SECONDS))
+        started = time.perf_counter()
+        training = await measure(client, train(client))
+        training["seconds"] = time.perf_counter() - started
+    return {"idle": idle, "training": training}
+
+def main():
+    ingredients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    epochs = sys.argv[2] if len(sys.argv) > 2 else "5"
+    scratch = tempfile.mkdtemp(prefix="msy-load-")
+    env = dict(os.environ, DATABASE_URL="sqlite:///" + os.path.join(scratch, "load.db"),
+               MODEL_PATH=os.path.join(scratch, "models", "lstm_forecaster.pt"), TRAIN_MAX_EPOCHS=epochs)
+    # app.database reads DATABASE_URL on import
+    os.environ.update(env)
+    seed(ingredients)
+    
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=SERVICE_DIR, env=env
+    )
+    try:
+        result = asyncio.run(run(port))
+    finally:
+        server.terminate()
+        server.wait(30)
+    
+    job = result["training"]["result"]
+    print(f"{ingredients} ingredients, training job {job['status']} after {job['epoch']} epochs "
+          f"in {result['training']['seconds']:.1f}s")
+    print(f"{'path':<20}{'phase':<10}{'requests':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for path in PATHS:
+        for phase in ("idle", "training"):
+            values = result[phase]["latency_ms"][path]
+            print(f"{path:<20}{phase:<10}{len(values):>10}{np.percentile(values, 50):>10.1f}"
+                  f"{np.percentile(values, 99):>10.1f}{values.max():>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Optimized CPU inference for LSTMForecaster.
+
+INFERENCE_MODE selects how a loaded checkpoint is served:
+- fp32: the eager model (default)
+- int8: dynamic int8 quantization of the LSTM and Linear layers
+- torchscript: traced and frozen TorchScript
+- int8_torchscript: int8 quantization, then TorchScript
+- compile: torch.compile
+- onnx: ONNX export run by onnxruntime (requires onnx and onnxruntime)
+
+Every mode is checked against the fp32 model on load and falls back to
+fp32 if it is unavailable or drifts past INFERENCE_DRIFT_TOLERANCE.
+    
+    python -m models.inference [checkpoint.pt]
+
+benchmarks per-batch latency and model size for each mode.
+"""
+import inspect
+import io
+import os
+import sys
+import time
+import torch
+import torch.nn as nn
+from typing import Dict, Optional
+
+INFERENCE_MODES = ("fp32", "int8", "torchscript", "int8_torchscript", "compile", "onnx")
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "fp32")
+# Largest accepted mean absolute error relative to the fp32 outputs
+INFERENCE_DRIFT_TOLERANCE = float(os.getenv("INFERENCE_DRIFT_TOLERANCE", "0.01"))
+
+class InferenceModel:
+    """A served model: an optimized runner plus the fp32 model's configuration"""
+    
+    def __init__(self, model: nn.Module, runner, mode: str, drift: Optional[Dict[str, float]] = None):
+        self.model = model
+        self.runner = runner
+        self.mode = mode
+        self.drift = drift or {}
+        self.out_len = model.out_len
+        self.metadata = model.metadata
+    
+    def __call__(self, X: torch.Tensor) -> torch.Tensor:
+        return self.runner(X)
+
+def _quantize(model: nn.Module) -> nn.Module:
+    """Dynamic int8 quantization of the LSTM and Linear layers"""
+    return torch.ao.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+
+def _onnx_runner(model: nn.Module, example: torch.Tensor):
+    """Export to ONNX in memory and run it with onnxruntime"""
+    import onnxruntime
+    
+    buffer = io.BytesIO()
+    # Newer torch exports with dynamo by default, which does not take
+    # dynamic_axes; torch before 2.5 has no dynamo argument at all
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(
+        model, (example,), buffer,
+        input_names=["x"], output_names=["y"],
+        dynamic_axes={"x": {0: "batch"}, "y": {0: "batch"}},
+        **options
+    )
+    session = onnxruntime.InferenceSession(buffer.getvalue(), providers=["CPUExecutionProvider"])
+    
+    def run(X: torch.Tensor) -> torch.Tensor:
+        return torch.from_numpy(session.run(None, {"x": X.numpy()})[0])
+    
+    run.onnx_bytes = buffer.getvalue()
+    return run
+
+def build_runner(model: nn.Module, mode: str, example: torch.Tensor):
+    """Callable serving model for an inference mode"""
+    if mode == "fp32":
+        return model
+    if mode == "int8":
+        return _quantize(model)
+    if mode == "torchscript":
+        return torch.jit.optimize_for_inference(torch.jit.freeze(torch.jit.trace(model, example)))
+    if mode == "int8_torchscript":
+        return torch.jit.freeze(torch.jit.trace(_quantize(model), example))
+    if mode == "compile":
+        return torch.compile(model)
+    if mode == "onnx":
+        return _onnx_runner(model, example)
+    raise ValueError(f"Unknown inference mode: {mode} (expected one of {', '.join(INFERENCE_MODES)})")
+
+def measure_drift(reference: nn.Module, runner, inputs: torch.Tensor) -> Dict[str, float]:
+    """Absolute and relative error of runner against the fp32 reference"""
+    with torch.inference_mode():
+        expected = reference(inputs)
+        actual = runner(inputs)
+    diff = (actual - expected).abs()
+    return {
+        "max_abs": diff.max().item(),
+        "mean_abs": diff.mean().item(),
+        "relative": (diff.mean() / expected.abs().mean().clamp_min(1e-8)).item()
+    }
+
+def _drift_inputs(model: nn.Module, seq_len: int, batch: int = 64) -> torch.Tensor:
+    """Fixed pseudo-random inputs for drift checks"""
+    generator = torch.Generator().manual_seed(0)
+    return torch.randn(batch, seq_len, model.input_size, generator=generator)
+
+def optimize_for_inference(model: nn.Module, mode: str = INFERENCE_MODE, seq_len: int = 28,
+                           tolerance: float = INFERENCE_DRIFT_TOLERANCE) -> InferenceModel:
+    """Build the runner for mode, falling back to fp32 if it fails or drifts past tolerance"""
+    model.eval()
+    if mode == "fp32":
+        return InferenceModel(model, model, "fp32")
+    
+    inputs = _drift_inputs(model, seq_len)
+    try:
+        runner = build_runner(model, mode, inputs[:1])
+        drift = measure_drift(model, runner, inputs)
+    except Exception as e:
+        print(f"Inference mode {mode} unavailable, serving fp32: {e}")
+        return InferenceModel(model, model, "fp32")
+    
+    if drift["relative"] > tolerance:
+        print(f"Inference mode {mode} drifts {drift['relative']:.4f} from fp32 "
+              f"(tolerance {tolerance}), serving fp32")
+        return InferenceModel(model, model, "fp32", drift)
+    
+    print(f"Serving {mode} inference (relative drift {drift['relative']:.6f})")
+    return InferenceModel(model, runner, mode, drift)
+
+def model_bytes(runner) -> int:
+    """Serialized size of a runner"""
+    if hasattr(runner, "onnx_bytes"):
+        return len(runner.onnx_bytes)
+    buffer = io.BytesIO()
+    if isinstance(runner, torch.jit.ScriptModule):
+        torch.jit.save(runner, buffer)
+    else:
+        torch.save(getattr(runner, "_orig_mod", runner).state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+def benchmark(model: nn.Module, seq_len: int = 28, batch_sizes=(1, 64, 256), repeats: int = 20) -> Dict[str, Dict]:
+    """Per-batch latency, model size and drift of every available mode"""
+    model.eval()
+    inputs = _drift_inputs(model, seq_len, max(batch_sizes))
+    results = {}
+    for mode in INFERENCE_MODES:
+        try:
+            runner = build_runner(model, mode, inputs[:1])
+            drift = measure_drift(model, runner, inputs)
+        except Exception as e:
+            results[mode] = {"error": str(e)}
+            continue
+        
+        latency_ms = {}
+        with torch.inference_mode():
+            for batch_size in batch_sizes:
+                X = inputs[:batch_size]
+                runner(X)  # Warm up
+                timings = []
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    runner(X)
+                    timings.append(time.perf_counter() - started)
+                latency_ms[batch_size] = sorted(timings)[len(timings) // 2] * 1000
+        results[mode] = {"latency_ms": latency_ms, "model_bytes": model_bytes(runner), "drift": drift}
+    return results
+
+def main():
+    """Benchmark every inference mode on a checkpoint (or an untrained model)"""
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from models.lstm_forecaster import LSTMForecaster
+    
+    if len(sys.argv) > 1:
+        model = LSTMForecaster.from_checkpoint(torch.load(sys.argv[1], map_location="cpu"))
+    else:
+        model = LSTMForecaster(input_size=10, hidden_size=128, num_layers=2, out_len=30)
+    seq_len = model.metadata.get("seq_len", 28)
+    
+    print(f"{'mode':<18}{'batch 1 ms':>12}{'batch 64 ms':>13}{'batch 256 ms':>14}{'size KB':>10}{'rel drift':>12}")
+    for mode, result in benchmark(model, seq_len).items():
+        if "error" in result:
+            print(f"{mode:<18}unavailable: {result['error']}")
+            continue
+        latency = result["latency_ms"]
+        print(f"{mode:<18}{latency[1]:>12.2f}{latency[64]:>13.2f}{latency[256]:>14.2f}"
+              f"{result['model_bytes'] / 1024:>10.0f}{result['drift']['relative']:>12.6f}")
+
+if __name__ == "__main__":
+    main()
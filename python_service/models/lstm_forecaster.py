@@ -10,6 +10,7 @@ class LSTMForecaster(nn.Module):
         self.hidden_size = hidden_size
         self.num_layers = num_layers
         self.out_len = out_len
+        self.metadata = {}
         
         # LSTM layer
         self.lstm = nn.LSTM(
@@ -47,4 +48,39 @@ class LSTMForecaster(nn.Module):
         output = torch.relu(output)
         
         return output
-
+    
+    def checkpoint(self, **metadata) -> dict:
+        """State dict plus the configuration and metadata needed to rebuild the model"""
+        return {
+            "state_dict": self.state_dict(),
+            "config": {
+                "input_size": self.input_size,
+                "hidden_size": self.hidden_size,
+                "num_layers": self.num_layers,
+                "out_len": self.out_len
+            },
+            "metadata": metadata
+        }
+    
+    @classmethod
+    def from_checkpoint(cls, checkpoint: dict) -> "LSTMForecaster":
+        """Rebuild a model from checkpoint() output or a bare state dict"""
+        if "state_dict" in checkpoint:
+            state_dict = checkpoint["state_dict"]
+            config = checkpoint["config"]
+            metadata = checkpoint.get("metadata", {})
+        else:
+            # Bare state dicts predate stored configuration; read it off the weights
+            state_dict = checkpoint
+            config = {
+                "input_size": state_dict["lstm.weight_ih_l0"].shape[1],
+                "hidden_size": state_dict["lstm.weight_ih_l0"].shape[0] // 4,
+                "num_layers": sum(1 for key in state_dict if key.startswith("lstm.weight_ih_l")),
+                "out_len": state_dict["fc.5.weight"].shape[0]
+            }
+            metadata = {}
+        
+        model = cls(**config)
+        model.load_state_dict(state_dict)
+        model.metadata = metadata
+        return model
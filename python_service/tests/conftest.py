@@ -0,0 +1,33 @@
+import asyncio
+import os
+import tempfile
+import pytest
+
+# app.database reads DATABASE_URL on import, so point it at a scratch file first
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="msy-tests-"), "test.db")
+
+@pytest.fixture
+def db():
+    """Empty schema in the scratch database"""
+    from app.database import get_db, init_db
+    
+    init_db()
+    with get_db(write=True) as conn:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )]
+        for table in tables:
+            conn.execute(f"DELETE FROM {table}")
+        # Restart AUTOINCREMENT ids so tests can name rows by id
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+            conn.execute("DELETE FROM sqlite_sequence")
+        conn.commit()
+
+@pytest.fixture
+def async_db(db):
+    """Scratch database whose aiosqlite connections are closed afterwards"""
+    from app.database import async_pool
+    
+    yield
+    # Open aiosqlite connections keep non-daemon threads alive past the tests
+    asyncio.run(async_pool.close())
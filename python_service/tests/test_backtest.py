@@ -0,0 +1,45 @@
+import asyncio
+import numpy as np
+import pytest
+from app.backtest import error_sums, fold_origins, latest_backtest, metrics, run_backtest, run_fold
+from app.forecasters import SEASON
+
+def test_fold_origins_step_back_from_last_day():
+    assert fold_origins(100, horizon=14, folds=4, step=7) == [86, 79, 72, 65]
+
+def test_fold_origins_keep_minimum_history():
+    assert fold_origins(40, horizon=14, folds=4, step=7, min_history=2 * SEASON) == [26, 19]
+    assert fold_origins(20, horizon=14, folds=4, step=7) == []
+
+def test_fold_forecasts_from_history_only():
+    # A jump on the forecast days can only show up as error if it was not seen
+    usage = np.tile(np.arange(1.0, 8.0), (2, 5))
+    usage[:, -SEASON:] += 100.0
+    result = run_fold(usage, SEASON, ["seasonal_naive"])["seasonal_naive"]
+    np.testing.assert_allclose(result["sums"][:, 0], [700.0, 700.0])
+
+def test_metrics_skip_days_without_demand():
+    actual = np.array([[10.0, 0.0, 10.0]])
+    sums = error_sums(np.array([[12.0, 3.0, 8.0]]), actual)
+    values = metrics(sums[0])
+    assert values["mape"] == pytest.approx(20.0)
+    assert values["wape"] == pytest.approx(35.0)
+    assert values["bias"] == pytest.approx(15.0)
+
+def test_model_folds_line_up_with_actuals(db):
+    rng = np.random.default_rng(0)
+    usage = rng.poisson(20, (3, 60)).astype(np.float64)
+    
+    def oracle(offset, horizon):
+        start = usage.shape[1] - offset
+        return usage[:, start:start + horizon]
+    
+    result = asyncio.run(run_backtest(["rice", "beef", "pork"], usage, oracle, horizon=7, folds=3, step=7))
+    assert result["status"] == "success"
+    assert result["folds"] == 3
+    assert result["engines"]["lstm"]["wape"] == 0.0
+    assert result["engines"]["seasonal_naive"]["wape"] > 0
+    
+    stored = latest_backtest("rice")
+    assert stored["run_id"] == result["run_id"]
+    assert stored["results"]["lstm"]["wape"] == 0.0
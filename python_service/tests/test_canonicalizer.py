@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+from app.canonicalizer import Canonicalizer, parse_period
+
+def test_period_from_export_stamp():
+    assert parse_period("October_Data_Matrix_20251103_214000.xlsx") == "2025-10-01"
+
+def test_period_before_new_year_stamp_is_previous_year():
+    assert parse_period("December_Data_Matrix_20260105.xlsx") == "2025-12-01"
+
+def test_period_from_bare_year():
+    assert parse_period("May 2024 Data_Matrix.xlsx") == "2024-05-01"
+
+def test_period_from_environment(monkeypatch):
+    monkeypatch.setenv("DATA_MATRIX_YEAR", "2025")
+    assert parse_period("June_Data_Matrix.xlsx") == "2025-06-01"
+
+def test_period_without_year_is_unknown(monkeypatch):
+    monkeypatch.delenv("DATA_MATRIX_YEAR", raising=False)
+    assert parse_period("June_Data_Matrix.xlsx") is None
+    assert parse_period("shipments.csv") is None
+
+def data_matrix():
+    return pd.DataFrame({"Item Name": ["Beef Noodle", "Fried Rice", "Beef Noodle"],
+                         "Count": ["40", "3", "22"], "Amount": ["$800.00", "$30.00", "$440.00"]})
+
+def test_data_matrix_totals_spread_over_month():
+    canonicalizer = Canonicalizer()
+    chunk = data_matrix()
+    kind = canonicalizer.detect(chunk)
+    tables = canonicalizer.canonicalize(chunk, kind, {"filename": "June_Data_Matrix_20250702.xlsx",
+                                                      "period": "2025-06-01"})
+    usage, sales = tables["usage"], tables["sales"]
+    
+    totals = usage.groupby("menu_item_id")["quantity_sold"].sum()
+    assert totals.to_dict() == {"beef_noodle": 62, "fried_rice": 3}
+    noodle_days = usage[usage["menu_item_id"].eq("beef_noodle")]
+    assert noodle_days["date"].min() == "2025-06-01" and noodle_days["date"].max() == "2025-06-30"
+    assert set(noodle_days["quantity_sold"]) == {2, 3}
+    assert sales.groupby("menu_item_id")["revenue"].sum().round(2).to_dict() == {"beef_noodle": 1240.0,
+                                                                                 "fried_rice": 30.0}
+
+def test_data_matrix_without_period_is_rejected():
+    canonicalizer = Canonicalizer()
+    chunk = data_matrix()
+    with pytest.raises(ValueError):
+        canonicalizer.canonicalize(chunk, canonicalizer.detect(chunk), {"filename": "June_Data_Matrix.xlsx",
+                                                                        "period": None})
@@ -0,0 +1,74 @@
+import asyncio
+import json
+from app.change_feed import ChangeFeed
+from app.database import get_db
+from app.inventory_service import InventoryService
+
+def drain(subscriber):
+    """(event, data) of each queued frame"""
+    events = []
+    while not subscriber.queue.empty():
+        fields = dict(line.split(": ", 1) for line in subscriber.queue.get_nowait().decode().strip().split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+def test_subscribers_receive_only_their_topics():
+    async def scenario():
+        feed = ChangeFeed()
+        everything, alerts = feed.subscribe(), feed.subscribe(["alert"])
+        feed.publish("inventory", {"version": 1})
+        feed.publish("alert", {"ingredient_id": "rice"})
+        return drain(everything), drain(alerts)
+    
+    everything, alerts = asyncio.run(scenario())
+    assert [event for event, _ in everything] == ["inventory", "alert"]
+    assert alerts == [("alert", {"ingredient_id": "rice"})]
+
+def test_lagging_subscriber_gets_resync_instead_of_backlog():
+    async def scenario():
+        feed = ChangeFeed(queue_size=3)
+        subscriber = feed.subscribe()
+        for version in range(5):
+            feed.publish("inventory", {"version": version})
+        return feed, drain(subscriber)
+    
+    feed, events = asyncio.run(scenario())
+    assert events == [("resync", {"reason": "lagged"}), ("inventory", {"version": 4})]
+    assert feed.resyncs == 1
+
+def test_reconnect_replays_missed_events():
+    async def scenario():
+        feed = ChangeFeed(replay_size=2)
+        for version in range(4):
+            feed.publish("inventory", {"version": version})
+        return drain(feed.subscribe(last_event_id="2")), drain(feed.subscribe(last_event_id="1"))
+    
+    replayed, expired = asyncio.run(scenario())
+    assert replayed == [("inventory", {"version": 2}), ("inventory", {"version": 3})]
+    assert expired == [("resync", {"reason": "replay_expired"})]
+
+def test_inventory_refresh_publishes_changed_rows_and_alerts(db):
+    with get_db(write=True) as conn:
+        conn.execute("""
+            INSERT INTO ingredients (ingredient_id, ingredient_name, unit, reorder_point, safety_stock, par_level)
+            VALUES ('rice', 'Rice', 'g', 400, 100, 1000), ('beef', 'Beef', 'g', 50, 20, 200)
+        """)
+        conn.execute("INSERT INTO stock_ledger (ingredient_id, on_hand) VALUES ('rice', 600), ('beef', 80)")
+        conn.commit()
+    
+    async def scenario():
+        service = InventoryService(ChangeFeed())
+        await service.refresh()
+        subscriber = service.feed.subscribe()
+        with get_db(write=True) as conn:
+            conn.execute("UPDATE stock_ledger SET on_hand = 50 WHERE ingredient_id = 'rice'")
+            conn.commit()
+        changed = await service.refresh()
+        return changed, drain(subscriber)
+    
+    changed, events = asyncio.run(scenario())
+    assert changed == 1
+    (_, diff), (_, alert) = events
+    assert [row["ingredient_id"] for row in diff["changes"]] == ["rice"]
+    assert diff["kpis"]["critical_count"] == 1
+    assert (alert["status"], alert["previous_status"]) == ("critical", "adequate")
@@ -0,0 +1,39 @@
+import asyncio
+import aiosqlite
+import pytest
+from app.database import AsyncConnectionPool
+
+def test_failed_connect_does_not_shrink_async_pool(db, monkeypatch):
+    connect = aiosqlite.connect
+    calls = []
+    
+    def flaky(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OSError("unable to open database file")
+        return connect(*args, **kwargs)
+    
+    monkeypatch.setattr(aiosqlite, "connect", flaky)
+    
+    async def scenario():
+        async with AsyncConnectionPool(1) as pool:
+            with pytest.raises(OSError):
+                async with pool.connection():
+                    pass
+            async with pool.connection() as conn:
+                rows = await conn.execute_fetchall("SELECT 1")
+            return rows[0][0], pool.metrics()
+    
+    value, metrics = asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert value == 1
+    assert metrics["opened"] == 1
+
+def test_closing_async_pool_releases_connections(db):
+    async def scenario():
+        pool = AsyncConnectionPool(2)
+        async with pool:
+            async with pool.connection():
+                pass
+        return pool.metrics()
+    
+    assert asyncio.run(scenario())["opened"] == 0
@@ -0,0 +1,20 @@
+import asyncio
+import threading
+from app.executor import executor_metrics, run_io
+
+def test_in_flight_counts_running_io_tasks():
+    started, release = threading.Event(), threading.Event()
+    
+    def blocked():
+        started.set()
+        release.wait(5)
+    
+    async def scenario():
+        task = asyncio.ensure_future(run_io(blocked))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        during = executor_metrics()["io"]["in_flight"]
+        release.set()
+        await task
+        return during, executor_metrics()["io"]["in_flight"]
+    
+    assert asyncio.run(scenario()) == (1, 0)
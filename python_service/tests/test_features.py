@@ -0,0 +1,60 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from app.features import FEATURE_NAMES, FeatureStore, compute_features
+
+def make_db():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""
+        CREATE TABLE usage (
+            usage_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT, menu_item_id TEXT, menu_item_name TEXT, quantity_sold INTEGER
+        )
+    """)
+    conn.execute("CREATE TABLE recipe (menu_item_id TEXT, ingredient_id TEXT, qty_per_serving REAL)")
+    conn.executemany("INSERT INTO recipe VALUES (?, ?, ?)", [
+        ("bowl", "rice", 200.0), ("bowl", "beef", 120.0), ("noodles", "beef", 80.0)
+    ])
+    return conn
+
+def add_sales(conn, start: str, days: int):
+    for offset, day in enumerate(pd.date_range(start, periods=days, freq="D")):
+        conn.executemany(
+            "INSERT INTO usage (date, menu_item_id, menu_item_name, quantity_sold) VALUES (?, ?, ?, ?)",
+            [(f"{day:%Y-%m-%d}", "bowl", "Bowl", 10 + offset % 7), (f"{day:%Y-%m-%d}", "noodles", "Noodles", 5)]
+        )
+
+def test_compute_features_without_usage_days():
+    features = compute_features(np.zeros((3, 0)), pd.DatetimeIndex([]))
+    assert features.shape == (3, 0, len(FEATURE_NAMES))
+
+def test_empty_usage_builds_empty_feature_set():
+    conn = make_db()
+    feature_set = FeatureStore().refresh(conn)
+    assert feature_set.days == 0
+    assert not feature_set.has_history("rice")
+
+def test_append_matches_full_rebuild():
+    conn = make_db()
+    add_sales(conn, "2025-01-01", 40)
+    store = FeatureStore()
+    store.refresh(conn)
+    add_sales(conn, "2025-02-10", 10)
+    extended = store.refresh(conn)
+    rebuilt = FeatureStore().refresh(conn)
+    np.testing.assert_allclose(extended.usage, rebuilt.usage)
+    np.testing.assert_allclose(extended.features, rebuilt.features, rtol=1e-5, atol=1e-4)
+
+def test_append_after_gap_matches_full_rebuild():
+    conn = make_db()
+    add_sales(conn, "2025-01-01", 40)
+    store = FeatureStore()
+    store.refresh(conn)
+    # Nothing recorded for the three weeks before the new rows
+    add_sales(conn, "2025-03-01", 10)
+    extended = store.refresh(conn)
+    rebuilt = FeatureStore().refresh(conn)
+    assert extended.days == rebuilt.days
+    assert not extended.usage[:, 40:59].any()
+    np.testing.assert_allclose(extended.usage, rebuilt.usage)
+    np.testing.assert_allclose(extended.features, rebuilt.features, rtol=1e-5, atol=1e-4)
@@ -0,0 +1,61 @@
+import asyncio
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+from fastapi.testclient import TestClient
+from app.features import FEATURE_NAMES, FeatureStore
+from app.forecast_service import FORECAST_HORIZON_MAX, ForecastService
+from models.inference import InferenceModel
+from models.lstm_forecaster import LSTMForecaster
+
+SEQ_LEN = 14
+OUT_LEN = 7
+
+def feature_set():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE usage (usage_id INTEGER PRIMARY KEY, date TEXT, menu_item_id TEXT, "
+                 "menu_item_name TEXT, quantity_sold INTEGER)")
+    conn.execute("CREATE TABLE recipe (menu_item_id TEXT, ingredient_id TEXT, qty_per_serving REAL)")
+    conn.executemany("INSERT INTO recipe VALUES (?, ?, ?)", [("bowl", "rice", 200.0), ("bowl", "beef", 120.0)])
+    conn.executemany(
+        "INSERT INTO usage (date, menu_item_id, menu_item_name, quantity_sold) VALUES (?, 'bowl', 'Bowl', ?)",
+        [(f"{day:%Y-%m-%d}", 10 + offset % 7) for offset, day in enumerate(pd.date_range("2025-01-01", periods=60))]
+    )
+    return FeatureStore().refresh(conn)
+
+def model():
+    torch.manual_seed(0)
+    network = LSTMForecaster(len(FEATURE_NAMES), hidden_size=16, num_layers=1, out_len=OUT_LEN).eval()
+    network.metadata = {"seq_len": SEQ_LEN}
+    return InferenceModel(network, network, "fp32")
+
+@pytest.mark.parametrize("horizon, days", [(1, OUT_LEN), (OUT_LEN, OUT_LEN), (20, 3 * OUT_LEN)])
+def test_rollout_covers_horizon_in_whole_steps(horizon, days):
+    service, features, served = ForecastService(), feature_set(), model()
+    forecast = service._rollout(served, features, ["rice", "beef"], horizon)
+    assert forecast.shape == (2, days)
+    assert np.isfinite(forecast).all()
+    
+    # The first step is the model's own output; later steps only extend it
+    first = service._rollout(served, features, ["rice", "beef"], 1)
+    np.testing.assert_allclose(forecast[:, :OUT_LEN], first, rtol=1e-5)
+
+@pytest.mark.parametrize("horizon", [0, -3, FORECAST_HORIZON_MAX + 1])
+def test_rollout_rejects_horizon_out_of_range(horizon):
+    with pytest.raises(ValueError):
+        ForecastService()._rollout(model(), feature_set(), ["rice"], horizon)
+
+@pytest.mark.parametrize("horizon", [0, -3])
+def test_bulk_predict_rejects_horizon_out_of_range(horizon):
+    with pytest.raises(ValueError):
+        asyncio.run(ForecastService().bulk_predict(horizon))
+
+@pytest.mark.parametrize("horizon", [0, -3, FORECAST_HORIZON_MAX + 1])
+def test_forecast_endpoints_reject_horizon(horizon):
+    from app.main import app
+    
+    client = TestClient(app)
+    assert client.post("/forecast/bulk", json={"horizon": horizon}).status_code == 422
+    assert client.get("/forecast/predict", params={"ingredient_id": "rice", "horizon": horizon}).status_code == 422
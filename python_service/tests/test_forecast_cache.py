@@ -0,0 +1,66 @@
+import numpy as np
+from app.database import get_db
+from app.forecast_cache import ForecastCache
+from app.forecast_service import ForecastService
+
+def key(ingredient_id: str, horizon: int = 7, model: str = "v1", data: str = "d1"):
+    return (ingredient_id, horizon, model, data)
+
+def test_lru_evicts_least_recently_used():
+    cache = ForecastCache(max_entries=2, disk_path="")
+    cache.put_many({key("rice"): np.ones(7), key("beef"): np.zeros(7)})
+    assert set(cache.get_many([key("rice")])) == {key("rice")}
+    cache.put_many({key("pork"): np.ones(7)})
+    assert set(cache.get_many([key("rice"), key("beef"), key("pork")])) == {key("rice"), key("pork")}
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+
+def test_invalidate_by_ingredient_and_model_version():
+    cache = ForecastCache(disk_path="")
+    cache.put_many({key("rice"): np.ones(7), key("beef"): np.ones(7), key("pork", model="v2"): np.ones(7)})
+    cache.invalidate(["rice"])
+    assert set(cache.get_many([key("rice"), key("beef")])) == {key("beef")}
+    cache.invalidate(model_version="v1")
+    assert set(cache.get_many([key("beef"), key("pork", model="v2")])) == {key("pork", model="v2")}
+    assert cache.stats()["invalidations"] == 2
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ForecastCache(disk_path=path)
+    cache.put_many({key("rice"): np.arange(7)})
+    cache.close()
+    
+    restarted = ForecastCache(disk_path=path)
+    found = restarted.get_many([key("rice"), key("beef")])
+    np.testing.assert_array_equal(found[key("rice")], np.arange(7, dtype=np.float32))
+    assert restarted.stats()["disk_hits"] == 1
+    restarted.invalidate(["rice"])
+    restarted.close()
+    assert ForecastCache(disk_path=path).get_many([key("rice")]) == {}
+
+def add_usage(conn, menu_item_id: str, days, quantity: int):
+    conn.executemany(
+        "INSERT INTO usage (date, menu_item_id, menu_item_name, quantity_sold) VALUES (?, ?, ?, ?)",
+        [(f"2025-01-{day:02d}", menu_item_id, menu_item_id, quantity) for day in days]
+    )
+
+def test_new_usage_invalidates_only_its_ingredients(db):
+    with get_db(write=True) as conn:
+        conn.executemany("INSERT INTO recipe (menu_item_id, ingredient_id, qty_per_serving) VALUES (?, ?, ?)",
+                         [("bowl", "rice", 200.0), ("stew", "beef", 150.0)])
+        add_usage(conn, "bowl", range(1, 29), 10)
+        add_usage(conn, "stew", range(1, 29), 4)
+        conn.commit()
+    service = ForecastService()
+    versions = service._load_features().data_versions()
+    service.cache.put_many({key(i, data=versions[i]): np.ones(7) for i in ("rice", "beef")})
+    
+    # A late correction for one day changes rice's history, not beef's
+    with get_db(write=True) as conn:
+        add_usage(conn, "bowl", [15], 3)
+        conn.commit()
+    fresh = service._load_features().data_versions()
+    assert fresh["rice"] != versions["rice"]
+    assert fresh["beef"] == versions["beef"]
+    cached = service.cache.get_many([key(i, data=versions[i]) for i in ("rice", "beef")])
+    assert set(cached) == {key("beef", data=versions["beef"])}
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from app.forecasters import (
+    BASELINES, SEASON, Croston, Forecaster, HoltWinters, SeasonalNaive, baseline_holdout, best_engines,
+    holdout_errors
+)
+
+def weekly(weeks: int, rows: int = 3) -> np.ndarray:
+    pattern = np.array([10, 12, 9, 11, 20, 25, 18], dtype=np.float64)
+    return np.tile(pattern, (rows, weeks)) * np.arange(1, rows + 1)[:, None]
+
+def test_forecaster_without_forecast_cannot_be_built():
+    class Incomplete(Forecaster):
+        name = "incomplete"
+    
+    with pytest.raises(TypeError):
+        Incomplete()
+
+@pytest.mark.parametrize("name", sorted(BASELINES))
+def test_baselines_forecast_every_row_and_day(name):
+    forecast = BASELINES[name].forecast(weekly(8), 10)
+    assert forecast.shape == (3, 10)
+    assert forecast.dtype == np.float32
+    assert (forecast >= 0).all()
+
+def test_seasonal_naive_repeats_last_week():
+    usage = weekly(4)
+    forecast = SeasonalNaive().forecast(usage, 10)
+    np.testing.assert_allclose(forecast[:, :SEASON], usage[:, -SEASON:])
+    np.testing.assert_allclose(forecast[:, SEASON:], usage[:, -SEASON:][:, :3])
+
+def test_seasonal_naive_pads_short_history():
+    forecast = SeasonalNaive().forecast(np.ones((1, 3)), SEASON)
+    np.testing.assert_allclose(forecast, [[0, 0, 0, 0, 1, 1, 1]])
+
+def test_holt_winters_follows_a_steady_weekly_pattern():
+    usage = weekly(12)
+    forecast = HoltWinters().forecast(usage, SEASON)
+    np.testing.assert_allclose(forecast, usage[:, -SEASON:], rtol=0.05)
+
+def test_croston_rate_for_intermittent_demand():
+    usage = np.zeros((2, 60))
+    usage[0, ::4] = 8.0
+    forecast = Croston().forecast(usage, 5)
+    # About 8 units every 4 days, with the Syntetos-Boylan correction
+    assert forecast[0, 0] == pytest.approx(2.0 * (1 - 0.05), rel=0.1)
+    assert (forecast[1] == 0).all()
+    assert np.ptp(forecast[0]) == 0
+
+def test_best_engine_per_ingredient():
+    usage = weekly(10)
+    forecasts = baseline_holdout(usage, SEASON)
+    errors = holdout_errors(forecasts, usage[:, -SEASON:])
+    engines = best_engines(errors)
+    assert len(engines) == 3
+    assert set(engines) == {"seasonal_naive"}
@@ -0,0 +1,119 @@
+import os
+import pandas as pd
+import pytest
+from app.data_processor import DataProcessor
+from app.database import get_db, init_db
+
+@pytest.fixture
+def processor(tmp_path):
+    init_db()
+    with get_db(write=True) as conn:
+        for table in ("purchases", "shipments", "usage", "sales", "files", "file_fingerprints",
+                      "lead_time_stats", "lead_time_watermark", "stock_ledger", "stock_ledger_watermarks"):
+            conn.execute(f"DELETE FROM {table}")
+        conn.commit()
+    return DataProcessor(str(tmp_path / "processed"))
+
+def write_purchases(path, quantities):
+    pd.DataFrame({
+        "vendor": "Sysco",
+        "ingredient_id": "rice",
+        "quantity": quantities,
+        "unit": "kg",
+        "purchase_date": [f"2025-01-{day:02d}" for day in range(1, len(quantities) + 1)],
+    }).to_csv(path, index=False)
+
+def purchased():
+    with get_db() as conn:
+        return [row[0] for row in conn.execute("SELECT quantity FROM purchases ORDER BY purchase_date")]
+
+def test_reupload_replaces_rows(processor, tmp_path):
+    path = tmp_path / "purchases.csv"
+    write_purchases(path, [1.0, 2.0, 3.0])
+    first = processor.ingest_path(str(path), "purchases.csv", ".csv")
+    assert first["status"] == "new"
+    
+    write_purchases(path, [5.0, 2.0])
+    second = processor.ingest_path(str(path), "purchases.csv", ".csv")
+    assert second["status"] == "replaced"
+    assert second["file_id"] == first["file_id"]
+    assert purchased() == [5.0, 2.0]
+
+def test_identical_upload_is_not_loaded_twice(processor, tmp_path):
+    path = tmp_path / "purchases.csv"
+    write_purchases(path, [1.0, 2.0])
+    processor.ingest_path(str(path), "purchases.csv", ".csv")
+    again = processor.ingest_path(str(path), "purchases.csv", ".csv")
+    assert again["status"] == "unchanged"
+    assert purchased() == [1.0, 2.0]
+
+def test_appended_rows_are_added(processor, tmp_path):
+    path = tmp_path / "purchases.csv"
+    write_purchases(path, [1.0, 2.0])
+    processor.ingest_path(str(path), "purchases.csv", ".csv")
+    write_purchases(path, [1.0, 2.0, 3.0])
+    appended = processor.ingest_path(str(path), "purchases.csv", ".csv")
+    assert appended["status"] == "appended"
+    assert appended["rows_skipped"] == 2
+    assert purchased() == [1.0, 2.0, 3.0]
+
+def test_failed_reupload_keeps_previous_rows(processor, tmp_path, monkeypatch):
+    path = tmp_path / "purchases.csv"
+    write_purchases(path, [1.0, 2.0, 3.0])
+    processor.ingest_path(str(path), "purchases.csv", ".csv")
+    
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+    
+    monkeypatch.setattr(processor, "_load_tables", fail)
+    write_purchases(path, [9.0])
+    with pytest.raises(RuntimeError):
+        processor.ingest_path(str(path), "purchases.csv", ".csv")
+    assert purchased() == [1.0, 2.0, 3.0]
+
+def test_later_data_matrix_export_supersedes_month(processor, tmp_path):
+    for stamp, count in (("20250702", 62), ("20250710", 5)):
+        path = tmp_path / f"June_Data_Matrix_{stamp}.csv"
+        pd.DataFrame({"Item Name": ["Beef Noodle"], "Count": [count], "Amount": [count * 20.0]}).to_csv(path, index=False)
+        processor.ingest_path(str(path), path.name, ".csv")
+    with get_db() as conn:
+        sold = conn.execute("SELECT SUM(quantity_sold) FROM usage WHERE menu_item_id = 'beef_noodle'").fetchone()[0]
+    assert sold == 5
+
+def test_failed_reupload_keeps_processed_copy_and_metadata(processor, tmp_path, monkeypatch):
+    path = tmp_path / "purchases.csv"
+    write_purchases(path, [1.0, 2.0, 3.0])
+    first = processor.ingest_path(str(path), "purchases.csv", ".csv")
+    parts = processor.store.parts(first["file_id"])
+    
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+    
+    monkeypatch.setattr(processor, "_load_tables", fail)
+    write_purchases(path, [9.0])
+    with pytest.raises(RuntimeError):
+        processor.ingest_path(str(path), "purchases.csv", ".csv")
+    
+    assert processor.store.parts(first["file_id"]) == parts
+    assert [len(chunk) for _, chunk in processor.store.iter_file(first["file_id"])] == [3]
+    with get_db() as conn:
+        assert conn.execute("SELECT rows_processed FROM files").fetchall()[0][0] == 3
+    assert not os.listdir(tmp_path / "processed" / "_staging")
+
+def test_rejected_upload_leaves_no_processed_copy(processor, tmp_path, monkeypatch):
+    monkeypatch.delenv("DATA_MATRIX_YEAR", raising=False)
+    path = tmp_path / "June_Data_Matrix.csv"
+    pd.DataFrame({"Item Name": ["Beef Noodle"], "Count": [5], "Amount": [100.0]}).to_csv(path, index=False)
+    with pytest.raises(ValueError):
+        processor.ingest_path(str(path), path.name, ".csv")
+    assert processor.store.file_months() == {}
+    with get_db() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM files").fetchone()[0] == 0
+
+def test_appended_parts_follow_earlier_ones(processor, tmp_path):
+    path = tmp_path / "purchases.csv"
+    write_purchases(path, [1.0, 2.0])
+    first = processor.ingest_path(str(path), "purchases.csv", ".csv")
+    write_purchases(path, [1.0, 2.0, 3.0])
+    processor.ingest_path(str(path), "purchases.csv", ".csv")
+    assert [len(chunk) for _, chunk in processor.store.iter_file(first["file_id"])] == [2, 1]
@@ -0,0 +1,68 @@
+from fastapi.testclient import TestClient
+from app.database import get_db
+from app.inventory_snapshot import InventorySnapshot
+
+def add_stock(conn):
+    conn.execute("""
+        INSERT INTO ingredients (ingredient_id, ingredient_name, unit, reorder_point, safety_stock, par_level)
+        VALUES ('rice', 'Rice', 'g', 400, 100, 1000), ('beef', 'Beef', 'g', 50, 20, 200)
+    """)
+    conn.execute("INSERT INTO stock_ledger (ingredient_id, on_hand) VALUES ('rice', 300), ('beef', 80)")
+
+def set_stock(conn, ingredient_id: str, on_hand: float):
+    conn.execute("UPDATE stock_ledger SET on_hand = ? WHERE ingredient_id = ?", (on_hand, ingredient_id))
+
+def test_restart_over_unchanged_data_keeps_version(db):
+    with get_db(write=True) as conn:
+        add_stock(conn)
+        first = InventorySnapshot()
+        first.load(conn)
+        restarted = InventorySnapshot()
+        restarted.load(conn)
+        assert restarted.etag == first.etag
+        
+        set_stock(conn, "rice", 900)
+        changed = InventorySnapshot()
+        changed.load(conn)
+        assert changed.version == first.version + 1
+
+def test_refresh_applies_only_changed_rows(db):
+    with get_db(write=True) as conn:
+        add_stock(conn)
+        snapshot = InventorySnapshot()
+        snapshot.load(conn)
+        assert snapshot.kpis()["low_stock_count"] == 1
+        version = snapshot.version
+        
+        assert snapshot.refresh(conn, ["rice", "beef"])["changes"] == []
+        assert snapshot.version == version
+        
+        set_stock(conn, "rice", 50)
+        diff = snapshot.refresh(conn, ["rice"])
+        (old, new), = diff["changes"]
+        assert (old["status"], new["status"]) == ("low_stock", "critical")
+        assert diff["version"] == version + 1
+        assert diff["kpis"]["critical_count"] == 1
+
+def test_levels_revalidate_with_etag(db):
+    from app.main import app, inventory_service
+    
+    with get_db(write=True) as conn:
+        add_stock(conn)
+        inventory_service.load_snapshot(conn)
+    client = TestClient(app)
+    
+    response = client.get("/inventory/levels")
+    etag = response.headers["etag"]
+    assert response.status_code == 200
+    assert len(response.json()["ingredients"]) == 2
+    assert client.get("/inventory/levels", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/inventory/levels", headers={"If-None-Match": f'"0", W/{etag}'}).status_code == 304
+    
+    with get_db(write=True) as conn:
+        set_stock(conn, "beef", 10)
+        inventory_service.snapshot.refresh(conn, ["beef"])
+        conn.commit()
+    response = client.get("/inventory/levels", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from app.database import get_db
+from app.lead_times import lead_time_moments, merge_moments, pooled, rebuild_lead_times, sync_lead_times
+
+def moments(values):
+    values = np.asarray(values, dtype=np.float64)
+    return len(values), values.mean(), ((values - values.mean()) ** 2).sum()
+
+def test_merged_moments_match_the_combined_sample():
+    a, b = [2.0, 3.0, 3.0, 5.0], [4.0, 8.0, 1.0]
+    np.testing.assert_allclose(merge_moments(moments(a), moments(b)), moments(a + b))
+    np.testing.assert_allclose(pooled([moments(a), moments(b), (0, 0.0, 0.0)]), moments(a + b))
+    assert merge_moments((0, 0.0, 0.0), (0, 0.0, 0.0)) == (0, 0.0, 0.0)
+
+def add_shipments(conn, rows):
+    conn.executemany("""
+        INSERT INTO shipments (vendor, ingredient_id, quantity, shipped_date, arrived_date, status, lead_time_days)
+        VALUES (?, ?, 10, ?, ?, ?, ?)
+    """, rows)
+
+def test_incremental_sync_matches_rebuild(db):
+    with get_db(write=True) as conn:
+        add_shipments(conn, [
+            ("Sysco", "rice", "2025-01-01", "2025-01-03", "delivered", None),
+            ("Sysco", "rice", "2025-01-05", None, "delivered", 4),
+            ("Sysco", "beef", "2025-01-05", None, "in_transit", None)
+        ])
+        assert sync_lead_times(conn) == {"rice"}
+        add_shipments(conn, [
+            ("Sysco", "rice", "2025-01-09", "2025-01-10", "delivered", None),
+            (None, "beef", "2025-01-09", "2025-01-12", "delivered", None)
+        ])
+        assert sync_lead_times(conn) == {"rice", "beef"}
+        incremental = lead_time_moments(conn)
+        
+        rebuild_lead_times(conn)
+        rebuilt = lead_time_moments(conn)
+    
+    assert incremental.keys() == rebuilt.keys() == {("Sysco", "rice"), ("", "beef")}
+    for key in rebuilt:
+        assert incremental[key] == pytest.approx(rebuilt[key])
+    assert rebuilt[("Sysco", "rice")] == pytest.approx(moments([2.0, 4.0, 1.0]))
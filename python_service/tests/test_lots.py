@@ -0,0 +1,95 @@
+import asyncio
+from app.database import get_db
+from app.lot_service import LotService
+from app.lots import LotHeap, day_iso, day_number, load_lots, project_waste, rebuild_lots, replay_ingredient
+from app.stock_ledger import rebuild_stock_ledger, sync_stock_ledger
+
+def test_get_lots_reads_over_async_pool(async_db):
+    with get_db(write=True) as conn:
+        conn.execute("INSERT INTO ingredients (ingredient_id, ingredient_name, shelf_life_days) VALUES ('rice', 'Rice', NULL)")
+        conn.executemany(
+            "INSERT INTO purchases (ingredient_id, quantity, unit_cost, purchase_date) VALUES ('rice', ?, 2.0, ?)",
+            [(10.0, "2025-01-01"), (5.0, "2025-01-03")]
+        )
+        conn.commit()
+    service = LotService(forecast_service=None)
+    
+    async def scenario():
+        await service.rebuild()
+        return await service.get_lots("rice"), await service.get_lots("beef")
+    
+    rice, beef = asyncio.run(scenario())
+    assert rice["as_of"] is not None
+    (entry,) = rice["ingredients"]
+    assert entry["on_hand"] == 15.0
+    assert [lot["received_date"] for lot in entry["lots"]] == ["2025-01-01", "2025-01-03"]
+    assert beef["ingredients"] == []
+
+def ledger(conn):
+    return conn.execute("SELECT purchased_qty, used_qty, wasted_qty, on_hand FROM stock_ledger WHERE ingredient_id = 'rice'").fetchone()
+
+def test_expired_stock_is_written_off_in_ledger(db):
+    with get_db(write=True) as conn:
+        conn.execute("INSERT INTO ingredients (ingredient_id, ingredient_name, shelf_life_days) VALUES ('rice', 'Rice', 3)")
+        conn.execute("INSERT INTO recipe (menu_item_id, ingredient_id, qty_per_serving) VALUES ('bowl', 'rice', 1.0)")
+        conn.executemany(
+            "INSERT INTO purchases (ingredient_id, quantity, unit_cost, purchase_date) VALUES ('rice', ?, 2.0, ?)",
+            [(10.0, "2025-01-01"), (5.0, "2025-01-05")]
+        )
+        conn.execute("INSERT INTO usage (date, menu_item_id, quantity_sold) VALUES ('2025-01-02', 'bowl', 4)")
+        sync_stock_ledger(conn)
+        assert tuple(ledger(conn)) == (15.0, 4.0, 0.0, 11.0)
+        
+        # The first lot expires on the 4th with 6 left
+        summary = rebuild_lots(conn, end_day=day_number("2025-01-06"))
+        assert summary["stock_changes"] == {"rice": -6.0}
+        assert tuple(ledger(conn)) == (15.0, 4.0, 6.0, 5.0)
+        assert sum(heap.on_hand() for heap in load_lots(conn).values()) == 5.0
+        
+        # Replaying again or rebuilding the ledger does not write it off twice
+        assert rebuild_lots(conn, end_day=day_number("2025-01-06"))["stock_changes"] == {}
+        rebuild_stock_ledger(conn)
+        assert tuple(ledger(conn)) == (15.0, 4.0, 6.0, 5.0)
+
+def test_consume_takes_earliest_expiring_lots_first():
+    heap = LotHeap()
+    heap.receive(1, 10.0, 2.0, 1, 5)
+    heap.receive(3, 10.0, 3.0, 2, 5)
+    heap.receive(2, 10.0, 1.0, 3, None)
+    assert heap.consume(14.0) == 0.0
+    assert [(lot[5], lot[2]) for lot in sorted(heap.lots)] == [(2, 6.0), (3, 10.0)]
+    assert heap.consume(20.0) == 4.0
+    assert heap.on_hand() == 0.0
+
+def test_expire_records_waste_at_unit_cost():
+    heap = LotHeap()
+    heap.receive(1, 10.0, 2.0, 1, 3)
+    heap.receive(2, 10.0, 3.0, 2, 3)
+    heap.consume(4.0)
+    waste = []
+    assert heap.expire(3, waste) == 0.0
+    assert heap.expire(4, waste) == 6.0
+    assert waste == [(1, 4, 6.0, 12.0)]
+    assert heap.on_hand() == 10.0
+
+def test_replay_sweeps_expiry_before_receiving_and_consuming():
+    # Day 4: the first lot expires with 6 left before the day's usage, so
+    # day 6 draws on the second lot only
+    heap, waste, unmet = replay_ingredient(
+        [(1, 10.0, 1.0, 1), (4, 5.0, 1.0, 2)], [(2, 4.0), (4, 3.0), (6, 5.0)], 3, 10
+    )
+    assert [quantity for _, _, quantity, _ in waste] == [6.0]
+    assert unmet == 3.0
+    assert heap.on_hand() == 0.0
+
+def test_project_waste_leaves_open_lots_untouched():
+    heap = LotHeap()
+    heap.receive(1, 10.0, 2.0, 1, 5)
+    heap.receive(1, 10.0, 2.0, 2, 20)
+    # Four days at 2 a day leave 2 of the first lot to expire on day 6
+    projection = project_waste(heap, [2.0] * 8, 2)
+    assert projection["projected_waste_qty"] == 2.0
+    assert projection["projected_waste_cost"] == 4.0
+    assert projection["expiring"] == [{"expiry_date": day_iso(6), "quantity": 2.0, "cost": 4.0}]
+    assert projection["remaining_at_horizon"] == 2.0
+    assert heap.on_hand() == 20.0
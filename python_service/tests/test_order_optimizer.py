@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from app.order_optimizer import evaluate, make_problem, order_days, solve, solve_heuristic, synthetic_problem
+
+def single(position: float = 0.0, lead: float = 0.0, review: float = 1.0, pack: float = 0.0,
+           shelf_life: float = 0.0, horizon: int = 14) -> dict:
+    return make_problem(
+        np.full((1, horizon), 10.0), np.array([position]), np.array([5.0]), np.array([1000.0]),
+        np.array([shelf_life]), np.array([pack]), np.array([review]), ["Sysco"],
+        np.array([[0]]), np.array([[2.0]]), np.array([[lead]])
+    )
+
+def test_heuristic_meets_demand_for_a_single_ingredient():
+    problem = single(position=40.0, lead=2.0, review=3.0, pack=25.0)
+    orders = solve_heuristic(problem)["orders"]
+    evaluation = evaluate(problem, orders)
+    assert evaluation["shortage"].sum() == 0
+    assert evaluation["excess"].sum() == 0
+    assert (orders[orders > 0] % 25 == 0).all()
+    assert (evaluation["inventory"] >= problem["lower"] - 1e-9).all()
+
+def test_perishable_bound_limits_stock_to_shelf_life():
+    problem = single(position=0.0, shelf_life=3.0)
+    # End-of-day stock covers at most the next two days of demand
+    np.testing.assert_allclose(problem["upper"][0, :-1], 20.0)
+    evaluation = evaluate(problem, solve_heuristic(problem)["orders"])
+    assert (evaluation["inventory"] <= problem["upper"] + 1e-9).all()
+    assert evaluation["excess"].sum() == 0
+
+def test_heuristic_plan_is_feasible_on_a_synthetic_catalog():
+    problem = synthetic_problem(40, horizon=21)
+    problem["pack"][::4] = 0
+    orders = solve_heuristic(problem)["orders"]
+    # Orders only on order days that arrive within the horizon, in whole shipments
+    assert not (orders > 0)[~order_days(problem)].any()
+    pack = problem["pack"][:, None, None]
+    boxed = np.broadcast_to(pack > 0, orders.shape)
+    multiples = orders / np.where(pack > 0, pack, 1.0)
+    np.testing.assert_allclose(multiples[boxed], np.round(multiples[boxed]))
+    # Only a whole shipment that does not fit under the upper bound is written off
+    excess = evaluate(problem, orders)["excess"]
+    deliveries = (orders > 0).sum(axis=(1, 2))
+    assert (excess <= problem["pack"] * deliveries + 1e-6).all()
+    assert excess[problem["pack"] == 0] == pytest.approx(0.0, abs=1e-6)
+
+def test_milp_is_never_costlier_than_heuristic():
+    problem = synthetic_problem(6, horizon=14)
+    heuristic = solve(problem, "heuristic")["evaluation"]["total_cost"]
+    milp = solve(problem, "milp", time_limit=10)["evaluation"]["total_cost"]
+    bound = solve(problem, "lp")["objective"]
+    assert milp <= heuristic + 1e-6
+    assert bound <= milp + 1e-6 * max(milp, 1.0)
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        solve(single(), "greedy")
@@ -0,0 +1,50 @@
+import sqlite3
+import numpy as np
+from app.recipe_explosion import RecipeExplosion, RecipeMatrix
+
+ROWS = [("bowl", "rice", 200.0), ("bowl", "beef", 120.0), ("noodles", "beef", 80.0), ("noodles", "egg", 1.0)]
+
+def test_explode_matches_dense_product():
+    rng = np.random.default_rng(0)
+    rows = [(f"item{m}", f"ing{i}", float(rng.uniform(0.1, 3)))
+            for m in range(40) for i in rng.choice(25, 4, replace=False)]
+    recipe = RecipeMatrix.from_rows(rows)
+    dense = np.zeros((len(recipe.menu_item_ids), len(recipe.ingredient_ids)))
+    for menu_item_id, ingredient_id, qty in rows:
+        dense[recipe.item_index[menu_item_id], recipe.ingredient_index[ingredient_id]] += qty
+    
+    sales = rng.poisson(20, (len(recipe.menu_item_ids), 30)).astype(np.float64)
+    np.testing.assert_allclose(recipe.explode(sales), dense.T @ sales)
+
+def test_duplicate_pairs_are_summed_and_missing_ids_dropped():
+    recipe = RecipeMatrix.from_rows(ROWS + [("bowl", "rice", 50.0), (None, "rice", 1.0), ("bowl", None, 1.0)])
+    assert recipe.menu_item_ids == ["bowl", "noodles"]
+    usage = recipe.explode(np.array([[1.0], [0.0]]))
+    assert usage[recipe.ingredient_index["rice"], 0] == 250.0
+
+def test_item_matrix_drops_unknown_items_and_days():
+    recipe = RecipeMatrix.from_rows(ROWS)
+    items = recipe.item_matrix(
+        ["bowl", "bowl", "curry", "noodles", "noodles"],
+        np.array([0, 0, 1, 2, 5]), np.array([3.0, 2.0, 9.0, 4.0, 7.0]), days=3
+    )
+    np.testing.assert_array_equal(items, [[5.0, 0.0, 0.0], [0.0, 0.0, 4.0]])
+
+def test_explode_forecasts_returns_only_used_ingredients():
+    recipe = RecipeMatrix.from_rows(ROWS)
+    usage = recipe.explode_forecasts({"bowl": [1.0, 2.0], "curry": [5.0, 5.0]})
+    assert usage == {"beef": [120.0, 240.0], "rice": [200.0, 400.0]}
+    assert recipe.explode_forecasts({"curry": [1.0]}) == {}
+
+def test_matrix_rebuilt_only_when_recipe_changes():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE recipe (menu_item_id TEXT, ingredient_id TEXT, qty_per_serving REAL)")
+    conn.executemany("INSERT INTO recipe VALUES (?, ?, ?)", ROWS)
+    explosion = RecipeExplosion()
+    first = explosion.refresh(conn)
+    assert explosion.refresh(conn) is first
+    
+    conn.execute("UPDATE recipe SET qty_per_serving = 150.0 WHERE menu_item_id = 'bowl' AND ingredient_id = 'rice'")
+    changed = explosion.refresh(conn)
+    assert changed is not first
+    assert changed.explode(np.array([[1.0], [0.0]]))[changed.ingredient_index["rice"], 0] == 150.0
@@ -0,0 +1,74 @@
+import numpy as np
+from statistics import NormalDist
+from app.database import get_db
+from app.forecast_service import ForecastService
+from app.replenishment import protection_demand, replenishment_levels, unit_factor
+from app.replenishment_service import ReplenishmentService
+
+def add_stock():
+    with get_db(write=True) as conn:
+        conn.execute("""
+            INSERT INTO ingredients (ingredient_id, ingredient_name, unit, reorder_point, safety_stock, par_level,
+                                     order_quantity)
+            VALUES ('rice', 'Rice', 'g', 400, 100, 1000, NULL), ('beef', 'Beef', 'g', 50, 20, 200, 75)
+        """)
+        conn.execute("INSERT INTO stock_ledger (ingredient_id, on_hand) VALUES ('rice', 300), ('beef', 80)")
+        conn.execute("""
+            INSERT INTO shipments (vendor, ingredient_id, quantity, shipped_date, status)
+            VALUES ('Sysco', 'rice', 250, '2025-01-01', 'in_transit')
+        """)
+        conn.commit()
+
+def test_stock_levels_by_column(db):
+    add_stock()
+    position, reorder_point, order_quantity = ForecastService()._stock_levels(["rice", "beef", "egg"])
+    np.testing.assert_allclose(position, [550, 80, 0])
+    np.testing.assert_allclose(reorder_point, [400, 50, 0])
+    assert np.isnan(order_quantity[0]) and order_quantity[1] == 75 and np.isnan(order_quantity[2])
+
+def test_planning_inputs_by_column(db):
+    add_stock()
+    inputs = ReplenishmentService(None, None).planning_inputs(["rice", "beef", "egg"])
+    assert inputs["names"] == ["Rice", "Beef", "egg"]
+    assert inputs["units"] == ["g", "g", None]
+    np.testing.assert_allclose(inputs["position"], [550, 80, 0])
+    np.testing.assert_allclose(inputs["safety_stock"], [100, 20, 0])
+    np.testing.assert_allclose(inputs["par_level"], [1000, 200, 0])
+
+def levels(**overrides):
+    inputs = dict(forecasts=np.full((1, 30), 10.0), demand_std=np.array([2.0]), lead_mean=np.array([3.0]),
+                  lead_std=np.array([1.0]), review_days=np.array([7.0]), position=np.array([50.0]),
+                  pack_size=np.array([25.0]), service_level=0.95)
+    inputs.update(overrides)
+    return replenishment_levels(**inputs)
+
+def test_reorder_point_covers_lead_time_demand_plus_safety_stock():
+    result = levels()
+    z = NormalDist().inv_cdf(0.95)
+    safety_stock = z * np.sqrt(10 * 2.0 ** 2 + 10.0 ** 2 * 1.0 ** 2)
+    np.testing.assert_allclose(result["safety_stock"], [safety_stock])
+    np.testing.assert_allclose(result["reorder_point"], [30 + safety_stock])
+    np.testing.assert_allclose(result["order_up_to"], [100 + safety_stock])
+    # 69.5 short of order-up-to rounds up to three 25-unit shipments
+    np.testing.assert_allclose(result["order_quantity"], [75.0])
+
+def test_certain_demand_needs_no_safety_stock():
+    result = levels(demand_std=np.array([0.0]), lead_std=np.array([0.0]), pack_size=np.array([np.nan]))
+    np.testing.assert_allclose(result["safety_stock"], [0.0])
+    np.testing.assert_allclose(result["reorder_point"], [30.0])
+    np.testing.assert_allclose(result["order_quantity"], [50.0])
+    assert levels(position=np.array([500.0]))["order_quantity"][0] == 0.0
+
+def test_higher_service_level_raises_reorder_point():
+    assert levels(service_level=0.99)["reorder_point"][0] > levels()["reorder_point"][0]
+
+def test_protection_demand_interpolates_fractional_days():
+    forecasts = np.array([[1.0, 2.0, 3.0, 4.0]])
+    np.testing.assert_allclose(protection_demand(forecasts, np.array([2.5])), [1.8])
+    np.testing.assert_allclose(protection_demand(forecasts, np.array([9.0])), [2.5])
+
+def test_unit_factor():
+    assert unit_factor("kg", "g") == 1000.0
+    assert unit_factor("eggs", "pcs") == 1.0
+    assert unit_factor("kg", "pcs") is None
+    assert unit_factor(None, "g") is None
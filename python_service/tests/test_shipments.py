@@ -0,0 +1,45 @@
+from app.database import get_db
+from app.shipment_service import ShipmentService, decode_cursor, encode_cursor, shipment_filters
+
+def add_shipments(rows):
+    with get_db(write=True) as conn:
+        conn.executemany(
+            "INSERT INTO shipments (vendor, ingredient_id, quantity, shipped_date, status) VALUES (?, ?, 1, ?, ?)",
+            rows
+        )
+        conn.commit()
+
+def all_pages(service, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        after = decode_cursor(cursor) if cursor else None
+        page = service._query_shipments(shipment_filters(**filters), after, limit)
+        pages.append([row["shipment_id"] for row in page["shipments"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+def test_cursor_keeps_missing_shipped_date():
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+    assert decode_cursor(encode_cursor("2025-01-02", 7)) == ("2025-01-02", 7)
+
+def test_pages_cover_every_shipment_once_newest_first(db):
+    add_shipments([
+        ("Sysco", "rice", "2025-01-01", "delivered"),
+        ("Sysco", "rice", None, "pending"),
+        ("Sysco", "beef", "2025-01-03", "delivered"),
+        ("Sysco", "rice", "2025-01-03", "in_transit"),
+        ("Sysco", "beef", None, "pending"),
+        ("Sysco", "rice", "2025-01-02", "delivered"),
+    ])
+    pages = all_pages(ShipmentService(), limit=2)
+    assert pages == [[4, 3], [6, 1], [5, 2]]
+
+def test_pages_with_filter_and_missing_dates(db):
+    add_shipments([
+        ("Sysco", "rice", None, "pending"),
+        ("Sysco", "rice", "2025-01-01", "delivered"),
+        ("Sysco", "beef", None, "pending"),
+        ("Sysco", "rice", None, "pending"),
+    ])
+    assert all_pages(ShipmentService(), limit=1, ingredient_id="rice") == [[2], [4], [1]]
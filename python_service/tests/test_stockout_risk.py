@@ -0,0 +1,43 @@
+import asyncio
+import numpy as np
+import pytest
+from statistics import NormalDist
+from app.stockout_risk import covered_percentile, lead_time_draws, simulate_block, simulate_stockouts
+
+def one(value: float) -> np.ndarray:
+    return np.array([value])
+
+@pytest.mark.parametrize("lead_time, stockout", [(2.0, 0.0), (2.5, 1.0), (3.0, 1.0)])
+def test_certain_demand_runs_out_before_late_delivery(lead_time, stockout):
+    # 25 on hand covers two 10-unit days; a delivery during day 3 comes too late
+    result = simulate_block(np.full((1, 10), 10.0), one(0.0), one(25.0), one(lead_time), one(0.0), 100, 0)
+    assert result["stockout_probability"][0] == stockout
+    assert result["days_of_cover"][0] == 2.0
+    assert result["days_of_cover_p10"][0] == 2.0
+
+def test_stockout_probability_matches_normal_demand():
+    # Next-day delivery: the path stocks out when the first day's demand exceeds stock
+    result = simulate_block(np.full((1, 5), 10.0), one(3.0), one(12.0), one(1.0), one(0.0), 40000, 7)
+    expected = 1 - NormalDist(10, 3).cdf(12)
+    assert result["stockout_probability"][0] == pytest.approx(expected, abs=0.015)
+
+def test_lead_time_draws_have_requested_moments():
+    draws = lead_time_draws(np.random.default_rng(0), np.array([4.0, 3.0]), np.array([1.0, 0.0]), 50000)
+    assert draws[0].mean() == pytest.approx(4.0, rel=0.02)
+    assert draws[0].std() == pytest.approx(1.0, rel=0.05)
+    assert (draws[1] == 3.0).all()
+
+def test_covered_percentile_per_row():
+    covered = np.array([[0, 1, 2, 3, 4, 5, 6, 7, 8, 9], [5] * 10])
+    np.testing.assert_array_equal(covered_percentile(covered, 10, 10), [0, 5])
+    np.testing.assert_array_equal(covered_percentile(covered, 50, 10), [4, 5])
+
+def test_simulation_is_reproducible_for_a_seed():
+    rng = np.random.default_rng(3)
+    inputs = (rng.uniform(5, 20, (6, 14)), rng.uniform(1, 5, 6), rng.uniform(0, 100, 6),
+              rng.uniform(2, 6, 6), rng.uniform(0, 2, 6))
+    first = asyncio.run(simulate_stockouts(*inputs, paths=500, seed=11))
+    second = asyncio.run(simulate_stockouts(*inputs, paths=500, seed=11))
+    for key in first:
+        np.testing.assert_array_equal(first[key], second[key])
+    assert ((first["stockout_probability"] >= 0) & (first["stockout_probability"] <= 1)).all()
@@ -0,0 +1,9 @@
+import pytest
+from app.features import FEATURE_NAMES
+from app.trainer import fit
+from models.lstm_forecaster import LSTMForecaster
+
+def test_fit_requires_an_epoch(tmp_path):
+    model = LSTMForecaster(len(FEATURE_NAMES), hidden_size=8, num_layers=1, out_len=7)
+    with pytest.raises(ValueError):
+        fit(model, None, 14, 7, 0, str(tmp_path / "model.pt"))
@@ -0,0 +1,33 @@
+import asyncio
+from app.training_jobs import TrainingJobManager
+
+class WaitingTrainer:
+    """Stands in for ForecastService: trains until cancelled"""
+    
+    async def train_model(self, progress, cancel_event):
+        progress.update(status="running")
+        while not cancel_event.is_set():
+            await asyncio.sleep(0.01)
+        return {"status": "cancelled"}
+
+def test_shutdown_cancels_jobs_and_allows_restart():
+    manager = TrainingJobManager(WaitingTrainer())
+    
+    async def scenario():
+        first = await manager.submit()
+        await asyncio.sleep(0.05)
+        manager.shutdown()
+        after_shutdown = manager.get(first["job_id"])
+        
+        second = await manager.submit()
+        manager.cancel(second["job_id"])
+        await manager.jobs[second["job_id"]].task
+        return after_shutdown, second, manager.get(second["job_id"])
+    
+    try:
+        after_shutdown, second, finished = asyncio.run(scenario())
+    finally:
+        manager.shutdown()
+    assert after_shutdown["status"] == "cancelled"
+    assert not second["deduplicated"]
+    assert finished["status"] == "cancelled"